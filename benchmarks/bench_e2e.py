@@ -0,0 +1,280 @@
+"""End-to-end load benchmark against the fake providers and in-memory store.
+
+    python -m benchmarks.bench_e2e [--profile mixed] [--users 20] [--duration 30] [--save FILE] [--compare FILE]
+
+Starts benchmarks.e2e_server in a subprocess (or targets --url), registers one
+virtual user per concurrent client, then drives a weighted mix of login, list,
+send, stream, events and usage calls until --duration elapses. Reports
+requests/sec, latency percentiles per operation, time to first streamed token
+and server CPU per streamed token. --save writes the result as a JSON
+baseline; --compare checks a run against one and exits 1 on a regression
+beyond --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmarks.e2e_server import parse_args as server_args
+
+API = "/api/v1"
+PROFILES = {
+    "mixed": {"login": 2, "list": 20, "messages": 15, "send": 10, "stream": 25, "events": 8, "usage": 10},
+    "stream": {"stream": 1},
+    "read": {"list": 5, "messages": 4, "usage": 1},
+}
+# Metric path -> True when higher is better
+COMPARED = {
+    "summary.rps": True,
+    "summary.latency_ms.p95": False,
+    "summary.latency_ms.p99": False,
+    "stream.ttft_ms.p95": False,
+    "stream.cpu_ms_per_token": False,
+}
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    ordered = sorted(values)
+
+    def pct(q: float) -> float | None:
+        return round(ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)], 2) if ordered else None
+
+    return {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99)}
+
+
+class Recorder:
+    def __init__(self):
+        self.latency_ms: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[int, int] = defaultdict(int)
+        self.ttft_ms: list[float] = []
+        self.tokens = 0
+
+    def record(self, op: str, started: float, status: int) -> None:
+        self.latency_ms[op].append((time.perf_counter() - started) * 1000)
+        self.statuses[status] += 1
+        if status >= 400:
+            self.errors[op] += 1
+
+
+class VirtualUser:
+    def __init__(self, http: httpx.AsyncClient, recorder: Recorder, seed: int):
+        self._http = http
+        self._recorder = recorder
+        self._random = random.Random(seed)
+        self.email = f"bench_{uuid.uuid4().hex[:12]}@example.com"
+        self.password = "BenchmarkPass123"
+        self.headers: dict[str, str] = {}
+        self.conversation_id = ""
+        self._turn = 0
+
+    async def setup(self) -> None:
+        resp = await self._http.post(f"{API}/auth/register", json={"email": self.email, "password": self.password})
+        resp.raise_for_status()
+        self.headers = {"Authorization": f"Bearer {resp.json()['data']['access_token']}"}
+        resp = await self._http.post(f"{API}/conversations", json={"title": "Benchmark"}, headers=self.headers)
+        resp.raise_for_status()
+        self.conversation_id = resp.json()["data"]["id"]
+
+    def _content(self) -> str:
+        self._turn += 1
+        # Distinct per turn, so an enabled response cache doesn't turn the run into cache hits
+        return f"Turn {self._turn} from {self.email}: summarize the previous answer in a few sentences."
+
+    async def run(self, weights: dict[str, int], deadline: float) -> None:
+        ops, cum = list(weights), list(weights.values())
+        while time.monotonic() < deadline:
+            op = self._random.choices(ops, weights=cum)[0]
+            started = time.perf_counter()
+            try:
+                status = await getattr(self, f"_{op}")()
+            except httpx.HTTPError:
+                status = 599
+            self._recorder.record(op, started, status)
+
+    async def _login(self) -> int:
+        resp = await self._http.post(f"{API}/auth/login", json={"email": self.email, "password": self.password})
+        return resp.status_code
+
+    async def _list(self) -> int:
+        return (await self._http.get(f"{API}/conversations", headers=self.headers)).status_code
+
+    async def _messages(self) -> int:
+        url = f"{API}/conversations/{self.conversation_id}/messages"
+        return (await self._http.get(url, params={"per_page": 50}, headers=self.headers)).status_code
+
+    async def _send(self) -> int:
+        url = f"{API}/conversations/{self.conversation_id}/messages"
+        return (await self._http.post(url, json={"content": self._content()}, headers=self.headers)).status_code
+
+    async def _usage(self) -> int:
+        return (await self._http.get(f"{API}/usage/stats", headers=self.headers)).status_code
+
+    async def _events(self) -> int:
+        # Subscription setup only: the stream itself stays open until the client leaves
+        url = f"{API}/conversations/{self.conversation_id}/events"
+        async with self._http.stream("GET", url, headers=self.headers) as resp:
+            return resp.status_code
+
+    async def _stream(self) -> int:
+        url = f"{API}/conversations/{self.conversation_id}/messages/stream"
+        started = time.perf_counter()
+        async with self._http.stream("POST", url, json={"content": self._content()}, headers=self.headers) as resp:
+            if resp.status_code != 200:
+                return resp.status_code
+            first = True
+            async for line in resp.aiter_lines():
+                if line == "event: content_block_delta":
+                    if first:
+                        self._recorder.ttft_ms.append((time.perf_counter() - started) * 1000)
+                        first = False
+                    self._recorder.tokens += 1
+                elif line == "event: error":
+                    return 502
+        return 200
+
+
+async def server_cpu(http: httpx.AsyncClient) -> float | None:
+    try:
+        resp = await http.get("/__bench/cpu")
+    except httpx.HTTPError:
+        return None
+    return resp.json()["cpu_seconds"] if resp.status_code == 200 else None
+
+
+async def run_load(url: str, profile: str, users: int, duration: float, seed: int) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users * 2 + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as http:
+        clients = [VirtualUser(http, recorder, seed + i) for i in range(users)]
+        await asyncio.gather(*(c.setup() for c in clients))
+        cpu_before = await server_cpu(http)
+        started = time.monotonic()
+        await asyncio.gather(*(c.run(PROFILES[profile], started + duration) for c in clients))
+        elapsed = time.monotonic() - started
+        cpu_after = await server_cpu(http)
+
+    all_latencies = [ms for values in recorder.latency_ms.values() for ms in values]
+    requests = len(all_latencies)
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "profile": profile,
+        "users": users,
+        "duration_seconds": round(elapsed, 2),
+        "summary": {
+            "requests": requests,
+            "errors": sum(recorder.errors.values()),
+            "rps": round(requests / elapsed, 2),
+            "latency_ms": percentiles(all_latencies),
+            "statuses": {str(k): v for k, v in sorted(recorder.statuses.items())},
+        },
+        "ops": {
+            op: {"requests": len(values), "errors": recorder.errors[op], "latency_ms": percentiles(values)}
+            for op, values in sorted(recorder.latency_ms.items())
+        },
+        "stream": {
+            "streams": len(recorder.ttft_ms),
+            "tokens": recorder.tokens,
+            "ttft_ms": percentiles(recorder.ttft_ms),
+            "server_cpu_seconds": round(cpu, 3) if cpu is not None else None,
+            # Whole-mix server CPU over streamed tokens; use --profile stream for a pure figure
+            "cpu_ms_per_token": round(cpu * 1000 / recorder.tokens, 4) if cpu is not None and recorder.tokens else None,
+        },
+    }
+
+
+def _lookup(result: dict, path: str):
+    for key in path.split("."):
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """Regressions beyond `threshold` (a fraction) on the compared metrics."""
+    regressions = []
+    for path, higher_is_better in COMPARED.items():
+        new, old = _lookup(result, path), _lookup(baseline, path)
+        if not new or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        marker = "REGRESSION" if worse > threshold else "ok"
+        print(f"  {path:<28} {old:>10} -> {new:>10}  {change:+7.1%}  {marker}")
+        if worse > threshold:
+            regressions.append(path)
+    return regressions
+
+
+def report(result: dict) -> None:
+    s, st = result["summary"], result["stream"]
+    print(f"profile={result['profile']} users={result['users']} duration={result['duration_seconds']}s")
+    print(f"requests={s['requests']} errors={s['errors']} rps={s['rps']}  latency ms {s['latency_ms']}")
+    print(f"{'op':<10} {'requests':>8} {'errors':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for op, o in result["ops"].items():
+        lat = o["latency_ms"]
+        print(f"{op:<10} {o['requests']:>8} {o['errors']:>6} {lat['p50']:>9} {lat['p95']:>9} {lat['p99']:>9}")
+    print(f"streams={st['streams']} tokens={st['tokens']} ttft ms {st['ttft_ms']}")
+    print(f"server cpu={st['server_cpu_seconds']}s  cpu per streamed token={st['cpu_ms_per_token']} ms")
+
+
+def start_server(argv: list[str], port: int) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.e2e_server", "--port", str(port), *argv])
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with {proc.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Benchmark server did not start within 60s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--save", type=Path, help="Write the result as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="Baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression, as a fraction")
+    args, server_argv = parser.parse_known_args()
+    server_args(server_argv)  # Fail fast on unknown fake-provider flags
+
+    proc = None if args.url else start_server(server_argv, args.port)
+    try:
+        result = asyncio.run(run_load(args.url or f"http://127.0.0.1:{args.port}", args.profile, args.users, args.duration, args.seed))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    result["server_args"] = server_argv
+    report(result)
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved {args.save}")
+    if args.compare:
+        print(f"Against {args.compare}:")
+        if compare(result, json.loads(args.compare.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Benchmark the per-observation cost of the in-process metrics.
+
+    python -m benchmarks.bench_metrics [iterations]
+
+Each line reports nanoseconds per call; hot-path observations should stay under 1000 ns.
+"""
+
+import sys
+import time
+
+from src.utils.metrics import Counter, Gauge, Histogram
+
+BUDGET_NS = 1000
+
+
+def per_call_ns(fn, n: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        best = min(best, (time.perf_counter_ns() - t0) / n)
+    return best
+
+
+def main(n: int) -> None:
+    counter = Counter("bench_total", "", ("route",))
+    gauge = Gauge("bench_open", "", ("endpoint",))
+    histogram = Histogram("bench_seconds", "", ("method", "route", "status"))
+    counter_child = counter.labels("/x")
+    gauge_child = gauge.labels("stream")
+    histogram_child = histogram.labels("GET", "/x", "200")
+
+    cases = {
+        "counter.inc (bound child)": counter_child.inc,
+        "gauge.inc (bound child)": gauge_child.inc,
+        "histogram.observe (bound child)": lambda: histogram_child.observe(0.042),
+        "histogram.labels().observe": lambda: histogram.labels("GET", "/x", "200").observe(0.042),
+    }
+    baseline = per_call_ns(lambda: None, n)
+    failed = False
+    for name, fn in cases.items():
+        ns = per_call_ns(fn, n) - baseline
+        failed |= ns > BUDGET_NS
+        print(f"{name:<34} {ns:7.1f} ns/op  {'ok' if ns <= BUDGET_NS else 'OVER BUDGET'}")
+    print(f"(loop + call overhead of {baseline:.1f} ns subtracted)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,222 @@
+"""Micro-benchmarks for the pure-CPU hot paths.
+
+    python -m benchmarks.bench_micro [-k FILTER] [--repeat 7] [--save FILE] [--compare FILE] [--threshold 0.10]
+
+Each case is timed like timeit: the loop count is calibrated so one repeat
+takes about --target seconds, then --repeat repeats are run and the per-call
+median, minimum and relative standard deviation are reported. --save writes
+the medians as a JSON baseline; --compare exits 1 when a case's median is more
+than --threshold slower than the baseline's.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import orjson
+
+from benchmarks.e2e_server import PLACEHOLDER_ENV
+
+MODEL = "llama-3.1-8b-instant"
+SENTENCE = "The quick brown fox jumps over the lazy dog while the assistant explains tokenization. "
+
+
+def _text(words: int) -> str:
+    base = SENTENCE.split()
+    return " ".join(base[i % len(base)] for i in range(words))
+
+
+def _conversation(n: int, words: int = 60) -> list[dict]:
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": _text(words)} for i in range(n)]
+
+
+def _message_rows(n: int) -> list[dict]:
+    conversation_id = str(uuid.uuid4())
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": _text(80),
+            "token_count": 96,
+            "model": MODEL if i % 2 else None,
+            "finish_reason": "stop" if i % 2 else None,
+            "latency_ms": 850 if i % 2 else None,
+            "metadata": {"input_tokens": 1200, "cached_input_tokens": 0, "cost_usd": 0.00012} if i % 2 else {},
+            "created_at": (start + timedelta(seconds=i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def _sliding_window(size: int) -> Callable[[], None]:
+    """_check_limit on a full window of `size` where each call expires exactly one entry, so the size stays put."""
+    from src.middleware.rate_limiter import RateLimiterMiddleware
+
+    limiter = RateLimiterMiddleware(app=None)
+    step = 60.0 / size
+    window = [i * step for i in range(size)]
+    clock = [60.0 + step / 2]
+
+    def call() -> None:
+        limiter._check_limit(window, size, clock[0])
+        clock[0] += step
+
+    return call
+
+
+def cases() -> dict[str, Callable[[], object]]:
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from src.auth.jwt import create_access_token, verify_token
+    from src.llm.context import build_context
+    from src.llm.token_counter import count_messages_tokens, count_tokens
+    from src.messages import streaming
+    from src.messages.schemas import MessageListResponse, SendMessageRequest
+    from src.middleware.compression import available_encoders
+    from src.utils.cost_tracker import estimate_cost
+    from src.utils.fastjson import FastJSONResponse
+
+    system_prompt = "You are a helpful assistant. Answer concisely and cite the conversation when relevant."
+    token = create_access_token(str(uuid.uuid4()), "bench@example.com")
+    request_id = str(uuid.uuid4())
+    timings = [("auth", 1.2), ("get_conversation", 3.4), ("admission", 0.1), ("build_context", 2.2), ("llm_ttft", 310.0), ("total", 1500.0)]
+
+    result: dict[str, Callable[[], object]] = {}
+    for n in (10, 100, 1000):
+        conversation = _conversation(n)
+        result[f"build_context[messages={n}]"] = lambda c=conversation: build_context(c, system_prompt, 6000, MODEL)
+    for words in (20, 1000, 10000):
+        text = _text(words)
+        result[f"count_tokens[words={words}]"] = lambda t=text: count_tokens(t, MODEL)
+    for n in (10, 100):
+        conversation = _conversation(n)
+        result[f"count_messages_tokens[messages={n}]"] = lambda c=conversation: count_messages_tokens(c)
+    for size in (100, 10_000):
+        result[f"rate_limiter._check_limit[window={size}]"] = _sliding_window(size)
+
+    short, long = "Hello", _text(200)
+    result["sse.message_start"] = lambda: streaming.format_message_start(request_id, MODEL)
+    result["sse.content_block_start"] = streaming.format_content_block_start
+    result["sse.content_block_delta[short]"] = lambda: streaming.format_content_block_delta(short)
+    result["sse.content_block_delta[long]"] = lambda: streaming.format_content_block_delta(long)
+    result["sse.content_block_stop"] = streaming.format_content_block_stop
+    result["sse.message_delta"] = lambda: streaming.format_message_delta("stop", 120)
+    result["sse.message_stop"] = streaming.format_message_stop
+    result["sse.timing"] = lambda: streaming.format_timing(request_id, timings)
+    result["sse.error"] = lambda: streaming.format_error("stream_error", "Provider connection reset")
+
+    result["verify_token"] = lambda: verify_token(token)
+    result["estimate_cost[registry]"] = lambda: estimate_cost(1200, 300, MODEL, 400)
+    result["estimate_cost[fallback]"] = lambda: estimate_cost(1200, 300, "unknown-model")
+
+    rows = _message_rows(200)
+    result["MessageListResponse[rows=200].validate"] = lambda: MessageListResponse(data=rows, page=1, per_page=200, total=200)
+    result["MessageListResponse[rows=200].dump_json"] = lambda: MessageListResponse(data=rows, page=1, per_page=200, total=200).model_dump_json()
+    # Whole response render for a 200-message page: the validated stdlib path vs the raw-row orjson path
+    page = {"status": "success", "data": rows, "page": 1, "per_page": 200, "total": 200, "next_cursor": None}
+    result["messages_page[rows=200].validated"] = lambda: JSONResponse(jsonable_encoder(MessageListResponse(**page)))
+    result["messages_page[rows=200].raw"] = lambda: FastJSONResponse(page)
+    rendered = FastJSONResponse(page).body
+    for coding, encode in available_encoders().items():
+        result[f"compress[{coding},rows=200]"] = lambda e=encode: e(rendered)
+
+    for words in (200, 20_000):
+        body = json.dumps({"content": _text(words), "model": MODEL}).encode()
+        result[f"SendMessageRequest[words={words}].stdlib"] = lambda b=body: SendMessageRequest.model_validate(json.loads(b))
+        result[f"SendMessageRequest[words={words}].orjson"] = lambda b=body: SendMessageRequest.model_validate(orjson.loads(b))
+    return result
+
+
+def measure(fn: Callable[[], object], repeat: int, target: float) -> dict[str, float]:
+    """Per-call seconds over `repeat` runs of a calibrated loop."""
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= target / 10:
+            break
+        number *= 10
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        runs.append((time.perf_counter() - t0) / number)
+    median = statistics.median(runs)
+    return {
+        "median": median,
+        "min": min(runs),
+        "rsd": statistics.stdev(runs) / statistics.mean(runs) if len(runs) > 1 else 0.0,
+        "loops": number,
+    }
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.1f} ns"
+
+
+def compare(results: dict[str, dict], baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get("cases", {}).get(name)
+        if old is None:
+            continue
+        change = (stats["median"] - old["median"]) / old["median"]
+        regressed = change > threshold
+        print(f"  {name:<44} {_fmt(old['median'])} -> {_fmt(stats['median'])}  {change:+7.1%}  {'REGRESSION' if regressed else 'ok'}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--target", type=float, default=0.2, help="Seconds per repeat")
+    parser.add_argument("--save", type=Path, help="Write medians as a JSON baseline")
+    parser.add_argument("--compare", type=Path, help="Baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown, as a fraction")
+    args = parser.parse_args()
+
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+
+    results = {}
+    print(f"{'case':<44} {'median':>11} {'min':>11} {'rsd':>6} {'loops':>9}")
+    for name, fn in cases().items():
+        if args.filter not in name:
+            continue
+        stats = results[name] = measure(fn, args.repeat, args.target)
+        print(f"{name:<44} {_fmt(stats['median'])} {_fmt(stats['min'])} {stats['rsd']:6.1%} {stats['loops']:>9}")
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"python": sys.version.split()[0], "cases": results}
+        args.save.write_text(json.dumps(payload, indent=2) + "\n")
+        print(f"Saved {args.save}")
+    if args.compare:
+        print(f"Against {args.compare}:")
+        if compare(results, json.loads(args.compare.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
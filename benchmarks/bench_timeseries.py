@@ -0,0 +1,50 @@
+"""Benchmark compute_timeseries on synthetic generations.
+
+    python -m benchmarks.bench_timeseries [n_messages]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from src.usage.timeseries import compute_timeseries
+
+MODELS = ["llama-3.1-8b-instant", "llama-3.3-70b-versatile", "gemini-1.5-flash", "mixtral-8x7b-32768"]
+
+
+def synthetic_columns(n: int, start: datetime, end: datetime, seed: int = 0) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    latency = rng.lognormal(6.5, 0.6, n)
+    latency[rng.random(n) < 0.01] = np.nan
+    output_tokens = rng.integers(1, 800, n)
+    input_tokens = rng.integers(10, 6000, n)
+    return {
+        "model_names": np.asarray(MODELS, dtype=object),
+        "model_idx": rng.integers(0, len(MODELS), n),
+        "created_at": rng.uniform(start.timestamp(), end.timestamp(), n),
+        "output_tokens": output_tokens,
+        "input_tokens": input_tokens,
+        "latency_ms": latency,
+        "cost_usd": (input_tokens * 5e-8 + output_tokens * 8e-8),
+    }
+
+
+def main(n: int) -> None:
+    end = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    start = end - timedelta(days=30)
+    columns = synthetic_columns(n, start, end)
+
+    for bucket in ("hour", "day"):
+        timings = []
+        for _ in range(5):
+            t0 = time.perf_counter()
+            series = compute_timeseries(columns, start, end, bucket)
+            timings.append(time.perf_counter() - t0)
+        points = sum(len(s["points"]) for s in series)
+        print(f"{n:>9,} messages  bucket={bucket:<4}  points={points:>5}  best={min(timings) * 1000:7.1f} ms  median={sorted(timings)[2] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,85 @@
+"""Run the app against the fake LLM providers and the in-memory store.
+
+    python -m benchmarks.e2e_server [--port 8765] [--ttft-ms 300] [--tokens-per-second 80] [--error-rate 0]
+
+Used by bench_e2e (which starts it as a subprocess, so the load generator's CPU
+isn't counted against the server), and usable on its own for manual testing.
+Rate limits are raised out of the way unless --keep-rate-limits is given.
+GET /__bench/cpu reports the process CPU time, for CPU-per-token figures.
+"""
+
+import argparse
+import os
+import time
+
+PLACEHOLDER_ENV = {
+    "SUPABASE_URL": "http://memory.invalid",
+    "SUPABASE_ANON_KEY": "unused",
+    "SUPABASE_SERVICE_ROLE_KEY": "unused",
+    "DATABASE_URL": "postgresql://memory.invalid/unused",
+    "JWT_SECRET": "benchmark-only-secret-" + "x" * 32,
+    "GROQ_API_KEY": "unused",
+}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--output-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of primary provider calls that fail (0-1)")
+    parser.add_argument("--keys", type=int, default=1, help="Fake Groq keys in the pool")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-rate-limits", action="store_true")
+    return parser.parse_args(argv)
+
+
+def install_fakes(args: argparse.Namespace):
+    """Point the app at the fakes; call before the first request. Returns the MemoryDatabase."""
+    from benchmarks.fakes import FakeLLMClient, FakeProviderConfig, MemoryDatabase
+    from src.config.settings import get_settings
+    from src.db.client import set_supabase
+    from src.llm.client import register_llm_client
+    from src.llm.pool import ProviderPool
+    from src.llm.scheduler import RateLimitScheduler, TokenBudget
+
+    settings = get_settings()
+    db = MemoryDatabase()
+    set_supabase(db)
+
+    def config(seed: int, error_rate: float) -> FakeProviderConfig:
+        return FakeProviderConfig(args.ttft_ms, args.tokens_per_second, args.output_tokens, error_rate, seed)
+
+    # The real pool and scheduler, so their overhead is part of what's measured
+    register_llm_client("groq", ProviderPool(
+        "groq",
+        [FakeLLMClient(config(args.seed + i, args.error_rate)) for i in range(args.keys)],
+        RateLimitScheduler([TokenBudget() for _ in range(args.keys)], settings.LLM_SCHEDULER_MAX_WAIT_SECONDS),
+    ))
+    register_llm_client("google", FakeLLMClient(config(args.seed, 0.0), provider="google"))
+    return db
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+    if not args.keep_rate_limits:
+        os.environ["RATE_LIMIT_STANDARD"] = os.environ["RATE_LIMIT_AI"] = "1000000"
+
+    import uvicorn
+
+    install_fakes(args)
+    from src.main import app
+
+    @app.get("/__bench/cpu", include_in_schema=False)
+    async def cpu():
+        return {"cpu_seconds": time.process_time(), "pid": os.getpid()}
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
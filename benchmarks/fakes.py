@@ -0,0 +1,342 @@
+"""Deterministic stand-ins for the LLM providers and Supabase, for load benchmarks.
+
+FakeLLMClient streams canned text at a fixed time-to-first-token and
+tokens/sec and fails a configurable share of calls the way Groq does
+(APIConnectionError), so the pool's retry and the Google fallback run too.
+
+MemoryDatabase implements the subset of the Supabase query builder the app
+uses (select/insert/update/delete with eq, in_, is_, the keyset or_ filter,
+order, limit and range) over dicts, and emulates the schema's defaults and
+the message counter and usage ledger triggers. It is not a database: no
+constraints, no RPCs but import_conversations, one lock around every query. Equality filters on the
+indexed columns below are served from a hash index, so query cost stays flat
+as a run grows the tables.
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+import uuid
+from collections.abc import AsyncGenerator, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import httpx
+
+from src.llm.client import LLMClient
+
+WORDS = (
+    "the request was served from the pool and streamed back token by token while the "
+    "context window kept the first message and the most recent turns within budget"
+).split()
+
+
+@dataclass
+class FakeProviderConfig:
+    ttft_ms: float = 300.0
+    tokens_per_second: float = 80.0
+    output_tokens: int = 120
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class FakeLLMClient(LLMClient):
+    def __init__(self, config: FakeProviderConfig, provider: str = "groq"):
+        self._config = config
+        self._provider = provider
+        self._random = random.Random(config.seed)
+
+    def _maybe_fail(self) -> None:
+        if self._random.random() < self._config.error_rate:
+            from groq import APIConnectionError
+            raise APIConnectionError(message="Fake provider error", request=httpx.Request("POST", f"https://{self._provider}.invalid"))
+
+    def _usage(self, messages: list[dict]) -> dict:
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return {"input_tokens": prompt_chars // 4, "output_tokens": self._config.output_tokens, "cached_input_tokens": 0}
+
+    def _token(self, i: int) -> str:
+        return WORDS[i % len(WORDS)] + " "
+
+    async def generate(self, messages: list[dict], model: str, on_headers: Callable | None = None) -> dict:
+        config = self._config
+        await asyncio.sleep(config.ttft_ms / 1000)
+        self._maybe_fail()
+        await asyncio.sleep(config.output_tokens / config.tokens_per_second)
+        return {
+            "content": "".join(self._token(i) for i in range(config.output_tokens)).rstrip(),
+            "finish_reason": "stop",
+            **self._usage(messages),
+        }
+
+    async def generate_stream(self, messages: list[dict], model: str, on_headers: Callable | None = None) -> AsyncGenerator[dict, None]:
+        config = self._config
+        await asyncio.sleep(config.ttft_ms / 1000)
+        self._maybe_fail()
+        # Pace against a start time so per-token sleep overhead doesn't lower the rate
+        started = time.monotonic()
+        for i in range(config.output_tokens):
+            delay = started + i / config.tokens_per_second - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield {"type": "delta", "content": self._token(i)}
+        yield {"type": "finish", "finish_reason": "stop", "usage": self._usage(messages)}
+
+
+# --- In-memory Supabase ---
+
+_DEFAULTS = {
+    "users": {},
+    "conversations": {
+        "title": None, "model": None, "system_prompt": None, "metadata": {}, "is_archived": False,
+        "message_count": 0, "last_message_at": None, "total_tokens": 0, "input_tokens": 0, "cost_usd": 0,
+        "summary": None, "summary_through_id": None, "summary_through_at": None,
+    },
+    "messages": {"token_count": None, "model": None, "finish_reason": None, "latency_ms": None, "metadata": {}},
+    "api_keys": {"name": None, "scopes": [], "last_used_at": None, "expires_at": None, "is_active": True},
+    "refresh_tokens": {"is_revoked": False},
+    "usage_daily": {},
+}
+_INDEXED = {
+    "users": ("id", "email"),
+    "conversations": ("id", "user_id"),
+    "messages": ("id", "conversation_id"),
+    "api_keys": ("id", "key_hash"),
+    "refresh_tokens": ("id", "token_hash"),
+    "usage_daily": ("user_id",),
+}
+# Columns whose update bumps conversations.updated_at (the conversations_updated_at trigger)
+_USER_VISIBLE = {"title", "model", "system_prompt", "metadata", "is_archived"}
+_KEYSET = re.compile(r'^(\w+)\.(lt|gt)\."([^"]*)",and\(\1\.eq\."([^"]*)",id\.(lt|gt)\."([^"]*)"\)$')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class _Result:
+    data: list[dict]
+    count: int | None = None
+
+
+class _Rpc:
+    def __init__(self, fn: Callable[[], object]):
+        self._fn = fn
+
+    def execute(self) -> _Result:
+        return _Result(self._fn())
+
+
+class _Query:
+    def __init__(self, db: "MemoryDatabase", table: str):
+        self._db = db
+        self._table = table
+        self._op = "select"
+        self._columns: list[str] | None = None
+        self._count: str | None = None
+        self._head = False
+        self._payload = None
+        self._filters: list[Callable[[dict], bool]] = []
+        self._lookup: tuple[str, object] | None = None
+        self._orders: list[tuple[str, bool]] = []
+        self._limit: int | None = None
+        self._offset = 0
+
+    def select(self, columns: str = "*", count: str | None = None, head: bool = False) -> "_Query":
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self._count = count
+        self._head = head
+        return self
+
+    def insert(self, rows: dict | list[dict]) -> "_Query":
+        self._op, self._payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, data: dict) -> "_Query":
+        self._op, self._payload = "update", data
+        return self
+
+    def delete(self) -> "_Query":
+        self._op = "delete"
+        return self
+
+    def eq(self, column: str, value) -> "_Query":
+        if self._lookup is None and column in _INDEXED[self._table]:
+            self._lookup = (column, value)
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column: str, values) -> "_Query":
+        values = set(values)
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def is_(self, column: str, value: str) -> "_Query":
+        if value != "null":
+            raise NotImplementedError(f"is_({column!r}, {value!r})")
+        self._filters.append(lambda r: r.get(column) is None)
+        return self
+
+    def or_(self, expression: str) -> "_Query":
+        match = _KEYSET.match(expression)
+        if not match:
+            raise NotImplementedError(f"or_ filter {expression!r}")
+        column, op, value, _, _, row_id = match.groups()
+        after = (lambda a, b: a > b) if op == "gt" else (lambda a, b: a < b)
+        self._filters.append(lambda r: after(r[column], value) or (r[column] == value and after(r["id"], row_id)))
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "_Query":
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, n: int) -> "_Query":
+        self._limit = n
+        return self
+
+    def range(self, start: int, end: int) -> "_Query":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def execute(self) -> _Result:
+        with self._db.lock:
+            return getattr(self, f"_{self._op}")()
+
+    def _matching(self) -> list[dict]:
+        if self._lookup is not None:
+            column, value = self._lookup
+            rows = self._db.indexes[self._table][column].get(value, ())
+        else:
+            rows = self._db.tables[self._table]
+        return [r for r in rows if all(f(r) for f in self._filters)]
+
+    def _project(self, row: dict) -> dict:
+        return dict(row) if self._columns is None else {c: row.get(c) for c in self._columns}
+
+    def _select(self) -> _Result:
+        rows = self._matching()
+        # Stable sorts applied last-key-first give the multi-column order
+        for column, desc in reversed(self._orders):
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column) or ""), reverse=desc)
+        count = len(rows) if self._count in ("exact", "estimated", "planned") else None
+        if self._head:
+            return _Result([], count)
+        end = None if self._limit is None else self._offset + self._limit
+        return _Result([self._project(r) for r in rows[self._offset:end]], count)
+
+    def _insert(self) -> _Result:
+        inserted = []
+        for row in self._payload:
+            row = {"id": str(uuid.uuid4()), **_DEFAULTS[self._table], "created_at": _now(), **row}
+            if self._table == "conversations":
+                row.setdefault("updated_at", row["created_at"])
+            self._db.add(self._table, row)
+            if self._table == "messages":
+                self._db.on_message_insert(row)
+            inserted.append(dict(row))
+        return _Result(inserted)
+
+    def _update(self) -> _Result:
+        rows = self._matching()
+        for row in rows:
+            row.update(self._payload)
+            if self._table == "conversations" and _USER_VISIBLE & self._payload.keys():
+                row["updated_at"] = _now()
+        return _Result([dict(r) for r in rows])
+
+    def _delete(self) -> _Result:
+        rows = self._matching()
+        self._db.remove(self._table, {id(r) for r in rows})
+        if self._table == "conversations":
+            ids = {r["id"] for r in rows}
+            messages = [m for m in self._db.tables["messages"] if m["conversation_id"] in ids]
+            for conv in rows:
+                self._db.on_conversation_delete(conv, [m for m in messages if m["conversation_id"] == conv["id"]])
+            self._db.remove("messages", {id(m) for m in messages})
+        return _Result([dict(r) for r in rows])
+
+
+class MemoryDatabase:
+    def __init__(self):
+        self.tables: dict[str, list[dict]] = {name: [] for name in _DEFAULTS}
+        self.indexes: dict[str, dict[str, dict]] = {name: {c: {} for c in _INDEXED[name]} for name in _DEFAULTS}
+        self.lock = threading.RLock()
+
+    def add(self, table: str, row: dict) -> None:
+        self.tables[table].append(row)
+        for column, index in self.indexes[table].items():
+            index.setdefault(row.get(column), []).append(row)
+
+    def remove(self, table: str, row_ids: set[int]) -> None:
+        """Drop rows by object identity and rebuild the table's indexes."""
+        self.tables[table] = [r for r in self.tables[table] if id(r) not in row_ids]
+        for column, index in self.indexes[table].items():
+            index.clear()
+            for row in self.tables[table]:
+                index.setdefault(row.get(column), []).append(row)
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: dict) -> "_Rpc":
+        if name != "import_conversations":
+            raise NotImplementedError(f"RPC {name} is not emulated by MemoryDatabase")
+        return _Rpc(lambda: self._import_conversations(params["target_user"], params["batch"]))
+
+    def _import_conversations(self, user_id: str, batch: list[dict]) -> list[str]:
+        ids = []
+        for entry in batch:
+            if "conversation" in entry:
+                conv = self.table("conversations").insert({**entry["conversation"], "user_id": user_id}).execute().data[0]
+                conversation_id = conv["id"]
+            else:
+                conversation_id = entry["conversation_id"]
+            if entry.get("messages"):
+                rows = [{**m, "conversation_id": conversation_id, "created_at": m.get("created_at") or _now()} for m in entry["messages"]]
+                self.table("messages").insert(rows).execute()
+            ids.append(conversation_id)
+        return ids
+
+    def on_message_insert(self, message: dict) -> None:
+        """The messages_counters and messages_usage triggers."""
+        convs = self.indexes["conversations"]["id"].get(message["conversation_id"])
+        if not convs:
+            return
+        conv = convs[0]
+        metadata = message.get("metadata") or {}
+        tokens = message.get("token_count") or 0
+        conv["message_count"] += 1
+        conv["last_message_at"] = max(filter(None, (conv["last_message_at"], message["created_at"])))
+        conv["total_tokens"] += tokens
+        conv["input_tokens"] += metadata.get("input_tokens", 0)
+        conv["cost_usd"] += metadata.get("cost_usd", 0)
+        self._record_usage(conv, message, 1)
+
+    def on_conversation_delete(self, conv: dict, messages: list[dict]) -> None:
+        """The conversations_usage trigger: take the conversation's usage back out of the ledger."""
+        for message in messages:
+            self._record_usage(conv, message, -1)
+
+    def _record_usage(self, conv: dict, message: dict, sign: int) -> None:
+        metadata = message.get("metadata") or {}
+        tokens = message.get("token_count") or 0
+        generation = message["role"] == "assistant"
+        key = (conv["user_id"], message["created_at"][:10], message.get("model") or conv.get("model") or "")
+        rollups = self.indexes["usage_daily"]["user_id"].get(key[0], ())
+        rollup = next((u for u in rollups if (u["day"], u["model"]) == key[1:]), None)
+        if rollup is None:
+            if sign < 0:
+                return
+            rollup = dict(zip(("user_id", "day", "model"), key), message_count=0, generation_count=0, total_tokens=0,
+                          input_tokens=0, output_tokens=0, cached_input_tokens=0, cost_usd=0)
+            self.add("usage_daily", rollup)
+        rollup["message_count"] += sign
+        rollup["generation_count"] += sign * generation
+        rollup["total_tokens"] += sign * tokens
+        rollup["input_tokens"] += sign * metadata.get("input_tokens", 0)
+        rollup["output_tokens"] += sign * (tokens if generation else 0)
+        rollup["cached_input_tokens"] += sign * metadata.get("cached_input_tokens", 0)
+        rollup["cost_usd"] += sign * metadata.get("cost_usd", 0)
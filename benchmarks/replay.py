@@ -0,0 +1,297 @@
+"""Replay a traffic capture (TRAFFIC_CAPTURE_PATH) against a test instance.
+
+    python -m benchmarks.replay CAPTURE [--speed 1] [--url URL] [--save FILE] [fake provider flags]
+
+Without --url, starts benchmarks.e2e_server (fake providers, in-memory store)
+with the fake reply length set from the capture's streamed deltas.
+
+Setup: one replay user is registered per captured user, and each captured
+conversation is imported with as many messages as it had when first seen, so
+context building works on realistic lengths. Then every captured request is
+sent at its original offset divided by --speed: message bodies are synthesized
+at the captured token count, list calls keep their page size, and event
+streams stay open for their captured duration. Logout, refresh, imports,
+exports and admin calls are skipped. Reports latency per route next to the
+captured latency, and how late requests were dispatched.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_e2e import percentiles, start_server
+from benchmarks.e2e_server import parse_args as server_args
+
+API = "/api/v1"
+WORDS = "please explain how the context window handles long conversations with many earlier turns".split()
+# Routes replayed as-is (GET) or with a synthesized body; anything else is counted as skipped
+REPLAYED = {
+    ("POST", f"{API}/auth/login"),
+    ("POST", f"{API}/auth/register"),
+    ("GET", f"{API}/conversations"),
+    ("POST", f"{API}/conversations"),
+    ("GET", f"{API}/conversations/{{conversation_id}}"),
+    ("PATCH", f"{API}/conversations/{{conversation_id}}"),
+    ("GET", f"{API}/conversations/{{conversation_id}}/messages"),
+    ("POST", f"{API}/conversations/{{conversation_id}}/messages"),
+    ("POST", f"{API}/conversations/{{conversation_id}}/messages/stream"),
+    ("GET", f"{API}/conversations/{{conversation_id}}/events"),
+    ("GET", f"{API}/usage/stats"),
+    ("GET", f"{API}/usage/timeseries"),
+    ("GET", f"{API}/models"),
+}
+PASSWORD = "ReplayPass123"
+
+
+def load_capture(path: Path) -> list[dict]:
+    records = [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+    return sorted(records, key=lambda r: r["t"])
+
+
+def synthesize(tokens: int | None) -> str:
+    # About 0.75 words per token for English prose
+    words = max(1, round((tokens or 20) * 0.75))
+    return " ".join(WORDS[i % len(WORDS)] for i in range(words))
+
+
+class Session:
+    def __init__(self, email: str, headers: dict[str, str]):
+        self.email = email
+        self.headers = headers
+
+
+class Replayer:
+    def __init__(self, http: httpx.AsyncClient, records: list[dict], speed: float, max_event_seconds: float):
+        self._http = http
+        self._records = records
+        self._speed = speed
+        self._max_event_seconds = max_event_seconds
+        self._sessions: dict[str, Session] = {}
+        self._conversations: dict[str, str] = {}
+        self.latency_ms: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.statuses: dict[int, int] = defaultdict(int)
+        self.skipped: dict[str, int] = defaultdict(int)
+        self.lag_ms: list[float] = []
+        self.ttft_ms: list[float] = []
+
+    async def _register(self) -> Session:
+        email = f"replay_{uuid.uuid4().hex[:12]}@example.com"
+        resp = await self._http.post(f"{API}/auth/register", json={"email": email, "password": PASSWORD})
+        resp.raise_for_status()
+        return Session(email, {"Authorization": f"Bearer {resp.json()['data']['access_token']}"})
+
+    async def setup(self) -> None:
+        """Register captured users and import their conversations at their first-seen length."""
+        users = {r["user"] for r in self._records if r.get("user")}
+        sessions = await asyncio.gather(*(self._register() for _ in users))
+        self._sessions = dict(zip(users, sessions))
+
+        history: dict[tuple[str, str], int] = {}
+        sizes = [r["content_tokens"] for r in self._records if r.get("content_tokens")]
+        typical = int(statistics.median(sizes)) if sizes else 40
+        for r in self._records:
+            if r.get("user") and r.get("conversation"):
+                history.setdefault((r["user"], r["conversation"]), r.get("history_messages") or 0)
+
+        by_user: dict[str, list[tuple[str, int]]] = defaultdict(list)
+        for (user, conversation), count in history.items():
+            by_user[user].append((conversation, count))
+        await asyncio.gather(*(self._import(user, convs, typical) for user, convs in by_user.items()))
+
+    async def _import(self, user: str, conversations: list[tuple[str, int]], typical_tokens: int) -> None:
+        session = self._sessions[user]
+        lines = []
+        for conversation, count in conversations:
+            lines.append({"type": "conversation", "title": f"replay-{conversation}"})
+            lines.extend(
+                {"type": "message", "role": "user" if i % 2 == 0 else "assistant", "content": synthesize(typical_tokens)}
+                for i in range(count)
+            )
+        body = "".join(json.dumps(line) + "\n" for line in lines)
+        resp = await self._http.post(f"{API}/conversations/import", content=body, headers=session.headers)
+        resp.raise_for_status()
+
+        cursor = None
+        while True:
+            params = {"per_page": 100, **({"cursor": cursor} if cursor else {})}
+            page = (await self._http.get(f"{API}/conversations", params=params, headers=session.headers)).json()
+            for conv in page["data"]:
+                if (conv.get("title") or "").startswith("replay-"):
+                    self._conversations[conv["title"].removeprefix("replay-")] = conv["id"]
+            cursor = page.get("next_cursor")
+            if not cursor:
+                break
+
+    def _session(self, record: dict) -> Session | None:
+        if record.get("user"):
+            return self._sessions.get(record["user"])
+        return random.choice(list(self._sessions.values())) if self._sessions else None
+
+    async def run(self) -> float:
+        start = time.monotonic()
+        first = self._records[0]["t"] if self._records else 0.0
+        tasks = []
+        for record in self._records:
+            if (record["method"], record["route"]) not in REPLAYED:
+                self.skipped[record["route"]] += 1
+                continue
+            due = start + (record["t"] - first) / self._speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lag_ms.append(max(0.0, -delay) * 1000)
+            tasks.append(asyncio.create_task(self._send(record)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - start
+
+    async def _send(self, record: dict) -> None:
+        key = f"{record['method']} {record['route']}"
+        session = self._session(record)
+        conversation_id = self._conversations.get(record.get("conversation") or "")
+        if session is None or ("{conversation_id}" in record["route"] and conversation_id is None):
+            self.skipped[record["route"]] += 1
+            return
+        path = record["route"].replace("{conversation_id}", conversation_id or "")
+        started = time.perf_counter()
+        try:
+            status = await self._request(record, path, session, started)
+        except httpx.HTTPError:
+            status = 599
+        self.latency_ms[key].append((time.perf_counter() - started) * 1000)
+        self.statuses[status] += 1
+        if status >= 400:
+            self.errors[key] += 1
+
+    async def _request(self, record: dict, path: str, session: Session, started: float) -> int:
+        method, route = record["method"], record["route"]
+        if route == f"{API}/auth/login":
+            resp = await self._http.post(path, json={"email": session.email, "password": PASSWORD})
+        elif route == f"{API}/auth/register":
+            resp = await self._http.post(path, json={"email": f"replay_{uuid.uuid4().hex[:12]}@example.com", "password": PASSWORD})
+        elif method == "POST" and route == f"{API}/conversations":
+            resp = await self._http.post(path, json={"title": "Replay"}, headers=session.headers)
+        elif method == "PATCH":
+            resp = await self._http.patch(path, json={"title": f"Replay {uuid.uuid4().hex[:6]}"}, headers=session.headers)
+        elif route.endswith("/events"):
+            return await self._hold_events(path, session, record)
+        elif route.endswith("/messages/stream"):
+            return await self._stream(path, session, record, started)
+        elif method == "POST":
+            resp = await self._http.post(path, json=self._message_body(record), headers=session.headers)
+        else:
+            resp = await self._http.get(path, params=record.get("query") or {}, headers=session.headers)
+        return resp.status_code
+
+    def _message_body(self, record: dict) -> dict:
+        body = {"content": f"{uuid.uuid4().hex[:8]} {synthesize(record.get('content_tokens'))}", "thinking": record.get("thinking", False)}
+        return body | ({"model": record["model"]} if record.get("model") else {})
+
+    async def _stream(self, path: str, session: Session, record: dict, started: float) -> int:
+        async with self._http.stream("POST", path, json=self._message_body(record), headers=session.headers) as resp:
+            if resp.status_code != 200:
+                return resp.status_code
+            async for line in resp.aiter_lines():
+                if line == "event: content_block_delta" and started:
+                    self.ttft_ms.append((time.perf_counter() - started) * 1000)
+                    started = 0.0
+                elif line == "event: error":
+                    return 502
+        return 200
+
+    async def _hold_events(self, path: str, session: Session, record: dict) -> int:
+        hold = min((record.get("duration_ms") or 0) / 1000 / self._speed, self._max_event_seconds)
+        async with self._http.stream("GET", path, headers=session.headers) as resp:
+            if resp.status_code == 200:
+                try:
+                    await asyncio.wait_for(resp.aread(), timeout=hold)
+                except asyncio.TimeoutError:
+                    pass
+            return resp.status_code
+
+
+def summarize(records: list[dict], replayer: Replayer, elapsed: float, speed: float) -> dict:
+    captured: dict[str, list[float]] = defaultdict(list)
+    for r in records:
+        if r.get("duration_ms") is not None and not r.get("stream") and not r["route"].endswith("/events"):
+            captured[f"{r['method']} {r['route']}"].append(r["duration_ms"])
+    sent = sum(len(v) for v in replayer.latency_ms.values())
+    return {
+        "speed": speed,
+        "captured_requests": len(records),
+        "replayed_requests": sent,
+        "duration_seconds": round(elapsed, 2),
+        "rps": round(sent / elapsed, 2) if elapsed else None,
+        "dispatch_lag_ms": percentiles(replayer.lag_ms),
+        "ttft_ms": percentiles(replayer.ttft_ms),
+        "statuses": {str(k): v for k, v in sorted(replayer.statuses.items())},
+        "routes": {
+            key: {
+                "requests": len(values),
+                "errors": replayer.errors[key],
+                "latency_ms": percentiles(values),
+                "captured_latency_ms": percentiles(captured.get(key, [])),
+            }
+            for key, values in sorted(replayer.latency_ms.items())
+        },
+        "skipped": dict(replayer.skipped),
+    }
+
+
+def report(result: dict) -> None:
+    print(f"speed={result['speed']}x  replayed {result['replayed_requests']}/{result['captured_requests']} requests in {result['duration_seconds']}s ({result['rps']} rps)")
+    print(f"dispatch lag ms {result['dispatch_lag_ms']}  ttft ms {result['ttft_ms']}  statuses {result['statuses']}")
+    print(f"{'route':<62} {'n':>6} {'err':>5} {'p50':>9} {'p95':>9} {'cap p50':>9} {'cap p95':>9}")
+    for key, r in result["routes"].items():
+        lat, cap = r["latency_ms"], r["captured_latency_ms"]
+        print(f"{key:<62} {r['requests']:>6} {r['errors']:>5} {lat['p50']!s:>9} {lat['p95']!s:>9} {cap['p50']!s:>9} {cap['p95']!s:>9}")
+    if result["skipped"]:
+        print(f"skipped: {result['skipped']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture", type=Path)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up; 10 sends the capture ten times faster")
+    parser.add_argument("--url", help="Replay against a running instance instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-event-seconds", type=float, default=30.0, help="Cap on how long an event stream is held open")
+    parser.add_argument("--save", type=Path, help="Write the result as JSON")
+    args, server_argv = parser.parse_known_args()
+
+    records = load_capture(args.capture)
+    deltas = [r["stream_deltas"] for r in records if r.get("stream_deltas")]
+    if deltas and "--output-tokens" not in server_argv:
+        server_argv += ["--output-tokens", str(int(statistics.median(deltas)))]
+    server_args(server_argv)
+
+    async def replay() -> dict:
+        async with httpx.AsyncClient(base_url=args.url or f"http://127.0.0.1:{args.port}", timeout=120) as http:
+            replayer = Replayer(http, records, args.speed, args.max_event_seconds)
+            await replayer.setup()
+            elapsed = await replayer.run()
+        return summarize(records, replayer, elapsed, args.speed)
+
+    proc = None if args.url else start_server(server_argv, args.port)
+    try:
+        result = asyncio.run(replay())
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    report(result)
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Saved {args.save}")
+
+
+if __name__ == "__main__":
+    main()
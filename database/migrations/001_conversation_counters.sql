@@ -0,0 +1,94 @@
+-- Add the denormalized conversation counters to a database created before them.
+-- Run once in the Supabase SQL Editor. Columns, trigger and backfill commit together,
+-- and messages are locked against writes meanwhile, so no insert lands between the
+-- backfill and the trigger taking over (which would leave that conversation's
+-- counters short, and could re-trigger auto-title on an old conversation).
+
+BEGIN;
+
+LOCK TABLE messages IN SHARE MODE;
+
+ALTER TABLE conversations
+    ADD COLUMN IF NOT EXISTS message_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS total_tokens BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS input_tokens BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS cost_usd NUMERIC(14, 8) NOT NULL DEFAULT 0;
+
+-- Only user-visible edits bump updated_at; counter maintenance does not
+DROP TRIGGER IF EXISTS conversations_updated_at ON conversations;
+CREATE TRIGGER conversations_updated_at
+    BEFORE UPDATE OF title, model, system_prompt, metadata, is_archived ON conversations
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at();
+
+CREATE OR REPLACE FUNCTION update_conversation_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE conversations SET
+            message_count = message_count + 1,
+            last_message_at = GREATEST(last_message_at, NEW.created_at),
+            total_tokens = total_tokens + COALESCE(NEW.token_count, 0),
+            input_tokens = input_tokens + COALESCE((NEW.metadata->>'input_tokens')::BIGINT, 0),
+            cost_usd = cost_usd + COALESCE((NEW.metadata->>'cost_usd')::NUMERIC, 0)
+        WHERE id = NEW.conversation_id;
+        RETURN NEW;
+    END IF;
+
+    UPDATE conversations SET
+        message_count = GREATEST(message_count - 1, 0),
+        -- Recompute only when the newest message went; idx_msg_conv makes this an index probe
+        last_message_at = CASE
+            WHEN OLD.created_at < last_message_at THEN last_message_at
+            ELSE (SELECT MAX(created_at) FROM messages WHERE conversation_id = OLD.conversation_id)
+        END,
+        total_tokens = total_tokens - COALESCE(OLD.token_count, 0),
+        input_tokens = input_tokens - COALESCE((OLD.metadata->>'input_tokens')::BIGINT, 0),
+        cost_usd = cost_usd - COALESCE((OLD.metadata->>'cost_usd')::NUMERIC, 0)
+    WHERE id = OLD.conversation_id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_counters ON messages;
+CREATE TRIGGER messages_counters
+    AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION update_conversation_counters();
+
+CREATE OR REPLACE FUNCTION reconcile_conversation_counters(target_id UUID DEFAULT NULL)
+RETURNS INT AS $$
+DECLARE
+    fixed INT;
+BEGIN
+    WITH totals AS (
+        SELECT
+            c.id,
+            COUNT(m.id)::INT AS message_count,
+            MAX(m.created_at) AS last_message_at,
+            COALESCE(SUM(m.token_count), 0) AS total_tokens,
+            COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0) AS input_tokens,
+            COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0) AS cost_usd
+        FROM conversations c
+        LEFT JOIN messages m ON m.conversation_id = c.id
+        WHERE target_id IS NULL OR c.id = target_id
+        GROUP BY c.id
+    )
+    UPDATE conversations c SET
+        message_count = t.message_count,
+        last_message_at = t.last_message_at,
+        total_tokens = t.total_tokens,
+        input_tokens = t.input_tokens,
+        cost_usd = t.cost_usd
+    FROM totals t
+    WHERE c.id = t.id
+      AND (c.message_count, c.last_message_at, c.total_tokens, c.input_tokens, c.cost_usd)
+          IS DISTINCT FROM (t.message_count, t.last_message_at, t.total_tokens, t.input_tokens, t.cost_usd);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill existing conversations from their messages
+SELECT reconcile_conversation_counters();
+
+COMMIT;
@@ -0,0 +1,15 @@
+-- Rebuild the listing indexes with id as the keyset-pagination tie-breaker.
+-- Run once in the Supabase SQL Editor. Writes to each table are blocked while its
+-- index is rebuilt; on a large table, run each DROP/CREATE pair on its own with
+-- DROP INDEX CONCURRENTLY / CREATE INDEX CONCURRENTLY instead (outside a transaction).
+
+BEGIN;
+
+DROP INDEX IF EXISTS idx_conv_user_updated;
+-- id is the keyset-pagination tie-breaker
+CREATE INDEX idx_conv_user_updated ON conversations(user_id, updated_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_msg_conv;
+CREATE INDEX idx_msg_conv ON messages(conversation_id, created_at, id);
+
+COMMIT;
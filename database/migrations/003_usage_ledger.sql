@@ -0,0 +1,202 @@
+-- Add the per-user usage ledger to a database created before it.
+-- Run once in the Supabase SQL Editor. Table, triggers and backfill commit together,
+-- and conversations and messages are locked against writes meanwhile, so no insert
+-- or delete lands between the backfill and the triggers taking over.
+--
+-- The backfill here has no price list, so assistant messages written before
+-- per-message cost metadata count at zero cost. Afterwards, run
+--     python -m src.usage.ledger
+-- to price them from the model registry and rebuild the ledger.
+
+BEGIN;
+
+LOCK TABLE conversations, messages IN SHARE MODE;
+
+-- Per-user, per-model, per-day usage rollups, maintained by trigger on messages
+CREATE TABLE IF NOT EXISTS usage_daily (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    model VARCHAR(100) NOT NULL DEFAULT '',
+    message_count INT NOT NULL DEFAULT 0,
+    generation_count INT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    -- Input tokens the provider served from its prompt cache
+    cached_input_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 8) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, model)
+);
+
+-- The ledger counts the messages that currently exist, like conversation_count:
+-- inserts add to it, and deleting a message or a whole conversation takes its usage back out.
+CREATE OR REPLACE FUNCTION record_message_usage()
+RETURNS TRIGGER AS $$
+DECLARE
+    is_generation BOOLEAN;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        -- Under a conversation delete the conversation row is already gone, so this matches
+        -- nothing; forget_conversation_usage has taken the whole conversation out beforehand
+        is_generation := OLD.role = 'assistant';
+        UPDATE usage_daily u SET
+            message_count = GREATEST(u.message_count - 1, 0),
+            generation_count = GREATEST(u.generation_count - CASE WHEN is_generation THEN 1 ELSE 0 END, 0),
+            total_tokens = u.total_tokens - COALESCE(OLD.token_count, 0),
+            input_tokens = u.input_tokens - COALESCE((OLD.metadata->>'input_tokens')::BIGINT, 0),
+            output_tokens = u.output_tokens - CASE WHEN is_generation THEN COALESCE(OLD.token_count, 0) ELSE 0 END,
+            cached_input_tokens = u.cached_input_tokens - COALESCE((OLD.metadata->>'cached_input_tokens')::BIGINT, 0),
+            cost_usd = u.cost_usd - COALESCE((OLD.metadata->>'cost_usd')::NUMERIC, 0)
+        FROM conversations c
+        WHERE c.id = OLD.conversation_id
+          AND u.user_id = c.user_id
+          AND u.day = (OLD.created_at AT TIME ZONE 'UTC')::DATE
+          AND u.model = COALESCE(OLD.model, c.model, '');
+        RETURN OLD;
+    END IF;
+
+    is_generation := NEW.role = 'assistant';
+    INSERT INTO usage_daily AS u (
+        user_id, day, model, message_count, generation_count,
+        total_tokens, input_tokens, output_tokens, cached_input_tokens, cost_usd
+    )
+    SELECT
+        c.user_id,
+        (NEW.created_at AT TIME ZONE 'UTC')::DATE,
+        COALESCE(NEW.model, c.model, ''),
+        1,
+        CASE WHEN is_generation THEN 1 ELSE 0 END,
+        COALESCE(NEW.token_count, 0),
+        COALESCE((NEW.metadata->>'input_tokens')::BIGINT, 0),
+        CASE WHEN is_generation THEN COALESCE(NEW.token_count, 0) ELSE 0 END,
+        COALESCE((NEW.metadata->>'cached_input_tokens')::BIGINT, 0),
+        COALESCE((NEW.metadata->>'cost_usd')::NUMERIC, 0)
+    FROM conversations c
+    WHERE c.id = NEW.conversation_id
+    ON CONFLICT (user_id, day, model) DO UPDATE SET
+        message_count = u.message_count + EXCLUDED.message_count,
+        generation_count = u.generation_count + EXCLUDED.generation_count,
+        total_tokens = u.total_tokens + EXCLUDED.total_tokens,
+        input_tokens = u.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = u.output_tokens + EXCLUDED.output_tokens,
+        cached_input_tokens = u.cached_input_tokens + EXCLUDED.cached_input_tokens,
+        cost_usd = u.cost_usd + EXCLUDED.cost_usd;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_usage ON messages;
+CREATE TRIGGER messages_usage
+    AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION record_message_usage();
+
+-- Take a conversation's usage out of the ledger before its messages are cascade-deleted
+CREATE OR REPLACE FUNCTION forget_conversation_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE usage_daily u SET
+        message_count = GREATEST(u.message_count - t.message_count, 0),
+        generation_count = GREATEST(u.generation_count - t.generation_count, 0),
+        total_tokens = u.total_tokens - t.total_tokens,
+        input_tokens = u.input_tokens - t.input_tokens,
+        output_tokens = u.output_tokens - t.output_tokens,
+        cached_input_tokens = u.cached_input_tokens - t.cached_input_tokens,
+        cost_usd = u.cost_usd - t.cost_usd
+    FROM (
+        SELECT
+            (m.created_at AT TIME ZONE 'UTC')::DATE AS day,
+            COALESCE(m.model, OLD.model, '') AS model,
+            COUNT(*) AS message_count,
+            COUNT(*) FILTER (WHERE m.role = 'assistant') AS generation_count,
+            COALESCE(SUM(m.token_count), 0) AS total_tokens,
+            COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0) AS input_tokens,
+            COALESCE(SUM(m.token_count) FILTER (WHERE m.role = 'assistant'), 0) AS output_tokens,
+            COALESCE(SUM((m.metadata->>'cached_input_tokens')::BIGINT), 0) AS cached_input_tokens,
+            COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0) AS cost_usd
+        FROM messages m
+        WHERE m.conversation_id = OLD.id
+        GROUP BY 1, 2
+    ) t
+    WHERE u.user_id = OLD.user_id AND u.day = t.day AND u.model = t.model;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS conversations_usage ON conversations;
+CREATE TRIGGER conversations_usage
+    BEFORE DELETE ON conversations
+    FOR EACH ROW EXECUTE FUNCTION forget_conversation_usage();
+
+-- Rebuild usage_daily from messages (all users, or one user). Returns rows written.
+-- Assistant messages from before per-message cost metadata first get an estimated
+-- cost_usd stamped on, priced from `pricing` ({model: [input, output, cached input]}
+-- per 1K tokens, "" for unknown models), so the ledger, the conversation counters and
+-- a later delete all see the same cost. Pass the pricing from src.usage.ledger.backfill.
+CREATE OR REPLACE FUNCTION backfill_usage_ledger(target_user UUID DEFAULT NULL, pricing JSONB DEFAULT '{}')
+RETURNS INT AS $$
+DECLARE
+    written INT;
+BEGIN
+    WITH priced AS (
+        SELECT
+            m.id,
+            ROUND((
+                (t.input_tokens - LEAST(t.cached_input_tokens, t.input_tokens)) * (t.rates->>0)::NUMERIC
+                + LEAST(t.cached_input_tokens, t.input_tokens) * (t.rates->>2)::NUMERIC
+                + COALESCE(m.token_count, 0) * (t.rates->>1)::NUMERIC
+            ) / 1000, 8) AS cost_usd
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(pricing->m.model, pricing->'') AS rates,
+                COALESCE((m.metadata->>'input_tokens')::BIGINT, 0) AS input_tokens,
+                COALESCE((m.metadata->>'cached_input_tokens')::BIGINT, 0) AS cached_input_tokens
+        ) t
+        WHERE (target_user IS NULL OR c.user_id = target_user)
+          AND m.role = 'assistant'
+          AND m.model IS NOT NULL
+          AND m.metadata->>'cost_usd' IS NULL
+          AND t.rates IS NOT NULL
+    ),
+    stamped AS (
+        UPDATE messages m SET metadata = COALESCE(m.metadata, '{}') || jsonb_build_object('cost_usd', p.cost_usd)
+        FROM priced p
+        WHERE m.id = p.id
+        RETURNING m.conversation_id, p.cost_usd
+    )
+    UPDATE conversations c SET cost_usd = c.cost_usd + s.cost_usd
+    FROM (SELECT conversation_id, SUM(cost_usd) AS cost_usd FROM stamped GROUP BY 1) s
+    WHERE c.id = s.conversation_id;
+
+    DELETE FROM usage_daily WHERE target_user IS NULL OR user_id = target_user;
+    INSERT INTO usage_daily (
+        user_id, day, model, message_count, generation_count,
+        total_tokens, input_tokens, output_tokens, cached_input_tokens, cost_usd
+    )
+    SELECT
+        c.user_id,
+        (m.created_at AT TIME ZONE 'UTC')::DATE,
+        COALESCE(m.model, c.model, ''),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE m.role = 'assistant'),
+        COALESCE(SUM(m.token_count), 0),
+        COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0),
+        COALESCE(SUM(m.token_count) FILTER (WHERE m.role = 'assistant'), 0),
+        COALESCE(SUM((m.metadata->>'cached_input_tokens')::BIGINT), 0),
+        COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0)
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE target_user IS NULL OR c.user_id = target_user
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE usage_daily ENABLE ROW LEVEL SECURITY;
+
+-- Backfill the ledger from existing messages
+SELECT backfill_usage_ledger();
+
+COMMIT;
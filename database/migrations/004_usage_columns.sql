@@ -0,0 +1,38 @@
+-- Add the columnar usage fetch behind /usage/timeseries to a database created before it.
+-- Run once in the Supabase SQL Editor. It only reads messages, so there is nothing to backfill.
+
+-- Columnar fetch of a user's generations in a time range, for vectorized analytics.
+-- Returns one row of parallel arrays instead of one row per message; models are
+-- dictionary-encoded (distinct names + per-row index) to keep the payload compact.
+CREATE OR REPLACE FUNCTION usage_columns(target_user UUID, range_start TIMESTAMPTZ, range_end TIMESTAMPTZ)
+RETURNS TABLE (
+    model_names TEXT[],
+    model_idx INT[],
+    created_at DOUBLE PRECISION[],
+    output_tokens INT[],
+    input_tokens BIGINT[],
+    latency_ms INT[],
+    cost_usd DOUBLE PRECISION[]
+) AS $$
+    WITH gens AS (
+        SELECT m.created_at, COALESCE(m.model, '') AS model, m.token_count, m.latency_ms, m.metadata
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE c.user_id = target_user
+          AND m.role = 'assistant'
+          AND m.created_at >= range_start
+          AND m.created_at < range_end
+    ),
+    names AS (
+        SELECT COALESCE(array_agg(DISTINCT model ORDER BY model), '{}') AS models FROM gens
+    )
+    SELECT
+        (SELECT models FROM names),
+        COALESCE(array_agg(array_position((SELECT models FROM names), g.model) - 1), '{}'),
+        COALESCE(array_agg(EXTRACT(EPOCH FROM g.created_at)::DOUBLE PRECISION), '{}'),
+        COALESCE(array_agg(COALESCE(g.token_count, 0)), '{}'),
+        COALESCE(array_agg(COALESCE((g.metadata->>'input_tokens')::BIGINT, 0)), '{}'),
+        COALESCE(array_agg(g.latency_ms), '{}'),
+        COALESCE(array_agg(COALESCE((g.metadata->>'cost_usd')::DOUBLE PRECISION, 0)), '{}')
+    FROM gens g;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,46 @@
+-- Add the bulk import function behind POST /conversations/import to a database created before it.
+-- Run once in the Supabase SQL Editor. Nothing to backfill.
+
+-- Bulk import: insert a batch of conversations and their messages in one transaction.
+-- Each batch entry is {"conversation": {...}, "messages": [...]} for a new conversation,
+-- or {"conversation_id": id, "messages": [...]} to continue one created by an earlier
+-- batch. Returns the conversation id for every entry, in order.
+CREATE OR REPLACE FUNCTION import_conversations(target_user UUID, batch JSONB)
+RETURNS UUID[] AS $$
+DECLARE
+    entry JSONB;
+    conv_id UUID;
+    ids UUID[] := '{}';
+BEGIN
+    FOR entry IN SELECT value FROM jsonb_array_elements(batch) LOOP
+        IF entry ? 'conversation' THEN
+            INSERT INTO conversations (user_id, title, model, system_prompt, metadata, is_archived, created_at, updated_at)
+            SELECT
+                target_user, c.title, c.model, c.system_prompt, COALESCE(c.metadata, '{}'),
+                COALESCE(c.is_archived, FALSE), COALESCE(c.created_at, NOW()),
+                COALESCE(c.updated_at, c.created_at, NOW())
+            FROM jsonb_to_record(entry->'conversation') AS c(
+                title VARCHAR, model VARCHAR, system_prompt TEXT, metadata JSONB,
+                is_archived BOOLEAN, created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            )
+            RETURNING id INTO conv_id;
+        ELSE
+            conv_id := (entry->>'conversation_id')::UUID;
+            IF NOT EXISTS (SELECT 1 FROM conversations WHERE id = conv_id AND user_id = target_user) THEN
+                RAISE EXCEPTION 'conversation % does not belong to the importing user', conv_id;
+            END IF;
+        END IF;
+
+        INSERT INTO messages (conversation_id, role, content, token_count, model, finish_reason, latency_ms, metadata, created_at)
+        SELECT
+            conv_id, m.role, m.content, m.token_count, m.model, m.finish_reason, m.latency_ms,
+            COALESCE(m.metadata, '{}'), m.created_at
+        FROM jsonb_to_recordset(COALESCE(entry->'messages', '[]')) AS m(
+            role VARCHAR, content TEXT, token_count INT, model VARCHAR, finish_reason VARCHAR,
+            latency_ms INT, metadata JSONB, created_at TIMESTAMPTZ
+        );
+        ids := ids || conv_id;
+    END LOOP;
+    RETURN ids;
+END;
+$$ LANGUAGE plpgsql;
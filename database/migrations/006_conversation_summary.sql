@@ -0,0 +1,9 @@
+-- Add the rolling-summary columns used by CONTEXT_STRATEGY=summary to a database created before them.
+-- Run once in the Supabase SQL Editor. Existing conversations start with no summary:
+-- the first compaction after switching strategies summarizes their history.
+
+ALTER TABLE conversations
+    -- Rolling summary of messages up to and including (summary_through_at, summary_through_id)
+    ADD COLUMN IF NOT EXISTS summary TEXT,
+    ADD COLUMN IF NOT EXISTS summary_through_id UUID,
+    ADD COLUMN IF NOT EXISTS summary_through_at TIMESTAMPTZ;
@@ -20,12 +20,23 @@ CREATE TABLE conversations (
     system_prompt TEXT,
     metadata JSONB DEFAULT '{}',
     is_archived BOOLEAN DEFAULT FALSE,
+    -- Denormalized counters, maintained by the messages_counters trigger
+    message_count INT NOT NULL DEFAULT 0,
+    last_message_at TIMESTAMPTZ,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 8) NOT NULL DEFAULT 0,
+    -- Rolling summary of messages up to and including (summary_through_at, summary_through_id)
+    summary TEXT,
+    summary_through_id UUID,
+    summary_through_at TIMESTAMPTZ,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX idx_conv_user ON conversations(user_id);
-CREATE INDEX idx_conv_user_updated ON conversations(user_id, updated_at DESC);
+-- id is the keyset-pagination tie-breaker
+CREATE INDEX idx_conv_user_updated ON conversations(user_id, updated_at DESC, id DESC);
 
 -- Messages
 CREATE TABLE messages (
@@ -41,7 +52,7 @@ CREATE TABLE messages (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
-CREATE INDEX idx_msg_conv ON messages(conversation_id, created_at);
+CREATE INDEX idx_msg_conv ON messages(conversation_id, created_at, id);
 
 -- API Keys
 CREATE TABLE api_keys (
@@ -81,12 +92,343 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Only user-visible edits bump updated_at; counter maintenance does not
 CREATE TRIGGER conversations_updated_at
-    BEFORE UPDATE ON conversations
+    BEFORE UPDATE OF title, model, system_prompt, metadata, is_archived ON conversations
     FOR EACH ROW EXECUTE FUNCTION update_updated_at();
 
+-- Maintain conversation counters on message insert/delete
+CREATE OR REPLACE FUNCTION update_conversation_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE conversations SET
+            message_count = message_count + 1,
+            last_message_at = GREATEST(last_message_at, NEW.created_at),
+            total_tokens = total_tokens + COALESCE(NEW.token_count, 0),
+            input_tokens = input_tokens + COALESCE((NEW.metadata->>'input_tokens')::BIGINT, 0),
+            cost_usd = cost_usd + COALESCE((NEW.metadata->>'cost_usd')::NUMERIC, 0)
+        WHERE id = NEW.conversation_id;
+        RETURN NEW;
+    END IF;
+
+    UPDATE conversations SET
+        message_count = GREATEST(message_count - 1, 0),
+        -- Recompute only when the newest message went; idx_msg_conv makes this an index probe
+        last_message_at = CASE
+            WHEN OLD.created_at < last_message_at THEN last_message_at
+            ELSE (SELECT MAX(created_at) FROM messages WHERE conversation_id = OLD.conversation_id)
+        END,
+        total_tokens = total_tokens - COALESCE(OLD.token_count, 0),
+        input_tokens = input_tokens - COALESCE((OLD.metadata->>'input_tokens')::BIGINT, 0),
+        cost_usd = cost_usd - COALESCE((OLD.metadata->>'cost_usd')::NUMERIC, 0)
+    WHERE id = OLD.conversation_id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER messages_counters
+    AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION update_conversation_counters();
+
+-- Recompute counters from messages and fix any drift; returns rows corrected.
+-- Pass a conversation id to reconcile one conversation, or NULL for all.
+CREATE OR REPLACE FUNCTION reconcile_conversation_counters(target_id UUID DEFAULT NULL)
+RETURNS INT AS $$
+DECLARE
+    fixed INT;
+BEGIN
+    WITH totals AS (
+        SELECT
+            c.id,
+            COUNT(m.id)::INT AS message_count,
+            MAX(m.created_at) AS last_message_at,
+            COALESCE(SUM(m.token_count), 0) AS total_tokens,
+            COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0) AS input_tokens,
+            COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0) AS cost_usd
+        FROM conversations c
+        LEFT JOIN messages m ON m.conversation_id = c.id
+        WHERE target_id IS NULL OR c.id = target_id
+        GROUP BY c.id
+    )
+    UPDATE conversations c SET
+        message_count = t.message_count,
+        last_message_at = t.last_message_at,
+        total_tokens = t.total_tokens,
+        input_tokens = t.input_tokens,
+        cost_usd = t.cost_usd
+    FROM totals t
+    WHERE c.id = t.id
+      AND (c.message_count, c.last_message_at, c.total_tokens, c.input_tokens, c.cost_usd)
+          IS DISTINCT FROM (t.message_count, t.last_message_at, t.total_tokens, t.input_tokens, t.cost_usd);
+    GET DIAGNOSTICS fixed = ROW_COUNT;
+    RETURN fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per-user, per-model, per-day usage rollups, maintained by trigger on messages
+CREATE TABLE usage_daily (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    model VARCHAR(100) NOT NULL DEFAULT '',
+    message_count INT NOT NULL DEFAULT 0,
+    generation_count INT NOT NULL DEFAULT 0,
+    total_tokens BIGINT NOT NULL DEFAULT 0,
+    input_tokens BIGINT NOT NULL DEFAULT 0,
+    output_tokens BIGINT NOT NULL DEFAULT 0,
+    -- Input tokens the provider served from its prompt cache
+    cached_input_tokens BIGINT NOT NULL DEFAULT 0,
+    cost_usd NUMERIC(14, 8) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, model)
+);
+
+-- The ledger counts the messages that currently exist, like conversation_count:
+-- inserts add to it, and deleting a message or a whole conversation takes its usage back out.
+CREATE OR REPLACE FUNCTION record_message_usage()
+RETURNS TRIGGER AS $$
+DECLARE
+    is_generation BOOLEAN;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        -- Under a conversation delete the conversation row is already gone, so this matches
+        -- nothing; forget_conversation_usage has taken the whole conversation out beforehand
+        is_generation := OLD.role = 'assistant';
+        UPDATE usage_daily u SET
+            message_count = GREATEST(u.message_count - 1, 0),
+            generation_count = GREATEST(u.generation_count - CASE WHEN is_generation THEN 1 ELSE 0 END, 0),
+            total_tokens = u.total_tokens - COALESCE(OLD.token_count, 0),
+            input_tokens = u.input_tokens - COALESCE((OLD.metadata->>'input_tokens')::BIGINT, 0),
+            output_tokens = u.output_tokens - CASE WHEN is_generation THEN COALESCE(OLD.token_count, 0) ELSE 0 END,
+            cached_input_tokens = u.cached_input_tokens - COALESCE((OLD.metadata->>'cached_input_tokens')::BIGINT, 0),
+            cost_usd = u.cost_usd - COALESCE((OLD.metadata->>'cost_usd')::NUMERIC, 0)
+        FROM conversations c
+        WHERE c.id = OLD.conversation_id
+          AND u.user_id = c.user_id
+          AND u.day = (OLD.created_at AT TIME ZONE 'UTC')::DATE
+          AND u.model = COALESCE(OLD.model, c.model, '');
+        RETURN OLD;
+    END IF;
+
+    is_generation := NEW.role = 'assistant';
+    INSERT INTO usage_daily AS u (
+        user_id, day, model, message_count, generation_count,
+        total_tokens, input_tokens, output_tokens, cached_input_tokens, cost_usd
+    )
+    SELECT
+        c.user_id,
+        (NEW.created_at AT TIME ZONE 'UTC')::DATE,
+        COALESCE(NEW.model, c.model, ''),
+        1,
+        CASE WHEN is_generation THEN 1 ELSE 0 END,
+        COALESCE(NEW.token_count, 0),
+        COALESCE((NEW.metadata->>'input_tokens')::BIGINT, 0),
+        CASE WHEN is_generation THEN COALESCE(NEW.token_count, 0) ELSE 0 END,
+        COALESCE((NEW.metadata->>'cached_input_tokens')::BIGINT, 0),
+        COALESCE((NEW.metadata->>'cost_usd')::NUMERIC, 0)
+    FROM conversations c
+    WHERE c.id = NEW.conversation_id
+    ON CONFLICT (user_id, day, model) DO UPDATE SET
+        message_count = u.message_count + EXCLUDED.message_count,
+        generation_count = u.generation_count + EXCLUDED.generation_count,
+        total_tokens = u.total_tokens + EXCLUDED.total_tokens,
+        input_tokens = u.input_tokens + EXCLUDED.input_tokens,
+        output_tokens = u.output_tokens + EXCLUDED.output_tokens,
+        cached_input_tokens = u.cached_input_tokens + EXCLUDED.cached_input_tokens,
+        cost_usd = u.cost_usd + EXCLUDED.cost_usd;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER messages_usage
+    AFTER INSERT OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION record_message_usage();
+
+-- Take a conversation's usage out of the ledger before its messages are cascade-deleted
+CREATE OR REPLACE FUNCTION forget_conversation_usage()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE usage_daily u SET
+        message_count = GREATEST(u.message_count - t.message_count, 0),
+        generation_count = GREATEST(u.generation_count - t.generation_count, 0),
+        total_tokens = u.total_tokens - t.total_tokens,
+        input_tokens = u.input_tokens - t.input_tokens,
+        output_tokens = u.output_tokens - t.output_tokens,
+        cached_input_tokens = u.cached_input_tokens - t.cached_input_tokens,
+        cost_usd = u.cost_usd - t.cost_usd
+    FROM (
+        SELECT
+            (m.created_at AT TIME ZONE 'UTC')::DATE AS day,
+            COALESCE(m.model, OLD.model, '') AS model,
+            COUNT(*) AS message_count,
+            COUNT(*) FILTER (WHERE m.role = 'assistant') AS generation_count,
+            COALESCE(SUM(m.token_count), 0) AS total_tokens,
+            COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0) AS input_tokens,
+            COALESCE(SUM(m.token_count) FILTER (WHERE m.role = 'assistant'), 0) AS output_tokens,
+            COALESCE(SUM((m.metadata->>'cached_input_tokens')::BIGINT), 0) AS cached_input_tokens,
+            COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0) AS cost_usd
+        FROM messages m
+        WHERE m.conversation_id = OLD.id
+        GROUP BY 1, 2
+    ) t
+    WHERE u.user_id = OLD.user_id AND u.day = t.day AND u.model = t.model;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER conversations_usage
+    BEFORE DELETE ON conversations
+    FOR EACH ROW EXECUTE FUNCTION forget_conversation_usage();
+
+-- Rebuild usage_daily from messages (all users, or one user). Returns rows written.
+-- Assistant messages from before per-message cost metadata first get an estimated
+-- cost_usd stamped on, priced from `pricing` ({model: [input, output, cached input]}
+-- per 1K tokens, "" for unknown models), so the ledger, the conversation counters and
+-- a later delete all see the same cost. Pass the pricing from src.usage.ledger.backfill.
+CREATE OR REPLACE FUNCTION backfill_usage_ledger(target_user UUID DEFAULT NULL, pricing JSONB DEFAULT '{}')
+RETURNS INT AS $$
+DECLARE
+    written INT;
+BEGIN
+    WITH priced AS (
+        SELECT
+            m.id,
+            ROUND((
+                (t.input_tokens - LEAST(t.cached_input_tokens, t.input_tokens)) * (t.rates->>0)::NUMERIC
+                + LEAST(t.cached_input_tokens, t.input_tokens) * (t.rates->>2)::NUMERIC
+                + COALESCE(m.token_count, 0) * (t.rates->>1)::NUMERIC
+            ) / 1000, 8) AS cost_usd
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(pricing->m.model, pricing->'') AS rates,
+                COALESCE((m.metadata->>'input_tokens')::BIGINT, 0) AS input_tokens,
+                COALESCE((m.metadata->>'cached_input_tokens')::BIGINT, 0) AS cached_input_tokens
+        ) t
+        WHERE (target_user IS NULL OR c.user_id = target_user)
+          AND m.role = 'assistant'
+          AND m.model IS NOT NULL
+          AND m.metadata->>'cost_usd' IS NULL
+          AND t.rates IS NOT NULL
+    ),
+    stamped AS (
+        UPDATE messages m SET metadata = COALESCE(m.metadata, '{}') || jsonb_build_object('cost_usd', p.cost_usd)
+        FROM priced p
+        WHERE m.id = p.id
+        RETURNING m.conversation_id, p.cost_usd
+    )
+    UPDATE conversations c SET cost_usd = c.cost_usd + s.cost_usd
+    FROM (SELECT conversation_id, SUM(cost_usd) AS cost_usd FROM stamped GROUP BY 1) s
+    WHERE c.id = s.conversation_id;
+
+    DELETE FROM usage_daily WHERE target_user IS NULL OR user_id = target_user;
+    INSERT INTO usage_daily (
+        user_id, day, model, message_count, generation_count,
+        total_tokens, input_tokens, output_tokens, cached_input_tokens, cost_usd
+    )
+    SELECT
+        c.user_id,
+        (m.created_at AT TIME ZONE 'UTC')::DATE,
+        COALESCE(m.model, c.model, ''),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE m.role = 'assistant'),
+        COALESCE(SUM(m.token_count), 0),
+        COALESCE(SUM((m.metadata->>'input_tokens')::BIGINT), 0),
+        COALESCE(SUM(m.token_count) FILTER (WHERE m.role = 'assistant'), 0),
+        COALESCE(SUM((m.metadata->>'cached_input_tokens')::BIGINT), 0),
+        COALESCE(SUM((m.metadata->>'cost_usd')::NUMERIC), 0)
+    FROM messages m
+    JOIN conversations c ON c.id = m.conversation_id
+    WHERE target_user IS NULL OR c.user_id = target_user
+    GROUP BY 1, 2, 3;
+    GET DIAGNOSTICS written = ROW_COUNT;
+    RETURN written;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Columnar fetch of a user's generations in a time range, for vectorized analytics.
+-- Returns one row of parallel arrays instead of one row per message; models are
+-- dictionary-encoded (distinct names + per-row index) to keep the payload compact.
+CREATE OR REPLACE FUNCTION usage_columns(target_user UUID, range_start TIMESTAMPTZ, range_end TIMESTAMPTZ)
+RETURNS TABLE (
+    model_names TEXT[],
+    model_idx INT[],
+    created_at DOUBLE PRECISION[],
+    output_tokens INT[],
+    input_tokens BIGINT[],
+    latency_ms INT[],
+    cost_usd DOUBLE PRECISION[]
+) AS $$
+    WITH gens AS (
+        SELECT m.created_at, COALESCE(m.model, '') AS model, m.token_count, m.latency_ms, m.metadata
+        FROM messages m
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE c.user_id = target_user
+          AND m.role = 'assistant'
+          AND m.created_at >= range_start
+          AND m.created_at < range_end
+    ),
+    names AS (
+        SELECT COALESCE(array_agg(DISTINCT model ORDER BY model), '{}') AS models FROM gens
+    )
+    SELECT
+        (SELECT models FROM names),
+        COALESCE(array_agg(array_position((SELECT models FROM names), g.model) - 1), '{}'),
+        COALESCE(array_agg(EXTRACT(EPOCH FROM g.created_at)::DOUBLE PRECISION), '{}'),
+        COALESCE(array_agg(COALESCE(g.token_count, 0)), '{}'),
+        COALESCE(array_agg(COALESCE((g.metadata->>'input_tokens')::BIGINT, 0)), '{}'),
+        COALESCE(array_agg(g.latency_ms), '{}'),
+        COALESCE(array_agg(COALESCE((g.metadata->>'cost_usd')::DOUBLE PRECISION, 0)), '{}')
+    FROM gens g;
+$$ LANGUAGE sql STABLE;
+
+-- Bulk import: insert a batch of conversations and their messages in one transaction.
+-- Each batch entry is {"conversation": {...}, "messages": [...]} for a new conversation,
+-- or {"conversation_id": id, "messages": [...]} to continue one created by an earlier
+-- batch. Returns the conversation id for every entry, in order.
+CREATE OR REPLACE FUNCTION import_conversations(target_user UUID, batch JSONB)
+RETURNS UUID[] AS $$
+DECLARE
+    entry JSONB;
+    conv_id UUID;
+    ids UUID[] := '{}';
+BEGIN
+    FOR entry IN SELECT value FROM jsonb_array_elements(batch) LOOP
+        IF entry ? 'conversation' THEN
+            INSERT INTO conversations (user_id, title, model, system_prompt, metadata, is_archived, created_at, updated_at)
+            SELECT
+                target_user, c.title, c.model, c.system_prompt, COALESCE(c.metadata, '{}'),
+                COALESCE(c.is_archived, FALSE), COALESCE(c.created_at, NOW()),
+                COALESCE(c.updated_at, c.created_at, NOW())
+            FROM jsonb_to_record(entry->'conversation') AS c(
+                title VARCHAR, model VARCHAR, system_prompt TEXT, metadata JSONB,
+                is_archived BOOLEAN, created_at TIMESTAMPTZ, updated_at TIMESTAMPTZ
+            )
+            RETURNING id INTO conv_id;
+        ELSE
+            conv_id := (entry->>'conversation_id')::UUID;
+            IF NOT EXISTS (SELECT 1 FROM conversations WHERE id = conv_id AND user_id = target_user) THEN
+                RAISE EXCEPTION 'conversation % does not belong to the importing user', conv_id;
+            END IF;
+        END IF;
+
+        INSERT INTO messages (conversation_id, role, content, token_count, model, finish_reason, latency_ms, metadata, created_at)
+        SELECT
+            conv_id, m.role, m.content, m.token_count, m.model, m.finish_reason, m.latency_ms,
+            COALESCE(m.metadata, '{}'), m.created_at
+        FROM jsonb_to_recordset(COALESCE(entry->'messages', '[]')) AS m(
+            role VARCHAR, content TEXT, token_count INT, model VARCHAR, finish_reason VARCHAR,
+            latency_ms INT, metadata JSONB, created_at TIMESTAMPTZ
+        );
+        ids := ids || conv_id;
+    END LOOP;
+    RETURN ids;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Row Level Security
 ALTER TABLE conversations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE api_keys ENABLE ROW LEVEL SECURITY;
 ALTER TABLE refresh_tokens ENABLE ROW LEVEL SECURITY;
+ALTER TABLE usage_daily ENABLE ROW LEVEL SECURITY;
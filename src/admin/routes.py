@@ -0,0 +1,51 @@
+"""Admin endpoints: on-demand profiling of the serving worker."""
+
+import os
+import re
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from src.auth.dependencies import CurrentUser, get_admin_user
+from src.config.settings import get_settings
+from src.utils.profiler import is_profiling, profile
+
+router = APIRouter(prefix="/api/v1/admin", tags=["Admin"])
+
+
+@router.post(
+    "/profile",
+    summary="Profile this worker",
+    description=(
+        "Sample the worker that serves this request for `seconds` and return the aggregated stacks, as collapsed "
+        "lines (flamegraph.pl, speedscope) or a speedscope JSON file. Threads, including the event loop, are "
+        "sampled, and with `tasks` so are parked asyncio tasks. `request_pattern` (a regex on X-Request-ID) keeps "
+        "only samples taken on behalf of matching requests. One profile runs per worker at a time."
+    ),
+)
+async def run_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    format: Literal["collapsed", "speedscope"] = Query("collapsed"),
+    tasks: bool = Query(True, description="Also sample the await chains of parked asyncio tasks"),
+    request_pattern: str | None = Query(None, description="Regex matched against request IDs"),
+    user: CurrentUser = Depends(get_admin_user),
+):
+    max_seconds = get_settings().PROFILER_MAX_SECONDS
+    if seconds > max_seconds:
+        raise HTTPException(status_code=422, detail=f"seconds must be at most {max_seconds:g}")
+    if request_pattern:
+        try:
+            re.compile(request_pattern)
+        except re.error as e:
+            raise HTTPException(status_code=422, detail=f"Invalid request_pattern: {e}")
+    if is_profiling():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+
+    profiler = await profile(seconds, interval_ms / 1000, include_tasks=tasks, request_pattern=request_pattern)
+    headers = {"X-Profile-Samples": str(profiler.samples), "X-Profile-Pid": str(os.getpid())}
+    if format == "speedscope":
+        headers["Content-Disposition"] = f'attachment; filename="profile-{os.getpid()}.speedscope.json"'
+        return JSONResponse(profiler.speedscope(f"worker {os.getpid()}"), headers=headers)
+    return PlainTextResponse(profiler.collapsed(), headers=headers)
@@ -4,10 +4,12 @@ import hashlib
 from dataclasses import dataclass
 from datetime import datetime, timezone
 
-from fastapi import HTTPException, Request
+from fastapi import Depends, HTTPException, Request
 
 from src.auth.jwt import verify_token
+from src.config.settings import get_settings
 from src.db.client import get_supabase
+from src.utils.tracing import set_attribute, traced
 
 
 @dataclass
@@ -27,6 +29,7 @@ def _extract_api_key(request: Request) -> str | None:
     return request.headers.get("X-API-Key")
 
 
+@traced("auth")
 async def get_current_user(request: Request) -> CurrentUser:
     """FastAPI dependency: authenticate via Bearer JWT or X-API-Key."""
 
@@ -37,9 +40,11 @@ async def get_current_user(request: Request) -> CurrentUser:
             payload = verify_token(token)
             if payload.get("type") != "access":
                 raise HTTPException(status_code=401, detail="Invalid token type")
-            return CurrentUser(id=payload["sub"], email=payload.get("email", ""))
+            user = CurrentUser(id=payload["sub"], email=payload.get("email", ""))
         except Exception:
             raise HTTPException(status_code=401, detail="Invalid or expired token")
+        set_attribute("enduser.id", user.id)
+        return user
 
     # Try API key
     api_key = _extract_api_key(request)
@@ -66,6 +71,14 @@ async def get_current_user(request: Request) -> CurrentUser:
         user_result = db.table("users").select("email").eq("id", key_row["user_id"]).execute()
         email = user_result.data[0]["email"] if user_result.data else ""
 
+        set_attribute("enduser.id", key_row["user_id"])
         return CurrentUser(id=key_row["user_id"], email=email)
 
     raise HTTPException(status_code=401, detail="Missing authentication credentials")
+
+
+async def get_admin_user(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    """FastAPI dependency: an authenticated user listed in ADMIN_USER_IDS."""
+    if user.id not in get_settings().admin_user_ids:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
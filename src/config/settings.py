@@ -1,6 +1,7 @@
 """Application settings loaded from environment variables."""
 
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -19,9 +20,84 @@ class Settings(BaseSettings):
 
     # LLM
     GROQ_API_KEY: str
+    # Comma-separated Groq keys to balance calls across; defaults to GROQ_API_KEY alone
+    GROQ_API_KEYS: str = ""
     GOOGLE_AI_API_KEY: str = ""
     DEFAULT_MODEL: str = "llama-3.1-8b-instant"
     FALLBACK_MODEL: str = "gemini-1.5-flash"
+    # Optional JSON file adding or overriding model registry entries
+    MODEL_REGISTRY_PATH: str = ""
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = False
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Auto-title background jobs
+    TITLE_WORKERS: int = 2
+    TITLE_QUEUE_MAX: int = 200
+    TITLE_BATCH_SIZE: int = 5
+    TITLE_MAX_DEFER_SECONDS: float = 2.0
+
+    # Context building: "sliding" drops old turns one at a time, "chunked" drops them in
+    # prompt-cache-friendly chunks, "summary" folds them into a rolling summary,
+    # "retrieval" adds the most relevant older turns to a recent window
+    CONTEXT_STRATEGY: Literal["sliding", "chunked", "summary", "retrieval"] = "sliding"
+    # Cap on the per-turn context budget; 0 uses the model's window minus its output cap
+    CONTEXT_MAX_TOKENS: int = 0
+    CONTEXT_CHUNK_TOKENS: int = 1500
+    COMPACTION_TRIGGER_TOKENS: int = 3000
+    COMPACTION_KEEP_TOKENS: int = 1000
+    COMPACTION_MODEL: str = ""
+    RETRIEVAL_TOP_K: int = 8
+    RETRIEVAL_RECENT_TOKENS: int = 2000
+    RETRIEVAL_MIN_SCORE: float = 0.1
+    RETRIEVAL_DIM: int = 1024
+    RETRIEVAL_MAX_BYTES: int = 256 * 1024 * 1024
+    RETRIEVAL_INDEX_DIR: str = ""
+
+    # Client-side pacing of Groq calls by its rate-limit headers
+    LLM_SCHEDULER_ENABLED: bool = True
+    LLM_SCHEDULER_MAX_WAIT_SECONDS: float = 10.0
+    LLM_SCHEDULER_OUTPUT_TOKENS: int = 512
+    LLM_SCHEDULER_USER_WEIGHTS: dict[str, float] = {}
+    LLM_SCHEDULER_BACKGROUND_WEIGHT: float = 0.25
+    # How long a key is taken out of rotation after an auth error, or after repeated errors
+    LLM_KEY_AUTH_EJECT_SECONDS: float = 300.0
+    LLM_KEY_ERROR_EJECT_SECONDS: float = 30.0
+
+    # Admission control for LLM generations (per worker)
+    ADMISSION_MAX_IN_FLIGHT: int = 32
+    ADMISSION_PER_USER: int = 2
+    ADMISSION_QUEUE_MAX: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+
+    # Metrics: shared directory for multi-worker aggregation, and optional bearer token for /metrics
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_SECONDS: float = 5.0
+    METRICS_TOKEN: str = ""
+    # Event-loop lag monitor; stalls over the threshold are logged with the loop thread's stack
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.1
+    LOOP_STALL_THRESHOLD_SECONDS: float = 0.25
+    # Append each request's spans as OTLP/JSON lines to this file (off when empty)
+    TRACE_EXPORT_PATH: str = ""
+    # Append anonymized request shapes as JSON lines to this file, for replay (off when empty)
+    TRAFFIC_CAPTURE_PATH: str = ""
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 1.0
+    TRAFFIC_CAPTURE_FLUSH_SECONDS: float = 5.0
+
+    # Negotiated zstd/br/gzip for non-streaming responses of at least COMPRESSION_MIN_BYTES;
+    # levels favor CPU over the last few percent of ratio (zstd and br need their optional packages)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 4
+    COMPRESSION_BROTLI_LEVEL: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # Comma-separated user IDs allowed to use /api/v1/admin endpoints (e.g. the profiler)
+    ADMIN_USER_IDS: str = ""
+    PROFILER_MAX_SECONDS: float = 60.0
 
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
@@ -30,6 +106,15 @@ class Settings(BaseSettings):
     RATE_LIMIT_STANDARD: int = 60
     RATE_LIMIT_AI: int = 10
 
+    @property
+    def groq_api_keys(self) -> list[str]:
+        keys = [k.strip() for k in self.GROQ_API_KEYS.split(",") if k.strip()]
+        return keys or [self.GROQ_API_KEY]
+
+    @property
+    def admin_user_ids(self) -> set[str]:
+        return {u.strip() for u in self.ADMIN_USER_IDS.split(",") if u.strip()}
+
     @property
     def allowed_origins_list(self) -> list[str]:
         return [o.strip() for o in self.ALLOWED_ORIGINS.split(",") if o.strip()]
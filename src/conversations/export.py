@@ -0,0 +1,60 @@
+"""Streaming NDJSON export of conversations.
+
+Rows are read in keyset-ordered batches and serialized one batch at a time, so
+memory stays bounded by the batch size whatever the export size. The generator
+only fetches the next batch once the previous chunk has been sent, so a slow
+client slows the export down instead of making the server buffer it.
+"""
+
+import asyncio
+import json
+import zlib
+from collections.abc import AsyncGenerator, AsyncIterator
+
+from src.conversations import repository
+
+EXPORT_BATCH_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _line(record_type: str, row: dict) -> str:
+    return json.dumps({"type": record_type, **row}, default=str, separators=(",", ":")) + "\n"
+
+
+async def _message_lines(conversation_id: str) -> AsyncGenerator[str, None]:
+    cursor = None
+    while True:
+        rows, cursor = await asyncio.to_thread(repository.messages_batch, conversation_id, cursor, EXPORT_BATCH_SIZE)
+        if rows:
+            yield "".join(_line("message", row) for row in rows)
+        if cursor is None:
+            return
+
+
+async def export_conversation(conversation: dict) -> AsyncGenerator[str, None]:
+    """One conversation record followed by its messages."""
+    yield _line("conversation", conversation)
+    async for chunk in _message_lines(conversation["id"]):
+        yield chunk
+
+
+async def export_user_conversations(user_id: str) -> AsyncGenerator[str, None]:
+    """Every conversation the user owns, each followed by its messages."""
+    cursor = None
+    while True:
+        conversations, cursor = await asyncio.to_thread(repository.conversations_batch, user_id, cursor, EXPORT_BATCH_SIZE)
+        for conversation in conversations:
+            async for chunk in export_conversation(conversation):
+                yield chunk
+        if cursor is None:
+            return
+
+
+async def gzip_stream(chunks: AsyncIterator[str], level: int = 6) -> AsyncGenerator[bytes, None]:
+    """Compress a text stream on the fly into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
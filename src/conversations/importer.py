@@ -0,0 +1,290 @@
+"""Bulk NDJSON import of conversations and messages, without running generations.
+
+Input uses the export format: a {"type": "conversation", ...} line followed by
+that conversation's {"type": "message", ...} lines. The body is parsed as it
+streams in, token counts are computed in tiktoken's native thread pool, and rows
+are written in large batches through the import_conversations RPC, one
+transaction per batch. Progress is tracked per request ID and can be polled
+while the upload is still running.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, AsyncIterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+from src.db.client import get_supabase
+from src.db.models import VALID_ROLES
+from src.llm.token_counter import count_tokens_batch
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_MESSAGES = 1000
+IMPORT_MAX_LINE_BYTES = 4 * 1024 * 1024
+MAX_REPORTED_ERRORS = 100
+MAX_TRACKED_JOBS = 200
+
+_INT_MAX = 2**31 - 1
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and -_INT_MAX - 1 <= value <= _INT_MAX
+
+
+def _is_text(max_length: int | None = None):
+    # Postgres text can't hold NUL
+    return lambda value: isinstance(value, str) and "\x00" not in value and (max_length is None or len(value) <= max_length)
+
+
+def _is_timestamp(value) -> bool:
+    if not isinstance(value, str):
+        return False
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_metadata(value) -> bool:
+    # The counter and usage triggers cast these keys, so a bad value would fail the whole batch
+    if not isinstance(value, dict):
+        return False
+    numeric = (value.get("input_tokens"), value.get("cached_input_tokens"))
+    cost = value.get("cost_usd")
+    return (
+        all(v is None or _is_int(v) for v in numeric)
+        and (cost is None or (isinstance(cost, (int, float)) and not isinstance(cost, bool)))
+    )
+
+
+# Column -> (check, expected type); None is accepted for every column not checked separately
+_CONVERSATION_COLUMNS = {
+    "title": (_is_text(500), "a string of at most 500 characters"),
+    "model": (_is_text(100), "a string of at most 100 characters"),
+    "system_prompt": (_is_text(), "a string"),
+    "metadata": (_is_metadata, "an object with integer token counts and a numeric cost_usd"),
+    "is_archived": (lambda v: isinstance(v, bool), "a boolean"),
+    "created_at": (_is_timestamp, "an ISO 8601 timestamp"),
+    "updated_at": (_is_timestamp, "an ISO 8601 timestamp"),
+}
+_MESSAGE_COLUMNS = {
+    "role": (lambda v: isinstance(v, str) and v in VALID_ROLES, f"one of {sorted(VALID_ROLES)}"),
+    "content": (_is_text(), "a string"),
+    "token_count": (_is_int, "a 32-bit integer"),
+    "model": (_is_text(100), "a string of at most 100 characters"),
+    "finish_reason": (_is_text(50), "a string of at most 50 characters"),
+    "latency_ms": (_is_int, "a 32-bit integer"),
+    "metadata": (_is_metadata, "an object with integer token counts and a numeric cost_usd"),
+    "created_at": (_is_timestamp, "an ISO 8601 timestamp"),
+}
+
+
+def _check_row(record: dict, columns: dict) -> tuple[dict, str | None]:
+    """The known columns of `record`, and the first type error among them."""
+    row = {k: v for k, v in record.items() if k in columns}
+    for column, value in row.items():
+        check, expected = columns[column]
+        if value is not None and not check(value):
+            return row, f"{column} must be {expected}"
+    return row, None
+
+
+@dataclass
+class ImportProgress:
+    job_id: str
+    user_id: str
+    started_at: float = field(default_factory=time.time)
+    lines: int = 0
+    conversations: int = 0
+    messages: int = 0
+    batches: int = 0
+    error_count: int = 0
+    errors: list[dict] = field(default_factory=list)
+    done: bool = False
+    failed: bool = False
+    # HTTP status for an aborted import: 422 for unusable input, 500 for a failed write
+    failure_status: int = 0
+
+    def add_error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "message": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "lines": self.lines,
+            "conversations": self.conversations,
+            "messages": self.messages,
+            "batches": self.batches,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "done": self.done,
+            "failed": self.failed,
+            "elapsed_seconds": round(time.time() - self.started_at, 3),
+        }
+
+
+# (user_id, job_id) -> progress; job IDs come from the client, so they are only unique per user.
+# Oldest jobs are dropped once MAX_TRACKED_JOBS is reached.
+_jobs: OrderedDict[tuple[str, str], ImportProgress] = OrderedDict()
+
+
+def get_import_progress(job_id: str, user_id: str) -> ImportProgress | None:
+    return _jobs.get((user_id, job_id))
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncGenerator[tuple[int, dict | None, str | None], None]:
+    """Yield (line_number, record, error) for each non-blank line of a streamed body."""
+    buffer = b""
+    line_no = 0
+
+    def parse(raw: bytes) -> tuple[dict | None, str | None]:
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            return None, f"invalid JSON: {e}"
+        if not isinstance(record, dict):
+            return None, "expected a JSON object"
+        return record, None
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for raw in lines:
+            line_no += 1
+            if raw.strip():
+                yield (line_no, *parse(raw))
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise ValueError(f"line {line_no + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+    if buffer.strip():
+        yield (line_no + 1, *parse(buffer))
+
+
+def _insert_batch(user_id: str, entries: list[dict]) -> list[str]:
+    db = get_supabase()
+    result = db.rpc("import_conversations", {"target_user": user_id, "batch": entries}).execute()
+    return result.data
+
+
+class _Batcher:
+    def __init__(self, progress: ImportProgress):
+        self._progress = progress
+        self._entries: list[dict] = []
+        self._buffered = 0
+        # Buffered messages without a token_count, by the model to count them with
+        self._uncounted: dict[str | None, list[dict]] = {}
+        # The conversation currently receiving messages, and its id once a batch has created it
+        self._current: dict | None = None
+        self._current_id: str | None = None
+        # Model of the current conversation, for messages that don't name one
+        self._current_model: str | None = None
+        self._skipping = False
+        # Messages without a timestamp get strictly increasing ones so import order is kept
+        self._clock = datetime.now(timezone.utc)
+
+    def start_conversation(self, line: int, record: dict) -> None:
+        row, error = _check_row(record, _CONVERSATION_COLUMNS)
+        if error:
+            self._progress.add_error(line, f"conversation {error}")
+            self._current, self._current_id, self._skipping = None, None, True
+            return
+        self._current = {"conversation": row, "messages": []}
+        self._current_id = None
+        self._current_model = row.get("model")
+        self._skipping = False
+        self._entries.append(self._current)
+
+    def add_message(self, line: int, record: dict) -> None:
+        if self._skipping:
+            self._progress.add_error(line, "message skipped: its conversation was rejected")
+            return
+        if self._current is None and self._current_id is None:
+            self._progress.add_error(line, "message appears before any conversation")
+            return
+        for required in ("role", "content"):
+            if record.get(required) is None:
+                self._progress.add_error(line, f"{required} is required")
+                return
+        row, error = _check_row(record, _MESSAGE_COLUMNS)
+        if error:
+            self._progress.add_error(line, error)
+            return
+
+        if not row.get("created_at"):
+            self._clock += timedelta(microseconds=1)
+            row["created_at"] = self._clock.isoformat()
+
+        if self._current is None:
+            # Conversation was created by an earlier batch; continue it
+            self._current = {"conversation_id": self._current_id, "messages": []}
+            self._entries.append(self._current)
+        self._current["messages"].append(row)
+        self._buffered += 1
+        if row.get("token_count") is None:
+            # Counted with the message's model, else its conversation's, as the usage ledger attributes it
+            self._uncounted.setdefault(row.get("model") or self._current_model, []).append(row)
+
+    @property
+    def full(self) -> bool:
+        return self._buffered >= IMPORT_BATCH_MESSAGES or len(self._entries) >= IMPORT_BATCH_MESSAGES
+
+    async def flush(self) -> None:
+        if not self._entries:
+            return
+        entries, self._entries, self._buffered = self._entries, [], 0
+        uncounted, self._uncounted = self._uncounted, {}
+
+        for model, messages in uncounted.items():
+            counts = await asyncio.to_thread(count_tokens_batch, [m["content"] for m in messages], model)
+            for message, count in zip(messages, counts):
+                message["token_count"] = count
+
+        ids = await asyncio.to_thread(_insert_batch, self._progress.user_id, entries)
+
+        if self._current is not None:
+            self._current_id = next(ids[i] for i, entry in enumerate(entries) if entry is self._current)
+            self._current = None
+        self._progress.batches += 1
+        self._progress.conversations += sum(1 for entry in entries if "conversation" in entry)
+        self._progress.messages += sum(len(entry["messages"]) for entry in entries)
+
+
+async def import_ndjson(user_id: str, job_id: str, chunks: AsyncIterator[bytes]) -> ImportProgress:
+    progress = ImportProgress(job_id=job_id, user_id=user_id)
+    _jobs[(user_id, job_id)] = progress
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+
+    batcher = _Batcher(progress)
+    try:
+        async for line, record, error in iter_ndjson(chunks):
+            progress.lines = line
+            if error:
+                progress.add_error(line, error)
+                continue
+            record_type = record.pop("type", None)
+            if record_type == "conversation":
+                batcher.start_conversation(line, record)
+            elif record_type == "message":
+                batcher.add_message(line, record)
+            else:
+                progress.add_error(line, 'type must be "conversation" or "message"')
+            if batcher.full:
+                await batcher.flush()
+        await batcher.flush()
+    except ValueError as e:
+        progress.failed, progress.failure_status = True, 422
+        progress.add_error(progress.lines, f"import aborted: {e}")
+    except Exception:
+        logger.exception("Import %s aborted after %d batch(es)", job_id, progress.batches)
+        progress.failed, progress.failure_status = True, 500
+        progress.add_error(progress.lines, "import aborted: failed to write batch")
+    finally:
+        progress.done = True
+    return progress
@@ -0,0 +1,29 @@
+"""Maintenance jobs for denormalized conversation data.
+
+Run periodically (cron, scheduled task) to correct counter drift:
+
+    python -m src.conversations.maintenance [conversation_id]
+"""
+
+import logging
+import sys
+
+from src.db.client import get_supabase
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_counters(conversation_id: str | None = None) -> int:
+    """Recompute message counts and token/cost totals from `messages`; returns rows corrected."""
+    db = get_supabase()
+    result = db.rpc("reconcile_conversation_counters", {"target_id": conversation_id}).execute()
+    fixed = result.data or 0
+    if fixed:
+        logger.warning("Reconciled counter drift on %d conversation(s)", fixed)
+    return fixed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    target = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"Corrected {reconcile_counters(target)} conversation(s)")
@@ -2,10 +2,18 @@
 
 from typing import Any
 
+from src.conversations.schemas import ConversationResponse
 from src.db.client import get_supabase
 from src.db.models import CONVERSATIONS, MESSAGES
+from src.db.pagination import CountMode, apply_keyset, page_result, select_with_count
+from src.db.singleflight import coalesced
+from src.utils.metrics import db_timed
 
+# Exactly the ConversationResponse fields, so listed rows can be returned without re-validation
+LIST_COLUMNS = ",".join(ConversationResponse.model_fields)
 
+
+@db_timed
 def create(user_id: str, data: dict[str, Any]) -> dict:
     db = get_supabase()
     row = {"user_id": user_id, **data}
@@ -13,33 +21,44 @@ def create(user_id: str, data: dict[str, Any]) -> dict:
     return result.data[0]
 
 
-def list_by_user(user_id: str, page: int = 1, per_page: int = 20) -> tuple[list[dict], int]:
+@db_timed
+def list_by_user(
+    user_id: str,
+    page: int = 1,
+    per_page: int = 20,
+    cursor: str | None = None,
+    count: CountMode = "exact",
+) -> tuple[list[dict], int | None, str | None]:
+    """Return (rows, total, next_cursor). With a cursor, `page` is ignored and keyset paging is used."""
     db = get_supabase()
-    offset = (page - 1) * per_page
-
-    # Get total count
-    count_result = db.table(CONVERSATIONS).select("id", count="exact").eq("user_id", user_id).eq("is_archived", False).execute()
-    total = count_result.count or 0
-
-    # Get page
-    result = (
-        db.table(CONVERSATIONS)
-        .select("*")
+    query = (
+        select_with_count(db.table(CONVERSATIONS), count, LIST_COLUMNS)
         .eq("user_id", user_id)
         .eq("is_archived", False)
-        .order("updated_at", desc=True)
-        .range(offset, offset + per_page - 1)
-        .execute()
     )
-    return result.data, total
+    query = apply_keyset(query, "updated_at", cursor, desc=True)
+
+    # Fetch one extra row to know whether another page exists
+    if cursor:
+        query = query.limit(per_page + 1)
+    else:
+        offset = (page - 1) * per_page
+        query = query.range(offset, offset + per_page)
+    result = query.execute()
 
+    rows, next_cursor = page_result(result.data, per_page, "updated_at")
+    total = result.count if count != "none" else None
+    return rows, total, next_cursor
 
+
+@db_timed
 def get_by_id(conversation_id: str) -> dict | None:
     db = get_supabase()
     result = db.table(CONVERSATIONS).select("*").eq("id", conversation_id).execute()
     return result.data[0] if result.data else None
 
 
+@db_timed
 def get_with_messages(conversation_id: str) -> tuple[dict | None, list[dict]]:
     conv = get_by_id(conversation_id)
     if not conv:
@@ -55,13 +74,38 @@ def get_with_messages(conversation_id: str) -> tuple[dict | None, list[dict]]:
     return conv, msgs.data
 
 
+@db_timed
 def update(conversation_id: str, data: dict[str, Any]) -> dict | None:
     db = get_supabase()
     result = db.table(CONVERSATIONS).update(data).eq("id", conversation_id).execute()
     return result.data[0] if result.data else None
 
 
+@db_timed
 def delete(conversation_id: str) -> bool:
     db = get_supabase()
     result = db.table(CONVERSATIONS).delete().eq("id", conversation_id).execute()
     return bool(result.data)
+
+
+@db_timed
+def conversations_batch(user_id: str, cursor: str | None, limit: int) -> tuple[list[dict], str | None]:
+    """One keyset page of all the user's conversations (archived included), oldest first."""
+    db = get_supabase()
+    query = apply_keyset(db.table(CONVERSATIONS).select("*").eq("user_id", user_id), "created_at", cursor, desc=False)
+    result = query.limit(limit + 1).execute()
+    return page_result(result.data, limit, "created_at")
+
+
+@db_timed
+def messages_batch(conversation_id: str, cursor: str | None, limit: int) -> tuple[list[dict], str | None]:
+    """One keyset page of a conversation's messages in creation order."""
+    db = get_supabase()
+    query = apply_keyset(db.table(MESSAGES).select("*").eq("conversation_id", conversation_id), "created_at", cursor, desc=False)
+    result = query.limit(limit + 1).execute()
+    return page_result(result.data, limit, "created_at")
+
+
+# Coalesced async variants for hot read paths: concurrent identical calls share one query
+list_by_user_shared = coalesced(list_by_user)
+get_with_messages_shared = coalesced(get_with_messages)
@@ -1,8 +1,11 @@
 """Conversation CRUD endpoints."""
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette.responses import StreamingResponse
 
 from src.auth.dependencies import CurrentUser, get_current_user
+from src.conversations.export import NDJSON_MEDIA_TYPE, export_conversation, export_user_conversations, gzip_stream
+from src.conversations.importer import get_import_progress, import_ndjson
 from src.conversations.schemas import (
     ConversationListResponse,
     CreateConversationRequest,
@@ -12,9 +15,12 @@ from src.conversations.service import (
     create_conversation,
     delete_conversation,
     get_conversation,
+    get_owned_conversation,
     list_conversations,
     update_conversation,
 )
+from src.db.pagination import CountMode
+from src.utils.fastjson import FastJSONResponse
 
 router = APIRouter(prefix="/api/v1/conversations", tags=["Conversations"])
 
@@ -26,20 +32,68 @@ async def create(body: CreateConversationRequest, user: CurrentUser = Depends(ge
     return {"status": "success", "data": conv}
 
 
-@router.get("", summary="List conversations", description="List the authenticated user's conversations, paginated, ordered by most recently updated.")
+@router.get("", response_model=ConversationListResponse, summary="List conversations", description="List the authenticated user's conversations, ordered by most recently updated. Pass `cursor` (from `next_cursor`) for keyset pagination; `count` controls whether a total is computed.")
 async def list_all(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    count: CountMode | None = Query(None, description="Total count: exact, estimated or none (default: exact for page mode, none for cursor mode)"),
     user: CurrentUser = Depends(get_current_user),
 ):
-    conversations, total = list_conversations(user.id, page, per_page)
-    return ConversationListResponse(data=conversations, page=page, per_page=per_page, total=total)
+    count = count or ("none" if cursor else "exact")
+    conversations, total, next_cursor = await list_conversations(user.id, page, per_page, cursor, count)
+    # Rows are selected with exactly the ConversationResponse columns, so they go out unvalidated
+    return FastJSONResponse({"status": "success", "data": conversations, "page": page, "per_page": per_page, "total": total, "next_cursor": next_cursor})
+
+
+@router.post("/import", summary="Bulk import conversations", description="Import conversations and messages from an NDJSON body in the export format, without running generations. Invalid lines are skipped and reported in `errors`. If the import aborts (422 for unusable input, 500 for a failed write), batches written before that point stay imported. Poll progress with GET /import/{job_id}, where job_id is the request's X-Request-ID.")
+async def import_conversations(request: Request, user: CurrentUser = Depends(get_current_user)):
+    progress = await import_ndjson(user.id, request.state.request_id, request.stream())
+    if progress.failed:
+        # Batches written before the abort stay committed; the body says how far it got
+        return FastJSONResponse({"status": "error", "data": progress.as_dict()}, status_code=progress.failure_status)
+    return {"status": "success", "data": progress.as_dict()}
+
+
+@router.get("/import/{job_id}", summary="Bulk import progress", description="Progress of a running or recently finished import.")
+async def import_status(job_id: str, user: CurrentUser = Depends(get_current_user)):
+    progress = get_import_progress(job_id, user.id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {"status": "success", "data": progress.as_dict()}
+
+
+def _export_response(chunks, filename: str, gzip: bool) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.ndjson"', "Cache-Control": "no-cache"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(gzip_stream(chunks), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+@router.get("/export", summary="Export all conversations", description="Stream every conversation the user owns, each followed by its messages, as NDJSON. Set `gzip=true` to compress on the fly.")
+async def export_all(
+    gzip: bool = Query(False, description="gzip-compress the stream (Content-Encoding: gzip)"),
+    user: CurrentUser = Depends(get_current_user),
+):
+    return _export_response(export_user_conversations(user.id), "conversations", gzip)
+
+
+@router.get("/{conversation_id}/export", summary="Export a conversation", description="Stream the conversation and its messages as NDJSON. Set `gzip=true` to compress on the fly.")
+async def export_one(
+    conversation_id: str,
+    gzip: bool = Query(False, description="gzip-compress the stream (Content-Encoding: gzip)"),
+    user: CurrentUser = Depends(get_current_user),
+):
+    conv = get_owned_conversation(conversation_id, user.id)
+    return _export_response(export_conversation(conv), f"conversation-{conversation_id}", gzip)
 
 
 @router.get("/{conversation_id}", summary="Get a conversation", description="Retrieve a single conversation with its full message history.")
 async def get(conversation_id: str, user: CurrentUser = Depends(get_current_user)):
-    conv, messages = get_conversation(conversation_id, user.id)
-    return {"status": "success", "data": {**conv, "messages": messages}}
+    conv, messages = await get_conversation(conversation_id, user.id)
+    # Shallow merge: conv may be shared with coalesced callers, so it is not mutated
+    return FastJSONResponse({"status": "success", "data": {**conv, "messages": messages}})
 
 
 @router.patch("/{conversation_id}", summary="Update a conversation", description="Update conversation title, system prompt, or archive status.")
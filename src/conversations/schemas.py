@@ -30,6 +30,11 @@ class ConversationResponse(BaseModel):
     system_prompt: str | None
     metadata: dict[str, Any]
     is_archived: bool
+    message_count: int = 0
+    last_message_at: str | None = None
+    total_tokens: int = 0
+    input_tokens: int = 0
+    cost_usd: float = 0.0
     created_at: str
     updated_at: str
 
@@ -41,4 +46,5 @@ class ConversationListResponse(BaseModel):
     data: list[ConversationResponse]
     page: int
     per_page: int
-    total: int
+    total: int | None = None
+    next_cursor: str | None = None
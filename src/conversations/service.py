@@ -3,6 +3,9 @@
 from fastapi import HTTPException
 
 from src.conversations import repository
+from src.db.pagination import CountMode
+from src.messages.retrieval import get_vector_index
+from src.utils.tracing import set_attribute, traced
 
 
 def verify_ownership(conversation: dict, user_id: str) -> None:
@@ -14,18 +17,35 @@ def create_conversation(user_id: str, data: dict) -> dict:
     return repository.create(user_id, data)
 
 
-def list_conversations(user_id: str, page: int, per_page: int) -> tuple[list[dict], int]:
-    return repository.list_by_user(user_id, page, per_page)
+async def list_conversations(
+    user_id: str,
+    page: int,
+    per_page: int,
+    cursor: str | None = None,
+    count: CountMode = "exact",
+) -> tuple[list[dict], int | None, str | None]:
+    return await repository.list_by_user_shared(user_id, page, per_page, cursor, count)
 
 
-def get_conversation(conversation_id: str, user_id: str) -> tuple[dict, list[dict]]:
-    conv, messages = repository.get_with_messages(conversation_id)
+@traced("get_conversation")
+async def get_conversation(conversation_id: str, user_id: str) -> tuple[dict, list[dict]]:
+    conv, messages = await repository.get_with_messages_shared(conversation_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     verify_ownership(conv, user_id)
+    set_attribute("conversation.message_count", conv.get("message_count", 0))
     return conv, messages
 
 
+def get_owned_conversation(conversation_id: str, user_id: str) -> dict:
+    """Fetch the conversation row only (no messages) and enforce ownership."""
+    conv = repository.get_by_id(conversation_id)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    verify_ownership(conv, user_id)
+    return conv
+
+
 def update_conversation(conversation_id: str, user_id: str, data: dict) -> dict:
     conv = repository.get_by_id(conversation_id)
     if not conv:
@@ -44,3 +64,4 @@ def delete_conversation(conversation_id: str, user_id: str) -> None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     verify_ownership(conv, user_id)
     repository.delete(conversation_id)
+    get_vector_index().drop(conversation_id)
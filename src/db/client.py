@@ -6,8 +6,21 @@ from supabase import Client, create_client
 
 from src.config.settings import get_settings
 
+# Set by set_supabase(); the benchmarks run the app against an in-memory store
+_override: Client | None = None
+
 
 @lru_cache()
-def get_supabase() -> Client:
+def _connect() -> Client:
     settings = get_settings()
     return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+
+
+def get_supabase() -> Client:
+    return _override if _override is not None else _connect()
+
+
+def set_supabase(client: Client | None) -> None:
+    """Serve get_supabase() from another client with the same query-builder API; None restores Supabase."""
+    global _override
+    _override = client
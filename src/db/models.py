@@ -6,6 +6,7 @@ CONVERSATIONS = "conversations"
 MESSAGES = "messages"
 API_KEYS = "api_keys"
 REFRESH_TOKENS = "refresh_tokens"
+USAGE_DAILY = "usage_daily"
 
 # Role constants
 ROLE_USER = "user"
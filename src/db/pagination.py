@@ -0,0 +1,59 @@
+"""Keyset (cursor) pagination helpers for Supabase queries.
+
+Cursors are opaque base64url tokens over a (timestamp, id) pair. A page is
+fetched with a range predicate on that pair instead of an OFFSET, so page N
+costs the same as page 1 and rows inserted mid-scroll never shift the window.
+"""
+
+import base64
+import json
+from typing import Any, Literal
+
+from fastapi import HTTPException
+
+# Total-count strategies accepted by PostgREST; None skips counting entirely
+CountMode = Literal["exact", "estimated", "none"]
+
+
+def encode_cursor(row: dict, column: str) -> str:
+    raw = json.dumps({"t": row[column], "id": row["id"]}, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        value, row_id = str(data["t"]), str(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    # Cursor values are interpolated into a quoted PostgREST filter
+    if '"' in value or '"' in row_id or "\\" in value or "\\" in row_id:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return value, row_id
+
+
+def apply_keyset(query: Any, column: str, cursor: str | None, desc: bool) -> Any:
+    """Order by (column, id) and, when a cursor is given, start strictly after it."""
+    query = query.order(column, desc=desc).order("id", desc=desc)
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        op = "lt" if desc else "gt"
+        # Quote values: timestamps contain ':' and '+', which are significant in PostgREST filters
+        query = query.or_(f'{column}.{op}."{value}",and({column}.eq."{value}",id.{op}."{row_id}")')
+    return query
+
+
+def select_with_count(query_builder: Any, count: CountMode, columns: str = "*") -> Any:
+    """Select rows and, unless count is "none", fetch the total in the same round trip."""
+    if count == "none":
+        return query_builder.select(columns)
+    return query_builder.select(columns, count=count)
+
+
+def page_result(rows: list[dict], per_page: int, column: str) -> tuple[list[dict], str | None]:
+    """Trim the look-ahead row fetched with limit(per_page + 1) and build the next cursor."""
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, encode_cursor(rows[-1], column)
+    return rows, None
@@ -0,0 +1,89 @@
+"""In-process singleflight: concurrent identical reads share one in-flight query.
+
+Repository functions are synchronous Supabase calls. The coalesced wrapper runs
+the first caller's query in a worker thread and lets every concurrent caller
+with the same key await that same result, so a burst of identical reads costs
+one round trip instead of N.
+"""
+
+import asyncio
+import functools
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+# Followers stop waiting on a leader older than this and query on their own
+DEFAULT_TIMEOUT_SECONDS = 5.0
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[tuple, _Call] = {}
+        # function name -> {"calls", "executions", "coalesced", "timeouts"}
+        self._stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "executions": 0, "coalesced": 0, "timeouts": 0}
+        )
+
+    async def do(self, key: tuple, fn: Callable[..., Any], *args, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Any:
+        stats = self._stats[key[0]]
+        stats["calls"] += 1
+
+        call = self._calls.get(key)
+        if call is not None:
+            remaining = timeout - (time.monotonic() - call.started_at)
+            if remaining > 0:
+                stats["coalesced"] += 1
+                try:
+                    return await asyncio.wait_for(asyncio.shield(call.task), remaining)
+                except asyncio.TimeoutError:
+                    stats["timeouts"] += 1
+
+        # The query runs in its own task so a cancelled caller never cancels it for the others
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        task.add_done_callback(functools.partial(self._forget, key))
+        self._calls[key] = _Call(task=task)
+        stats["executions"] += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: tuple, task: asyncio.Task) -> None:
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark retrieved so an error with no remaining awaiters isn't logged as unhandled
+            task.exception()
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {name: dict(values) for name, values in self._stats.items()}
+
+
+_group = SingleFlight()
+
+
+def coalesced(fn: Callable[..., Any], timeout: float = DEFAULT_TIMEOUT_SECONDS) -> Callable[..., Awaitable[Any]]:
+    """Return an async variant of a sync read function that coalesces identical calls.
+
+    Arguments form the key, so they must be hashable. Only wrap pure reads: a
+    caller may receive a result whose query started just before its own request,
+    and the result object is shared between callers, so it must not be mutated.
+    """
+
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    async def wrapper(*args):
+        return await _group.do((name, *args), fn, *args, timeout=timeout)
+
+    return wrapper
+
+
+def get_singleflight_stats() -> dict[str, dict[str, int]]:
+    return _group.stats()
@@ -0,0 +1,188 @@
+"""Admission control for LLM generations.
+
+Bounds how many generations run at once in this worker (globally and per
+user). Requests over the limit wait in a bounded FIFO queue with a deadline;
+when the queue is full or the deadline passes, they are shed with 503 and a
+Retry-After estimate instead of piling more calls onto the provider.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException
+
+from src.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Recent queue waits kept for percentile reporting
+_WAIT_SAMPLES = 1024
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+@dataclass
+class Ticket:
+    user_id: str
+    queued_at: float = field(default_factory=time.monotonic)
+    admitted_at: float | None = None
+    released: bool = False
+
+    @property
+    def wait_ms(self) -> int:
+        return int(((self.admitted_at or time.monotonic()) - self.queued_at) * 1000)
+
+
+@dataclass
+class _Waiter:
+    ticket: Ticket
+    future: asyncio.Future
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, per_user: int, max_queue: int, queue_timeout: float):
+        self._max_in_flight = max_in_flight
+        self._per_user = per_user
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._user_in_flight: Counter[str] = Counter()
+        self._user_queued: Counter[str] = Counter()
+        self._queue: deque[_Waiter] = deque()
+        self._waits: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        # Smoothed generation duration, for Retry-After estimates
+        self._avg_hold = 5.0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_user_limit = 0
+
+    def _can_admit(self, user_id: str) -> bool:
+        return self._in_flight < self._max_in_flight and self._user_in_flight[user_id] < self._per_user
+
+    def _admit(self, ticket: Ticket) -> None:
+        ticket.admitted_at = time.monotonic()
+        self._in_flight += 1
+        self._user_in_flight[ticket.user_id] += 1
+        self._waits.append(ticket.admitted_at - ticket.queued_at)
+        self.admitted += 1
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead of a new request is likely to drain."""
+        backlog = len(self._queue) + 1
+        seconds = math.ceil(backlog / max(self._max_in_flight, 1) * self._avg_hold)
+        return max(1, min(seconds, MAX_RETRY_AFTER_SECONDS))
+
+    def _reject(self, status: int, detail: str) -> HTTPException:
+        return HTTPException(status_code=status, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    async def acquire(self, user_id: str) -> Ticket:
+        """Wait for a generation slot; raises 503 when overloaded, 429 when the user has too many queued."""
+        ticket = Ticket(user_id=user_id)
+        if not self._queue and self._can_admit(user_id):
+            self._admit(ticket)
+            return ticket
+
+        # A user may queue at most as many requests as they may run, so one client can't fill the queue
+        if self._user_queued[user_id] >= self._per_user:
+            self.rejected_user_limit += 1
+            raise self._reject(429, "Too many concurrent generations for this user")
+        if len(self._queue) >= self._max_queue:
+            self.rejected_queue_full += 1
+            raise self._reject(503, "Server is busy, please retry later")
+
+        waiter = _Waiter(ticket, asyncio.get_running_loop().create_future())
+        self._queue.append(waiter)
+        self._user_queued[user_id] += 1
+        # Slots may be free while earlier waiters are blocked only by their own per-user cap
+        self._dispatch()
+        if waiter.future.done():
+            return ticket
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self._queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.future.done():
+                self._abandon(waiter)
+                self.rejected_timeout += 1
+                raise self._reject(503, "Timed out waiting for a generation slot")
+        except asyncio.CancelledError:
+            # The caller went away: give up the place in line, or the slot if it was just granted
+            if waiter.future.done():
+                self.release(ticket)
+            else:
+                self._abandon(waiter)
+            raise
+        return ticket
+
+    def _dequeue(self, waiter: _Waiter) -> None:
+        self._queue.remove(waiter)
+        user_id = waiter.ticket.user_id
+        self._user_queued[user_id] -= 1
+        if not self._user_queued[user_id]:
+            del self._user_queued[user_id]
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        waiter.future.cancel()
+        self._dequeue(waiter)
+
+    def release(self, ticket: Ticket) -> None:
+        """Free the ticket's slot and admit waiters; safe to call more than once."""
+        if ticket.released or ticket.admitted_at is None:
+            return
+        ticket.released = True
+        self._in_flight -= 1
+        self._user_in_flight[ticket.user_id] -= 1
+        if not self._user_in_flight[ticket.user_id]:
+            del self._user_in_flight[ticket.user_id]
+        held = time.monotonic() - ticket.admitted_at
+        self._avg_hold = 0.9 * self._avg_hold + 0.1 * held
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit queued requests in FIFO order, skipping users already at their cap."""
+        for waiter in list(self._queue):
+            if self._in_flight >= self._max_in_flight:
+                break
+            if self._user_in_flight[waiter.ticket.user_id] >= self._per_user:
+                continue
+            self._dequeue(waiter)
+            self._admit(waiter.ticket)
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def pct(q: float) -> int | None:
+            return int(waits[min(len(waits) - 1, math.ceil(q * len(waits)) - 1)] * 1000) if waits else None
+
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "per_user_limit": self._per_user,
+            "queued": len(self._queue),
+            "max_queue": self._max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_user_limit": self.rejected_user_limit,
+            "queue_wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)},
+        }
+
+
+_controller: AdmissionController | None = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        settings = get_settings()
+        _controller = AdmissionController(
+            settings.ADMISSION_MAX_IN_FLIGHT,
+            settings.ADMISSION_PER_USER,
+            settings.ADMISSION_QUEUE_MAX,
+            settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        )
+    return _controller
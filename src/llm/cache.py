@@ -0,0 +1,175 @@
+"""Exact-match LLM response cache with TTL and byte-bounded LRU eviction."""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+
+from src.config.settings import get_settings
+from src.utils.cost_tracker import estimate_cost
+
+# Rough per-entry bookkeeping overhead (key, timestamps, dict slots)
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+@dataclass
+class _Entry:
+    value: dict
+    size: int
+    expires_at: float
+
+
+def _normalize_messages(messages: list[dict]) -> list[list[str]]:
+    """Keep only the fields that affect generation, with trailing whitespace trimmed."""
+    return [[msg.get("role", ""), (msg.get("content") or "").rstrip()] for msg in messages]
+
+
+def make_cache_key(messages: list[dict], model: str, params: dict | None = None) -> str:
+    payload = {
+        "model": model,
+        "messages": _normalize_messages(messages),
+        "params": params or {},
+    }
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _entry_size(key: str, value: dict) -> int:
+    size = len(key) + _ENTRY_OVERHEAD_BYTES
+    size += len(value.get("content", "").encode())
+    for chunk in value.get("chunks", []):
+        size += len(chunk.get("content", "").encode()) + 64
+    return size
+
+
+class ResponseCache:
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self._ttl = ttl_seconds
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+        self.cost_saved_usd = 0.0
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: dict) -> None:
+        size = _entry_size(key, value)
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value=value, size=size, expires_at=time.monotonic() + self._ttl)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def record_savings(self, input_tokens: int, output_tokens: int, model: str) -> None:
+        self.tokens_saved += input_tokens + output_tokens
+        self.cost_saved_usd += estimate_cost(input_tokens, output_tokens, model)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "tokens_saved": self.tokens_saved,
+            "cost_saved_usd": round(self.cost_saved_usd, 6),
+        }
+
+
+class CachedLLMClient:
+    """Wraps an LLMClient; serves identical (model, context) calls from the cache.
+
+    Streams are recorded chunk-by-chunk and only stored once the provider sends
+    its finish chunk, so a client disconnect never caches a partial answer.
+    """
+
+    def __init__(self, inner, cache: ResponseCache):
+        self._inner = inner
+        self._cache = cache
+
+    async def generate(self, messages: list[dict], model: str) -> dict:
+        key = make_cache_key(messages, model)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.record_savings(cached["input_tokens"], cached["output_tokens"], model)
+            return {**cached, "cached": True}
+
+        result = await self._inner.generate(messages, model)
+        if result.get("finish_reason") == "stop" and result.get("content"):
+            self._cache.set(key, {
+                "content": result["content"],
+                "finish_reason": result["finish_reason"],
+                "input_tokens": result.get("input_tokens", 0),
+                "output_tokens": result.get("output_tokens", 0),
+            })
+        return result
+
+    async def generate_stream(self, messages: list[dict], model: str) -> AsyncGenerator[dict, None]:
+        key = make_cache_key(messages, model, {"stream": True})
+        cached = self._cache.get(key)
+        if cached is not None:
+            usage = cached["usage"]
+            self._cache.record_savings(usage.get("input_tokens", 0), usage.get("output_tokens", 0), model)
+            for chunk in cached["chunks"]:
+                if chunk["type"] == "finish":
+                    # Mark the replay so the caller doesn't bill it as a provider call
+                    chunk = {**chunk, "usage": {**chunk.get("usage", {}), "cached": True}}
+                yield chunk
+            return
+
+        chunks: list[dict] = []
+        async for chunk in self._inner.generate_stream(messages, model):
+            chunks.append(chunk)
+            yield chunk
+            if chunk["type"] == "finish" and chunk.get("finish_reason") == "stop":
+                self._cache.set(key, {
+                    "chunks": chunks,
+                    "usage": chunk.get("usage", {}),
+                })
+
+
+_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Return the process-wide cache, or None when caching is disabled."""
+    global _cache
+    settings = get_settings()
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = ResponseCache(settings.LLM_CACHE_TTL_SECONDS, settings.LLM_CACHE_MAX_BYTES)
+    return _cache
@@ -1,10 +1,16 @@
 """LLM client abstraction with Groq (primary) and Google AI (fallback)."""
 
 import logging
+import time
 from abc import ABC, abstractmethod
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable
 
 from src.config.settings import get_settings
+from src.llm.cache import CachedLLMClient, get_response_cache
+from src.llm.models import max_output_tokens
+from src.llm.pool import ProviderPool
+from src.llm.scheduler import RateLimitScheduler, TokenBudget
+from src.utils.metrics import record_generation
 
 logger = logging.getLogger(__name__)
 
@@ -12,7 +18,7 @@ logger = logging.getLogger(__name__)
 class LLMClient(ABC):
     @abstractmethod
     async def generate(self, messages: list[dict], model: str) -> dict:
-        """Return {"content": str, "finish_reason": str, "input_tokens": int, "output_tokens": int}."""
+        """Return {"content": str, "finish_reason": str, "input_tokens": int, "output_tokens": int, "cached_input_tokens": int}."""
         ...
 
     @abstractmethod
@@ -21,44 +27,74 @@ class LLMClient(ABC):
         ...
 
 
+def _output_cap(model: str) -> dict:
+    """Request kwargs capping the reply at the registry's output limit, which context budgets reserve."""
+    cap = max_output_tokens(model)
+    return {"max_tokens": cap} if cap else {}
+
+
+def _cached_prompt_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prompt cache, when the provider reports them."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details else 0
+
+
 class GroqClient(LLMClient):
-    def __init__(self):
+    def __init__(self, api_key: str | None = None):
         from groq import AsyncGroq
         settings = get_settings()
-        self._client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+        self._client = AsyncGroq(api_key=api_key or settings.GROQ_API_KEY)
 
-    async def generate(self, messages: list[dict], model: str) -> dict:
-        response = await self._client.chat.completions.create(
+    async def generate(self, messages: list[dict], model: str, on_headers: Callable | None = None) -> dict:
+        started = time.perf_counter()
+        raw = await self._client.chat.completions.with_raw_response.create(
             model=model,
             messages=messages,
+            **_output_cap(model),
         )
+        if on_headers:
+            on_headers(raw.headers)
+        response = await raw.parse()
         choice = response.choices[0]
+        output_tokens = response.usage.completion_tokens if response.usage else 0
+        record_generation("groq", model, started, output_tokens)
         return {
             "content": choice.message.content or "",
             "finish_reason": choice.finish_reason,
             "input_tokens": response.usage.prompt_tokens if response.usage else 0,
-            "output_tokens": response.usage.completion_tokens if response.usage else 0,
+            "output_tokens": output_tokens,
+            "cached_input_tokens": _cached_prompt_tokens(response.usage),
         }
 
-    async def generate_stream(self, messages: list[dict], model: str) -> AsyncGenerator[dict, None]:
-        stream = await self._client.chat.completions.create(
+    async def generate_stream(self, messages: list[dict], model: str, on_headers: Callable | None = None) -> AsyncGenerator[dict, None]:
+        started = time.perf_counter()
+        first_token_at = None
+        raw = await self._client.chat.completions.with_raw_response.create(
             model=model,
             messages=messages,
             stream=True,
+            **_output_cap(model),
         )
+        if on_headers:
+            on_headers(raw.headers)
+        stream = await raw.parse()
         async for chunk in stream:
             if not chunk.choices:
                 continue
             delta = chunk.choices[0].delta
             if delta.content:
+                first_token_at = first_token_at or time.perf_counter()
                 yield {"type": "delta", "content": delta.content}
             if chunk.choices[0].finish_reason:
+                usage = chunk.x_groq.usage if hasattr(chunk, "x_groq") and chunk.x_groq else None
+                record_generation("groq", model, started, usage.completion_tokens if usage else 0, first_token_at)
                 yield {
                     "type": "finish",
                     "finish_reason": chunk.choices[0].finish_reason,
                     "usage": {
-                        "input_tokens": chunk.x_groq.usage.prompt_tokens if hasattr(chunk, "x_groq") and chunk.x_groq and chunk.x_groq.usage else 0,
-                        "output_tokens": chunk.x_groq.usage.completion_tokens if hasattr(chunk, "x_groq") and chunk.x_groq and chunk.x_groq.usage else 0,
+                        "input_tokens": usage.prompt_tokens if usage else 0,
+                        "output_tokens": usage.completion_tokens if usage else 0,
+                        "cached_input_tokens": _cached_prompt_tokens(usage),
                     },
                 }
 
@@ -72,39 +108,57 @@ class GoogleAIClient(LLMClient):
 
     def _convert_messages(self, messages: list[dict]) -> tuple[str | None, list[dict]]:
         """Convert OpenAI-style messages to Gemini format."""
-        system = None
+        system_parts = []
         history = []
         for msg in messages:
             if msg["role"] == "system":
-                system = msg["content"]
+                system_parts.append(msg["content"])
             else:
                 role = "user" if msg["role"] == "user" else "model"
                 history.append({"role": role, "parts": [msg["content"]]})
-        return system, history
+        # Context builders may add system messages (summary, retrieval note) after the prompt
+        return "\n\n".join(system_parts) or None, history
+
+    def _model(self, model: str, system: str | None):
+        cap = max_output_tokens(model)
+        return self._genai.GenerativeModel(
+            model,
+            system_instruction=system,
+            generation_config={"max_output_tokens": cap} if cap else None,
+        )
 
     async def generate(self, messages: list[dict], model: str) -> dict:
         system, history = self._convert_messages(messages)
-        gen_model = self._genai.GenerativeModel(model, system_instruction=system)
+        gen_model = self._model(model, system)
         # Last message is the user prompt; history is everything before
         last = history[-1] if history else {"parts": [""]}
         chat = gen_model.start_chat(history=history[:-1])
+        started = time.perf_counter()
         response = await chat.send_message_async(last["parts"][0])
+        output_tokens = response.usage_metadata.candidates_token_count if response.usage_metadata else 0
+        record_generation("google", model, started, output_tokens)
         return {
             "content": response.text,
             "finish_reason": "stop",
             "input_tokens": response.usage_metadata.prompt_token_count if response.usage_metadata else 0,
-            "output_tokens": response.usage_metadata.candidates_token_count if response.usage_metadata else 0,
+            "output_tokens": output_tokens,
+            "cached_input_tokens": getattr(response.usage_metadata, "cached_content_token_count", 0) or 0,
         }
 
     async def generate_stream(self, messages: list[dict], model: str) -> AsyncGenerator[dict, None]:
         system, history = self._convert_messages(messages)
-        gen_model = self._genai.GenerativeModel(model, system_instruction=system)
+        gen_model = self._model(model, system)
         last = history[-1] if history else {"parts": [""]}
         chat = gen_model.start_chat(history=history[:-1])
+        started = time.perf_counter()
+        first_token_at = None
         response = await chat.send_message_async(last["parts"][0], stream=True)
         async for chunk in response:
             if chunk.text:
+                first_token_at = first_token_at or time.perf_counter()
                 yield {"type": "delta", "content": chunk.text}
+        # The stream reports no usage; record timing only
+        record_generation("google", model, started, 0, first_token_at)
         yield {
             "type": "finish",
             "finish_reason": "stop",
@@ -113,15 +167,53 @@ class GoogleAIClient(LLMClient):
 
 
 # Singletons
-_clients: dict[str, LLMClient] = {}
-
-
-def get_llm_client(provider: str = "groq") -> LLMClient:
+_clients: dict[str, LLMClient | ProviderPool] = {}
+
+
+def _groq_pool() -> ProviderPool:
+    """One GroqClient and rate-limit budget per configured key."""
+    settings = get_settings()
+    keys = settings.groq_api_keys
+    scheduler = RateLimitScheduler(
+        [TokenBudget() for _ in keys],
+        settings.LLM_SCHEDULER_MAX_WAIT_SECONDS,
+        settings.LLM_SCHEDULER_USER_WEIGHTS,
+        settings.LLM_SCHEDULER_BACKGROUND_WEIGHT,
+    )
+    return ProviderPool(
+        "groq",
+        [GroqClient(key) for key in keys],
+        scheduler,
+        # Pace calls by the budgets each key's rate-limit headers report
+        pace=settings.LLM_SCHEDULER_ENABLED,
+        auth_eject_seconds=settings.LLM_KEY_AUTH_EJECT_SECONDS,
+        error_eject_seconds=settings.LLM_KEY_ERROR_EJECT_SECONDS,
+    )
+
+
+def get_llm_client(provider: str = "groq", cached: bool = True) -> LLMClient | ProviderPool:
+    """Return the provider client, wrapped in the response cache when enabled.
+
+    Pass cached=False to bypass the cache for a single call.
+    """
     if provider not in _clients:
         if provider == "groq":
-            _clients[provider] = GroqClient()
+            _clients[provider] = _groq_pool()
         elif provider == "google":
             _clients[provider] = GoogleAIClient()
         else:
             raise ValueError(f"Unknown LLM provider: {provider}")
+    cache = get_response_cache() if cached else None
+    if cache is not None:
+        return CachedLLMClient(_clients[provider], cache)
     return _clients[provider]
+
+
+def register_llm_client(provider: str, client: LLMClient | ProviderPool) -> None:
+    """Install the client get_llm_client() returns for `provider`, e.g. a fake provider for load benchmarks."""
+    _clients[provider] = client
+
+
+def get_provider_stats() -> dict:
+    """Per-key load, health and rate-limit budgets of the pooled providers."""
+    return {"groq": get_llm_client("groq", cached=False).stats()}
@@ -1,15 +1,20 @@
-"""Sliding window context management for LLM calls."""
+"""Context window management for LLM calls: sliding or chunked window, rolling summary and retrieval."""
 
+from src.llm.prompts import RETRIEVAL_CONTEXT_NOTE, SUMMARY_CONTEXT_PREFIX
 from src.llm.token_counter import count_tokens
 
-# Default token budget (conservative for smaller models)
+# Token budget when the caller doesn't pass the model's budget from the registry
 DEFAULT_MAX_TOKENS = 6000
 
+# History is dropped in chunks of about this many tokens in chunked mode
+DEFAULT_CHUNK_TOKENS = 1500
+
 
 def build_context(
     conversation_messages: list[dict],
     system_prompt: str,
     max_tokens: int = DEFAULT_MAX_TOKENS,
+    model: str | None = None,
 ) -> list[dict]:
     """Build a message list that fits within the token budget.
 
@@ -17,7 +22,7 @@ def build_context(
     recent messages as fit within the remaining budget.
     """
     system_msg = {"role": "system", "content": system_prompt}
-    system_tokens = count_tokens(system_prompt) + 4
+    system_tokens = count_tokens(system_prompt, model) + 4
 
     if not conversation_messages:
         return [system_msg]
@@ -26,7 +31,7 @@ def build_context(
 
     # Always try to include the first message for context
     first_msg = {"role": conversation_messages[0]["role"], "content": conversation_messages[0]["content"]}
-    first_tokens = count_tokens(first_msg["content"]) + 4
+    first_tokens = count_tokens(first_msg["content"], model) + 4
 
     # Build from the end (most recent messages first)
     recent: list[dict] = []
@@ -34,7 +39,7 @@ def build_context(
 
     for msg in reversed(conversation_messages[1:]):
         entry = {"role": msg["role"], "content": msg["content"]}
-        msg_tokens = count_tokens(entry["content"]) + 4
+        msg_tokens = count_tokens(entry["content"], model) + 4
         if used + msg_tokens + first_tokens > budget:
             break
         recent.insert(0, entry)
@@ -45,3 +50,111 @@ def build_context(
         return [system_msg, first_msg] + recent
     else:
         return [system_msg] + recent
+
+
+def _chunk_starts(costs: list[int], chunk_tokens: int) -> list[int]:
+    """Message indexes where a new chunk begins.
+
+    Boundaries depend only on the messages before them, so appending messages
+    never moves an existing boundary.
+    """
+    starts = [0]
+    filled = 0
+    for i, cost in enumerate(costs):
+        if filled >= chunk_tokens:
+            starts.append(i)
+            filled = 0
+        filled += cost
+    return starts
+
+
+def build_chunked_context(
+    conversation_messages: list[dict],
+    system_prompt: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    model: str | None = None,
+) -> list[dict]:
+    """Build a prefix-stable message list that fits within the token budget.
+
+    Like build_context, but older history is dropped a whole chunk at a time
+    instead of one message per turn. Between drops every turn's prompt starts
+    with the same bytes as the previous one, so providers can serve that prefix
+    from their prompt cache.
+    """
+    system_msg = {"role": "system", "content": system_prompt}
+    if not conversation_messages:
+        return [system_msg]
+
+    costs = [(msg.get("token_count") or count_tokens(msg["content"], model)) + 4 for msg in conversation_messages]
+    budget = max_tokens - count_tokens(system_prompt, model) - 4
+    if sum(costs) <= budget:
+        return [system_msg] + [{"role": m["role"], "content": m["content"]} for m in conversation_messages]
+
+    # Anchor the first message, as build_context does, when it leaves room for history
+    first = costs[0] if costs[0] <= budget // 2 else 0
+    window = budget - first
+
+    suffix = [0] * (len(costs) + 1)
+    for i in range(len(costs) - 1, -1, -1):
+        suffix[i] = suffix[i + 1] + costs[i]
+
+    start = next((s for s in _chunk_starts(costs, chunk_tokens) if s > 0 and suffix[s] <= window), None)
+    if start is None:
+        # Even the newest chunk is too large: fall back to message granularity
+        start = next((i for i in range(1, len(costs)) if suffix[i] <= window), len(costs) - 1)
+
+    head = [system_msg]
+    if first:
+        head.append({"role": conversation_messages[0]["role"], "content": conversation_messages[0]["content"]})
+    return head + [{"role": m["role"], "content": m["content"]} for m in conversation_messages[start:]]
+
+
+def build_summary_context(
+    tail_messages: list[dict],
+    system_prompt: str,
+    summary: str | None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    model: str | None = None,
+) -> list[dict]:
+    """Build system prompt + rolling summary + as many recent messages as fit.
+
+    `tail_messages` are the messages after the summary's high-water mark; the
+    summary stands in for everything before it, including the first message.
+    """
+    context = [{"role": "system", "content": system_prompt}]
+    budget = max_tokens - count_tokens(system_prompt, model) - 4
+
+    if summary:
+        summary_msg = {"role": "system", "content": SUMMARY_CONTEXT_PREFIX + summary}
+        context.append(summary_msg)
+        budget -= count_tokens(summary_msg["content"], model) + 4
+
+    recent: list[dict] = []
+    used = 0
+    for msg in reversed(tail_messages):
+        msg_tokens = (msg.get("token_count") or count_tokens(msg["content"], model)) + 4
+        if used + msg_tokens > budget:
+            break
+        recent.append({"role": msg["role"], "content": msg["content"]})
+        used += msg_tokens
+    recent.reverse()
+    return context + recent
+
+
+def retrieval_budget(system_prompt: str, max_tokens: int = DEFAULT_MAX_TOKENS, model: str | None = None) -> int:
+    """Tokens left for history once the system prompt and retrieval note are counted."""
+    return max_tokens - count_tokens(system_prompt, model) - count_tokens(RETRIEVAL_CONTEXT_NOTE, model) - 8
+
+
+def build_retrieval_context(retrieved: list[dict], recent: list[dict], system_prompt: str) -> list[dict]:
+    """Build system prompt + relevant older messages + the recent window.
+
+    Both lists are already chosen to fit `retrieval_budget`; a short system
+    note marks where the retrieved, non-contiguous messages end.
+    """
+    context = [{"role": "system", "content": system_prompt}]
+    if retrieved:
+        context.append({"role": "system", "content": RETRIEVAL_CONTEXT_NOTE})
+        context.extend(retrieved)
+    return context + recent
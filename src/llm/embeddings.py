@@ -0,0 +1,52 @@
+"""Local hashing-trick TF-IDF embeddings for message retrieval.
+
+Words are hashed into a fixed number of buckets (no vocabulary, no network,
+no model download) and weighted by sublinear term frequency. IDF is applied at
+query time from the document frequencies of the collection being searched, so
+vectors never need re-embedding as a conversation grows.
+"""
+
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _bucket(word: str, dim: int) -> int:
+    # crc32 is stable across processes, unlike hash(), so on-disk vectors stay valid
+    return zlib.crc32(word.encode()) % dim
+
+
+def embed_texts(texts: list[str], dim: int) -> np.ndarray:
+    """Return an (n, dim) float32 matrix of log(1 + tf) bucket weights."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = _WORD_RE.findall(text.lower())
+        if words:
+            buckets = np.fromiter((_bucket(w, dim) for w in words), dtype=np.int64, count=len(words))
+            matrix[row] = np.bincount(buckets, minlength=dim)
+    return np.log1p(matrix, out=matrix)
+
+
+def idf_weights(document_frequency: np.ndarray, n_documents: int) -> np.ndarray:
+    """Smoothed inverse document frequency per bucket."""
+    return (np.log((1.0 + n_documents) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+
+
+def cosine_scores(matrix: np.ndarray, query: np.ndarray, idf: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every TF-IDF row against the query, in one pass over the matrix."""
+    weighted_query = query * idf
+    query_norm = float(np.linalg.norm(weighted_query))
+    if query_norm == 0.0 or not len(matrix):
+        return np.zeros(len(matrix), dtype=np.float32)
+    idf_sq = idf * idf
+    # ||row * idf|| without materializing the weighted matrix
+    row_norms = np.sqrt((matrix * matrix) @ idf_sq)
+    dots = matrix @ (weighted_query * idf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = dots / (row_norms * query_norm)
+    return np.nan_to_num(scores, copy=False)
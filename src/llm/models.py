@@ -0,0 +1,123 @@
+"""Model registry: provider, context window, output cap, tokenizer and pricing per model.
+
+The built-in catalog below can be extended or overridden with a JSON file
+(MODEL_REGISTRY_PATH) holding a list of objects with the same fields. The
+registry is loaded once, at startup.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import asdict, dataclass, fields
+
+from src.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Used for models missing from the registry
+DEFAULT_CONTEXT_WINDOW = 8192
+DEFAULT_MAX_OUTPUT_TOKENS = 2048
+DEFAULT_TOKENIZER = "cl100k_base"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    id: str
+    provider: str
+    name: str
+    context_window: int
+    max_output_tokens: int
+    # tiktoken encoding used to approximate the model's tokenizer
+    tokenizer: str
+    # USD per 1K tokens
+    input_price: float
+    output_price: float
+    cached_input_price: float | None = None
+
+    @property
+    def context_budget(self) -> int:
+        """Prompt tokens available once the reply's output cap is reserved."""
+        return self.context_window - self.max_output_tokens
+
+
+_BUILTIN_MODELS = [
+    ModelSpec("llama-3.1-8b-instant", "groq", "Llama 3.1 8B Instant", 8192, 2048, "cl100k_base", 0.00005, 0.00008),
+    ModelSpec("llama-3.1-70b-versatile", "groq", "Llama 3.1 70B Versatile", 32768, 8192, "cl100k_base", 0.00059, 0.00079),
+    ModelSpec("llama-3.3-70b-versatile", "groq", "Llama 3.3 70B Versatile", 32768, 8192, "cl100k_base", 0.00059, 0.00079),
+    ModelSpec("mixtral-8x7b-32768", "groq", "Mixtral 8x7B", 32768, 4096, "cl100k_base", 0.00024, 0.00024),
+    ModelSpec("gemma2-9b-it", "groq", "Gemma 2 9B", 8192, 2048, "cl100k_base", 0.00020, 0.00020),
+    ModelSpec("gemini-1.5-flash", "google", "Gemini 1.5 Flash", 1048576, 8192, "cl100k_base", 0.000075, 0.0003),
+    ModelSpec("gemini-1.5-pro", "google", "Gemini 1.5 Pro", 2097152, 8192, "cl100k_base", 0.00125, 0.005),
+]
+
+
+class ModelRegistry:
+    def __init__(self, models: list[ModelSpec]):
+        self._models = {m.id: m for m in models}
+        self.catalog_body = self._serialize_catalog()
+        self.catalog_etag = f'"{hashlib.sha256(self.catalog_body).hexdigest()[:16]}"'
+
+    def get(self, model_id: str | None) -> ModelSpec | None:
+        return self._models.get(model_id) if model_id else None
+
+    def all(self) -> list[ModelSpec]:
+        return list(self._models.values())
+
+    def _serialize_catalog(self) -> bytes:
+        """Render the /models response once; it only changes when the registry is reloaded."""
+        settings = get_settings()
+        data = []
+        for m in self._models.values():
+            entry = {
+                "id": m.id,
+                "provider": m.provider,
+                "name": m.name,
+                "max_context_tokens": m.context_window,
+                "max_output_tokens": m.max_output_tokens,
+                "tokenizer": m.tokenizer,
+                "cost_per_1k_input": m.input_price,
+                "cost_per_1k_output": m.output_price,
+                "is_default": settings.DEFAULT_MODEL == m.id,
+            }
+            if settings.FALLBACK_MODEL == m.id:
+                entry["is_fallback"] = True
+            data.append(entry)
+        return json.dumps({"status": "success", "data": data}, separators=(",", ":")).encode()
+
+
+def load_registry(path: str = "") -> ModelRegistry:
+    """Build the registry from the built-in catalog plus an optional JSON override file."""
+    models = {m.id: m for m in _BUILTIN_MODELS}
+    if path:
+        allowed = {f.name for f in fields(ModelSpec)}
+        with open(path) as f:
+            entries = json.load(f)
+        for entry in entries:
+            base = asdict(models[entry["id"]]) if entry.get("id") in models else {}
+            models[entry["id"]] = ModelSpec(**{**base, **{k: v for k, v in entry.items() if k in allowed}})
+        logger.info("Loaded %d model definition(s) from %s", len(entries), path)
+    return ModelRegistry(list(models.values()))
+
+
+_registry: ModelRegistry | None = None
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = load_registry(get_settings().MODEL_REGISTRY_PATH)
+    return _registry
+
+
+def get_model(model_id: str | None) -> ModelSpec | None:
+    return get_model_registry().get(model_id)
+
+
+def context_budget(model_id: str | None) -> int:
+    spec = get_model(model_id)
+    return spec.context_budget if spec else DEFAULT_CONTEXT_WINDOW - DEFAULT_MAX_OUTPUT_TOKENS
+
+
+def max_output_tokens(model_id: str | None) -> int | None:
+    spec = get_model(model_id)
+    return spec.max_output_tokens if spec else None
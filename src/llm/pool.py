@@ -0,0 +1,199 @@
+"""Pool of provider API keys with health-aware load balancing.
+
+Each key gets its own client and its own TokenBudget in a shared
+RateLimitScheduler, which sends each call to the key that can take it soonest
+(least loaded, then most remaining budget, on ties). Keys that fail are taken
+out of rotation for a while: a 429 for its Retry-After, an auth error for
+LLM_KEY_AUTH_EJECT_SECONDS, and repeated connection or 5xx errors for
+LLM_KEY_ERROR_EJECT_SECONDS. A failed call is retried on another key, or after
+a 429 on the same key once its pause is over, as long as nothing has been
+streamed to the caller yet.
+"""
+
+import logging
+import time
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+
+from src.llm.scheduler import RateLimitScheduler, estimate_cost, parse_duration
+
+logger = logging.getLogger(__name__)
+
+# Consecutive connection/5xx errors before a key is ejected
+MAX_CONSECUTIVE_ERRORS = 3
+
+
+@dataclass
+class KeyStats:
+    label: str
+    requests: int = 0
+    successes: int = 0
+    rate_limited: int = 0
+    auth_errors: int = 0
+    errors: int = 0
+    ejections: int = 0
+    consecutive_errors: int = 0
+    total_latency_seconds: float = 0.0
+
+
+class ProviderPool:
+    """Balances calls across one client per API key.
+
+    Clients must accept an `on_headers` callback per call (see GroqClient).
+    With `pace` off, rate-limit headers are ignored: keys are still balanced by
+    load and ejected on errors, but calls are never held back.
+    """
+
+    def __init__(self, provider: str, clients: list, scheduler: RateLimitScheduler, pace: bool = True, auth_eject_seconds: float = 300.0, error_eject_seconds: float = 30.0):
+        if len(clients) != len(scheduler.budgets):
+            raise ValueError("ProviderPool needs one scheduler budget per client")
+        self._clients = clients
+        self._scheduler = scheduler
+        self._pace = pace
+        self._auth_eject_seconds = auth_eject_seconds
+        self._error_eject_seconds = error_eject_seconds
+        self._stats = [KeyStats(f"{provider}-{i}") for i in range(len(clients))]
+
+    def _observer(self, index: int, call: dict):
+        def observe(headers) -> None:
+            if not self._pace:
+                return
+            self._scheduler.budgets[index].observe(headers)
+            call["observed"] = True
+            self._scheduler.notify()
+        return observe
+
+    def _settle(self, index: int, cost: int, call: dict, usage: dict) -> None:
+        # Headers are authoritative; only correct the estimate when the provider sent none
+        if call.get("observed"):
+            return
+        actual = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        if actual:
+            self._scheduler.budgets[index].adjust(actual - cost)
+            self._scheduler.notify()
+
+    def _eject(self, index: int, seconds: float, reason: str) -> None:
+        stats = self._stats[index]
+        stats.ejections += 1
+        logger.warning("Ejecting LLM key %s for %.0fs: %s", stats.label, seconds, reason)
+        self._scheduler.budgets[index].pause(seconds)
+        self._scheduler.notify()
+
+    def _failed(self, index: int, error: Exception) -> bool:
+        """Record a failed call and update the key's health; returns True if another key may retry it."""
+        from groq import APIConnectionError, AuthenticationError, InternalServerError, PermissionDeniedError, RateLimitError
+
+        stats = self._stats[index]
+        if isinstance(error, RateLimitError):
+            stats.rate_limited += 1
+            headers = getattr(getattr(error, "response", None), "headers", {}) or {}
+            self._scheduler.budgets[index].penalize(parse_duration(headers.get("retry-after")))
+            self._scheduler.notify()
+            return True
+        if isinstance(error, (AuthenticationError, PermissionDeniedError)):
+            stats.auth_errors += 1
+            self._eject(index, self._auth_eject_seconds, "authentication failed")
+            return True
+        if isinstance(error, (APIConnectionError, InternalServerError)):
+            stats.errors += 1
+            stats.consecutive_errors += 1
+            if stats.consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                stats.consecutive_errors = 0
+                self._eject(index, self._error_eject_seconds, f"{MAX_CONSECUTIVE_ERRORS} consecutive errors")
+            return True
+        # Request errors (bad model, invalid input) would fail the same way on any key
+        stats.errors += 1
+        return False
+
+    def _may_retry(self, index: int, error: Exception, tried: set[int], rate_limited: set[int]) -> bool:
+        """Exclude a failed key from this call's next pick; returns False once no key is left.
+
+        A 429 is not excluded the first time: the key is paused for its Retry-After,
+        so the retry waits that out in the scheduler (a single-key pool included).
+        """
+        from groq import RateLimitError
+
+        if isinstance(error, RateLimitError) and index not in rate_limited:
+            rate_limited.add(index)
+        else:
+            tried.add(index)
+        return len(tried) < len(self._clients)
+
+    def _begin(self, index: int) -> float:
+        self._stats[index].requests += 1
+        self._scheduler.budgets[index].in_flight += 1
+        return time.monotonic()
+
+    def _end(self, index: int, started: float, ok: bool) -> None:
+        stats = self._stats[index]
+        self._scheduler.budgets[index].in_flight -= 1
+        if ok:
+            stats.successes += 1
+            stats.consecutive_errors = 0
+            stats.total_latency_seconds += time.monotonic() - started
+
+    async def generate(self, messages: list[dict], model: str) -> dict:
+        cost = estimate_cost(messages, model)
+        # Every key gets one try, plus one paced retry after a 429
+        tried: set[int] = set()
+        rate_limited: set[int] = set()
+        while True:
+            index = await self._scheduler.acquire(cost, frozenset(tried))
+            call: dict = {}
+            started = self._begin(index)
+            ok = False
+            try:
+                result = await self._clients[index].generate(messages, model, on_headers=self._observer(index, call))
+                ok = True
+            except Exception as e:
+                if not self._failed(index, e) or not self._may_retry(index, e, tried, rate_limited):
+                    raise
+                continue
+            finally:
+                self._end(index, started, ok)
+            self._settle(index, cost, call, result)
+            return result
+
+    async def generate_stream(self, messages: list[dict], model: str) -> AsyncGenerator[dict, None]:
+        cost = estimate_cost(messages, model)
+        tried: set[int] = set()
+        rate_limited: set[int] = set()
+        while True:
+            index = await self._scheduler.acquire(cost, frozenset(tried))
+            call: dict = {}
+            started = self._begin(index)
+            yielded = ok = False
+            try:
+                async for chunk in self._clients[index].generate_stream(messages, model, on_headers=self._observer(index, call)):
+                    yielded = True
+                    if chunk["type"] == "finish":
+                        self._settle(index, cost, call, chunk.get("usage", {}))
+                    yield chunk
+                ok = True
+                return
+            except Exception as e:
+                # Only retry if nothing has been sent to the caller yet
+                if not self._failed(index, e) or yielded or not self._may_retry(index, e, tried, rate_limited):
+                    raise
+            finally:
+                self._end(index, started, ok)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        scheduler = self._scheduler.stats()
+        keys = []
+        for stats, budget, limits in zip(self._stats, self._scheduler.budgets, scheduler.pop("budgets")):
+            keys.append({
+                "key": stats.label,
+                "requests": stats.requests,
+                "successes": stats.successes,
+                "rate_limited": stats.rate_limited,
+                "auth_errors": stats.auth_errors,
+                "errors": stats.errors,
+                "ejections": stats.ejections,
+                "in_flight": budget.in_flight,
+                "paused_for_seconds": round(max(0.0, budget.paused_until - now), 1),
+                "avg_latency_ms": int(stats.total_latency_seconds / stats.successes * 1000) if stats.successes else 0,
+                **limits,
+            })
+        return {**scheduler, "keys": keys}
@@ -11,6 +11,26 @@ TITLE_GENERATION_PROMPT = (
     "Return ONLY the title text, nothing else."
 )
 
+TITLE_BATCH_PROMPT = (
+    "Each numbered item below is the first message of a different conversation. "
+    "For each one, generate a concise title (max 8 words). "
+    "Return ONLY one line per item in the form `<number>. <title>`, in the same order."
+)
+
+SUMMARY_GENERATION_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the existing summary (if any) with the new transcript into one updated summary. "
+    "Keep facts, names, numbers, decisions, open questions and user preferences; drop pleasantries. "
+    "Write compact third-person prose of at most 300 words. Return ONLY the summary."
+)
+
+SUMMARY_CONTEXT_PREFIX = "Summary of the earlier part of this conversation:\n"
+
+RETRIEVAL_CONTEXT_NOTE = (
+    "The next messages are earlier parts of this conversation, selected for relevance. "
+    "The most recent messages follow them."
+)
+
 THINKING_PROMPT_PREFIX = (
     "Think step by step. Show your reasoning in <thinking> tags before giving your final answer.\n\n"
 )
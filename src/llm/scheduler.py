@@ -0,0 +1,269 @@
+"""Client-side pacing for provider request and token-per-minute limits.
+
+Groq reports each key's remaining request and token budgets in
+x-ratelimit-* response headers. TokenBudget mirrors those buckets locally,
+refilling them continuously between responses. Every call is charged an
+estimated cost (context tokens plus an output allowance) before dispatch; the
+call's response headers then replace the local estimate, or, when none arrive,
+the charge is corrected with the reported usage. Calls that
+don't fit wait, ordered by weighted fair queuing across users, instead of
+being sent only to fail with 429.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from src.config.settings import get_settings
+from src.llm.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# User on whose behalf LLM calls in the current task are made (None for background jobs)
+_scheduling_user: ContextVar[str | None] = ContextVar("llm_scheduling_user", default=None)
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a call can't be dispatched within the scheduler's max wait."""
+
+
+def set_scheduling_user(user_id: str | None) -> None:
+    _scheduling_user.set(user_id)
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Parse Groq reset durations such as "7.66s", "2m59.56s" or "350ms" into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+def estimate_cost(messages: list[dict], model: str) -> int:
+    """Tokens a call is expected to consume: its prompt plus an output allowance."""
+    prompt = sum(count_tokens(m.get("content") or "", model) + 4 for m in messages)
+    return prompt + get_settings().LLM_SCHEDULER_OUTPUT_TOKENS
+
+
+class TokenBudget:
+    """Local mirror of one API key's request and token buckets.
+
+    Limits start unknown (unpaced) and are learned from response headers.
+    """
+
+    def __init__(self):
+        self.request_limit = 0
+        self.token_limit = 0
+        self.requests = 0.0
+        self.tokens = 0.0
+        self.paused_until = 0.0
+        # Calls currently running against this budget, for least-loaded tie-breaking
+        self.in_flight = 0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.request_limit:
+            self.requests = min(self.request_limit, self.requests + elapsed * self.request_limit / 60)
+        if self.token_limit:
+            self.tokens = min(self.token_limit, self.tokens + elapsed * self.token_limit / 60)
+
+    def wait_time(self, cost: int, now: float) -> float:
+        """Seconds until a call costing `cost` tokens fits; 0 if it fits now."""
+        self._refill(now)
+        wait = max(0.0, self.paused_until - now)
+        if self.request_limit and self.requests < 1:
+            wait = max(wait, (1 - self.requests) * 60 / self.request_limit)
+        if self.token_limit:
+            # A call larger than the whole bucket only waits for a full bucket
+            need = min(cost, self.token_limit)
+            if self.tokens < need:
+                wait = max(wait, (need - self.tokens) * 60 / self.token_limit)
+        return wait
+
+    def consume(self, cost: int) -> None:
+        self._refill(time.monotonic())
+        if self.request_limit:
+            self.requests -= 1
+        if self.token_limit:
+            self.tokens -= cost
+
+    def adjust(self, delta: int) -> None:
+        """Correct a charged estimate by `delta` tokens once actual usage is known."""
+        if self.token_limit:
+            self.tokens = min(self.token_limit, self.tokens - delta)
+
+    def observe(self, headers) -> None:
+        """Update limits and remaining budget from x-ratelimit-* response headers."""
+        self._refill(time.monotonic())
+        for kind in ("requests", "tokens"):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if limit and limit.isdigit():
+                setattr(self, f"{kind[:-1]}_limit", int(limit))
+            if remaining and remaining.isdigit():
+                setattr(self, kind, float(remaining))
+
+    def penalize(self, retry_after: float | None) -> None:
+        """Pause after a 429 until the provider's Retry-After (or a short default) has passed."""
+        self.pause(retry_after or 1.0)
+        self.requests = min(self.requests, 0.0)
+        self.tokens = min(self.tokens, 0.0)
+
+    def pause(self, seconds: float) -> None:
+        """Take the budget out of rotation for `seconds`."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    seq: int
+    cost: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    # Budgets this call must not be given (keys it already failed on)
+    exclude: frozenset[int] = field(compare=False, default=frozenset())
+
+
+class RateLimitScheduler:
+    """Weighted fair queue in front of one or more token budgets (one per API key)."""
+
+    def __init__(self, budgets: list[TokenBudget], max_wait: float, user_weights: dict[str, float] | None = None, background_weight: float = 0.25):
+        self.budgets = budgets
+        self._max_wait = max_wait
+        self._user_weights = user_weights or {}
+        self._background_weight = background_weight
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        # Weighted fair queuing: virtual clock and each user's last virtual finish time
+        self._vtime = 0.0
+        self._user_finish: dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+        self.dispatched = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+
+    def _weight(self, user_id: str | None) -> float:
+        if user_id is None:
+            return self._background_weight
+        return self._user_weights.get(user_id, 1.0)
+
+    def _pick(self, cost: int, now: float, exclude: frozenset[int] = frozenset()) -> tuple[int | None, float]:
+        """Index of the budget outside `exclude` that can take `cost` soonest, and how long until it can.
+
+        Ties (typically several budgets that can take it now) go to the least
+        loaded budget, then to the one with the most tokens left.
+        """
+        best, best_key = None, None
+        for i, budget in enumerate(self.budgets):
+            if i in exclude:
+                continue
+            headroom = budget.tokens / budget.token_limit if budget.token_limit else 1.0
+            key = (budget.wait_time(cost, now), budget.in_flight, -headroom)
+            if best_key is None or key < best_key:
+                best, best_key = i, key
+        return best, best_key[0] if best_key else float("inf")
+
+    async def acquire(self, cost: int, exclude: frozenset[int] = frozenset()) -> int:
+        """Wait until a budget outside `exclude` can take `cost` tokens, charge it, and return its index."""
+        now = time.monotonic()
+        if not self._heap:
+            index, wait = self._pick(cost, now, exclude)
+            if wait == 0:
+                self.budgets[index].consume(cost)
+                self.dispatched += 1
+                return index
+
+        user_id = _scheduling_user.get()
+        key = user_id or "__background__"
+        start = max(self._vtime, self._user_finish.get(key, 0.0))
+        finish = start + cost / self._weight(user_id)
+        self._user_finish[key] = finish
+        waiter = _Waiter(finish, next(self._seq), cost, asyncio.get_running_loop().create_future(), exclude)
+        heapq.heappush(self._heap, waiter)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+
+        self.waited += 1
+        try:
+            index = await asyncio.wait_for(asyncio.shield(waiter.future), self._max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                return waiter.future.result()
+            waiter.future.cancel()
+            self.timeouts += 1
+            raise SchedulerTimeout(f"No provider budget for {cost} tokens within {self._max_wait}s")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller went away: hand the tokens back
+                self.budgets[waiter.future.result()].adjust(-cost)
+            waiter.future.cancel()
+            raise
+        finally:
+            self.total_wait_seconds += time.monotonic() - now
+        return index
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self) -> None:
+        while self._heap:
+            head = self._heap[0]
+            if head.future.done():
+                heapq.heappop(self._heap)
+                continue
+            index, wait = self._pick(head.cost, time.monotonic(), head.exclude)
+            if wait == 0:
+                heapq.heappop(self._heap)
+                self.budgets[index].consume(head.cost)
+                self._vtime = head.finish
+                self.dispatched += 1
+                head.future.set_result(index)
+                continue
+            # Sleep until the budget refills, or until a header update or new waiter changes the picture
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+        # Forget users who are no longer ahead of the virtual clock
+        self._user_finish = {k: v for k, v in self._user_finish.items() if v > self._vtime}
+
+    def notify(self) -> None:
+        """Re-check waiters after a budget changed (new headers or a refund)."""
+        self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(1 for w in self._heap if not w.future.done()),
+            "dispatched": self.dispatched,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": int(self.total_wait_seconds / self.waited * 1000) if self.waited else 0,
+            "budgets": [
+                {
+                    "request_limit": b.request_limit,
+                    "requests_remaining": int(b.requests),
+                    "token_limit": b.token_limit,
+                    "tokens_remaining": int(b.tokens),
+                }
+                for b in self.budgets
+            ],
+        }
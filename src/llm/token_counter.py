@@ -2,12 +2,43 @@
 
 import tiktoken
 
-# Use cl100k_base as a reasonable approximation for most models
-_encoding = tiktoken.get_encoding("cl100k_base")
+from src.llm.models import DEFAULT_TOKENIZER, get_model
 
+# Use cl100k_base as a reasonable approximation for models without a registry entry
+_encoding = tiktoken.get_encoding(DEFAULT_TOKENIZER)
+_encodings: dict[str, tiktoken.Encoding] = {DEFAULT_TOKENIZER: _encoding}
 
-def count_tokens(text: str) -> int:
-    return len(_encoding.encode(text))
+
+def _encoding_for(model: str | None) -> tiktoken.Encoding:
+    spec = get_model(model)
+    if spec is None:
+        return _encoding
+    encoding = _encodings.get(spec.tokenizer)
+    if encoding is None:
+        encoding = _encodings[spec.tokenizer] = tiktoken.get_encoding(spec.tokenizer)
+    return encoding
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    """Count tokens with the tokenizer family the registry lists for `model`."""
+    return len(_encoding_for(model).encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str | None = None) -> str:
+    """The longest prefix of `text` that is at most `max_tokens` tokens for `model`."""
+    encoding = _encoding_for(model)
+    tokens = encoding.encode_ordinary(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def count_tokens_batch(texts: list[str], model: str | None = None, num_threads: int = 8) -> list[int]:
+    """Count tokens for many texts of one model using tiktoken's native thread pool.
+
+    Special-token text is counted as ordinary text rather than rejected, which
+    matters for imported history that may quote them.
+    """
+    encoding = _encoding_for(model)
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts, num_threads=num_threads)]
 
 
 def count_messages_tokens(messages: list[dict]) -> int:
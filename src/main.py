@@ -1,15 +1,59 @@
 """Conversation API — FastAPI application entry point."""
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from src.admin.routes import router as admin_router
 from src.auth.routes import router as auth_router
 from src.conversations.routes import router as conversations_router
+from src.llm.models import get_model_registry
 from src.messages.routes import router as messages_router
+from src.messages.retrieval import get_vector_index
+from src.messages.titles import get_title_runner
+from src.usage.metrics import router as metrics_router
 from src.usage.routes import router as usage_router
 from src.config.cors import SecurityHeadersMiddleware, configure_cors
+from src.config.settings import get_settings
+from src.middleware.capture import TrafficCaptureMiddleware, get_traffic_recorder
+from src.middleware.compression import CompressionMiddleware
 from src.middleware.error_handler import register_error_handlers
+from src.middleware.metrics import MetricsMiddleware
 from src.middleware.rate_limiter import RateLimiterMiddleware
 from src.middleware.request_id import RequestIDMiddleware
+from src.utils.fastjson import FastJSONResponse
+from src.utils.loop_monitor import get_loop_monitor
+from src.utils.metrics import flush_periodically, flush_snapshot
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model registry up front so a bad MODEL_REGISTRY_PATH fails at startup
+    get_model_registry()
+    settings = get_settings()
+    if settings.LOOP_MONITOR_ENABLED:
+        get_loop_monitor().start()
+    # Share this worker's metrics with the others through METRICS_MULTIPROC_DIR
+    flusher = None
+    if settings.METRICS_MULTIPROC_DIR:
+        flusher = asyncio.create_task(flush_periodically(settings.METRICS_MULTIPROC_DIR, settings.METRICS_FLUSH_SECONDS))
+    recorder = get_traffic_recorder()
+    capture_flusher = asyncio.create_task(recorder.flush_periodically(settings.TRAFFIC_CAPTURE_FLUSH_SECONDS)) if recorder else None
+    yield
+    # Drain queued auto-title jobs so they are not lost on shutdown
+    await get_title_runner().shutdown()
+    # Persist in-memory retrieval indexes when RETRIEVAL_INDEX_DIR is set
+    get_vector_index().flush()
+    if settings.LOOP_MONITOR_ENABLED:
+        await get_loop_monitor().stop()
+    if flusher:
+        flusher.cancel()
+        flush_snapshot(settings.METRICS_MULTIPROC_DIR)
+    if capture_flusher:
+        capture_flusher.cancel()
+        recorder.flush()
+
 
 app = FastAPI(
     title="Conversation API",
@@ -30,6 +74,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     openapi_tags=[
         {"name": "Health", "description": "Health check endpoints"},
         {"name": "Auth", "description": "Authentication: register, login, token refresh, logout"},
@@ -37,14 +83,23 @@ app = FastAPI(
         {"name": "Messages", "description": "Send messages, list messages, streaming"},
         {"name": "Streaming", "description": "Server-Sent Events for real-time message delivery"},
         {"name": "Usage", "description": "Usage statistics and model information"},
+        {"name": "Admin", "description": "Operator tools, restricted to ADMIN_USER_IDS"},
     ],
 )
 
 # --- Middleware (order matters: outermost first) ---
+if get_settings().TRAFFIC_CAPTURE_PATH:
+    # Innermost: reads the user and conversation attributes from the request's trace
+    app.add_middleware(TrafficCaptureMiddleware)
+if get_settings().COMPRESSION_ENABLED:
+    # Wraps capture, so captured response sizes stay uncompressed
+    app.add_middleware(CompressionMiddleware)
 app.add_middleware(RequestIDMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 configure_cors(app)
 app.add_middleware(RateLimiterMiddleware)
+# Added last so it is outermost and times everything inside it
+app.add_middleware(MetricsMiddleware)
 
 # --- Error handlers ---
 register_error_handlers(app)
@@ -54,6 +109,8 @@ app.include_router(auth_router)
 app.include_router(conversations_router)
 app.include_router(messages_router)
 app.include_router(usage_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
 
 
 @app.get("/health", tags=["Health"], summary="Health check", description="Returns OK if the service is running.")
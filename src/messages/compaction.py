@@ -0,0 +1,186 @@
+"""Rolling summary compaction of long conversation histories.
+
+Each conversation can carry a summary of its older turns plus a high-water
+mark: the (created_at, id) of the last message the summary covers. Turns only
+fetch the tail after the mark, so input tokens per turn stay flat as the
+conversation grows. Once the tail passes COMPACTION_TRIGGER_TOKENS, a
+background job folds its older part into the summary with a cheap model,
+keeping the most recent COMPACTION_KEEP_TOKENS raw. A backlog larger than the
+model's window is folded in window-sized pieces, saving the mark after each.
+"""
+
+import asyncio
+import logging
+
+from src.config.settings import get_settings
+from src.db.client import get_supabase
+from src.db.models import CONVERSATIONS, MESSAGES
+from src.db.pagination import apply_keyset, encode_cursor
+from src.llm.client import get_llm_client
+from src.llm.models import DEFAULT_MAX_OUTPUT_TOKENS, context_budget, max_output_tokens
+from src.llm.prompts import SUMMARY_GENERATION_PROMPT
+from src.llm.scheduler import set_scheduling_user
+from src.llm.token_counter import count_tokens, truncate_tokens
+from src.utils.metrics import db_timed
+
+logger = logging.getLogger(__name__)
+
+# Cap on concurrent summarization calls per process
+MAX_CONCURRENT_COMPACTIONS = 2
+
+_MESSAGE_OVERHEAD_TOKENS = 4
+# Prompt scaffolding around the summary and transcript ("Existing summary:", separators)
+_PROMPT_OVERHEAD_TOKENS = 32
+# Floor on transcript tokens per summarization call, for models whose window barely fits the summary
+_MIN_PIECE_TOKENS = 256
+
+
+@db_timed
+def fetch_tail(conversation_id: str, through_at: str | None, through_id: str | None) -> list[dict]:
+    """Messages after the summary high-water mark, oldest first."""
+    db = get_supabase()
+    cursor = encode_cursor({"created_at": through_at, "id": through_id}, "created_at") if through_at else None
+    query = db.table(MESSAGES).select("id, role, content, token_count, created_at").eq("conversation_id", conversation_id)
+    return apply_keyset(query, "created_at", cursor, desc=False).execute().data
+
+
+def _tail_tokens(messages: list[dict]) -> int:
+    return sum((m.get("token_count") or 0) + _MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _split_for_compaction(tail: list[dict], keep_tokens: int) -> tuple[list[dict], list[dict]]:
+    """Split the tail into (to_summarize, to_keep), keeping at least keep_tokens of recent history raw."""
+    kept = 0
+    split = len(tail)
+    while split > 0 and kept < keep_tokens:
+        split -= 1
+        kept += (tail[split].get("token_count") or 0) + _MESSAGE_OVERHEAD_TOKENS
+    return tail[:split], tail[split:]
+
+
+def _split_into_pieces(messages: list[dict], budget: int, model: str) -> list[list[dict]]:
+    """Consecutive runs of messages whose transcript fits `budget` tokens.
+
+    A message too large for a piece of its own is truncated to fit.
+    """
+    pieces: list[list[dict]] = []
+    piece: list[dict] = []
+    used = 0
+    for message in messages:
+        tokens = (message.get("token_count") or count_tokens(message["content"], model)) + _MESSAGE_OVERHEAD_TOKENS
+        if tokens > budget:
+            message = {**message, "content": truncate_tokens(message["content"], budget - _MESSAGE_OVERHEAD_TOKENS, model)}
+            tokens = budget
+        if piece and used + tokens > budget:
+            pieces.append(piece)
+            piece, used = [], 0
+        piece.append(message)
+        used += tokens
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def _piece_budget(summary: str | None, model: str) -> int:
+    """Transcript tokens per summarization call, leaving room for the prompt and the summary it carries."""
+    # Each piece's summary is a generation, so no larger than the output cap (or the summary it started from)
+    summary_tokens = max(count_tokens(summary or "", model), max_output_tokens(model) or DEFAULT_MAX_OUTPUT_TOKENS)
+    budget = context_budget(model) - count_tokens(SUMMARY_GENERATION_PROMPT, model) - summary_tokens - _PROMPT_OVERHEAD_TOKENS
+    return max(budget, _MIN_PIECE_TOKENS)
+
+
+class Compactor:
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_COMPACTIONS):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._running: dict[str, asyncio.Task] = {}
+        self.completed = 0
+        self.failed = 0
+
+    def maybe_schedule(self, conversation: dict, tail: list[dict]) -> bool:
+        """Start a background compaction if the tail is over the trigger; dedups per conversation."""
+        settings = get_settings()
+        conversation_id = conversation["id"]
+        if conversation_id in self._running or _tail_tokens(tail) < settings.COMPACTION_TRIGGER_TOKENS:
+            return False
+        task = asyncio.create_task(self._compact(conversation))
+        self._running[conversation_id] = task
+        task.add_done_callback(lambda _: self._running.pop(conversation_id, None))
+        return True
+
+    async def _compact(self, conversation: dict) -> None:
+        settings = get_settings()
+        conversation_id = conversation["id"]
+        set_scheduling_user(None)
+        try:
+            async with self._semaphore:
+                # Re-read the mark: another worker may have advanced it since the turn started
+                state = await asyncio.to_thread(_load_summary_state, conversation_id)
+                if state is None:
+                    return
+                tail = await asyncio.to_thread(fetch_tail, conversation_id, state["summary_through_at"], state["summary_through_id"])
+                older, _ = _split_for_compaction(tail, settings.COMPACTION_KEEP_TOKENS)
+                if not older:
+                    return
+
+                model = settings.COMPACTION_MODEL or settings.DEFAULT_MODEL
+                summary, through_id = state["summary"], state["summary_through_id"]
+                budget = await asyncio.to_thread(_piece_budget, summary, model)
+                pieces = await asyncio.to_thread(_split_into_pieces, older, budget, model)
+                client = get_llm_client("groq", cached=False)
+                # Fold oldest first and save after each piece, so a failure keeps the progress made
+                for piece in pieces:
+                    transcript = "\n\n".join(f"{m['role']}: {m['content']}" for m in piece)
+                    prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew transcript:\n{transcript}"
+                    result = await client.generate(
+                        [{"role": "system", "content": SUMMARY_GENERATION_PROMPT}, {"role": "user", "content": prompt}],
+                        model,
+                    )
+                    summary = result["content"].strip()
+                    if not summary:
+                        return
+                    if not await asyncio.to_thread(_save_summary, conversation_id, summary, piece[-1], through_id):
+                        # Another job moved the mark; it owns the summary from here
+                        return
+                    through_id = piece[-1]["id"]
+                self.completed += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to compact conversation %s", conversation_id)
+
+
+@db_timed
+def _load_summary_state(conversation_id: str) -> dict | None:
+    db = get_supabase()
+    result = (
+        db.table(CONVERSATIONS)
+        .select("summary, summary_through_id, summary_through_at")
+        .eq("id", conversation_id)
+        .execute()
+    )
+    return result.data[0] if result.data else None
+
+
+@db_timed
+def _save_summary(conversation_id: str, summary: str, last_message: dict, previous_through_id: str | None) -> bool:
+    """Advance the summary and its high-water mark, unless another job already moved the mark; returns whether it did."""
+    db = get_supabase()
+    query = db.table(CONVERSATIONS).update({
+        "summary": summary,
+        "summary_through_id": last_message["id"],
+        "summary_through_at": last_message["created_at"],
+    }).eq("id", conversation_id)
+    if previous_through_id is None:
+        query = query.is_("summary_through_id", "null")
+    else:
+        query = query.eq("summary_through_id", previous_through_id)
+    return bool(query.execute().data)
+
+
+_compactor: Compactor | None = None
+
+
+def get_compactor() -> Compactor:
+    global _compactor
+    if _compactor is None:
+        _compactor = Compactor()
+    return _compactor
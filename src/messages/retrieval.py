@@ -0,0 +1,270 @@
+"""Per-conversation vector index for relevance-based history retrieval.
+
+Each conversation's messages are embedded once, the first time a turn sees
+them, into an in-memory matrix (see src.llm.embeddings). A turn keeps the most recent
+RETRIEVAL_RECENT_TOKENS of history and fills the rest of the token budget with
+the top-k older messages most similar to the new user message. Only the
+selected messages' content is read back from the database.
+
+Indexes are byte-bounded with LRU eviction. When RETRIEVAL_INDEX_DIR is set,
+evicted and (at shutdown) dirty indexes are written there as float16 .npy
+matrices plus a small JSON sidecar, and reloaded on the next access.
+"""
+
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from src.config.settings import get_settings
+from src.db.client import get_supabase
+from src.db.models import MESSAGES
+from src.llm.embeddings import cosine_scores, embed_texts, idf_weights
+from src.llm.token_counter import count_tokens
+from src.messages.compaction import fetch_tail
+from src.utils.metrics import db_timed
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ConversationIndex:
+    def __init__(self, dim: int, capacity: int = 64):
+        self.dim = dim
+        self.ids: list[str] = []
+        self.roles: list[str] = []
+        self.token_counts = np.zeros(capacity, dtype=np.int32)
+        # Rows beyond len(ids) are spare capacity, so appends are amortized O(1)
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.document_frequency = np.zeros(dim, dtype=np.int32)
+        self.through_at: str | None = None
+        self.through_id: str | None = None
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._matrix[: len(self.ids)]
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + self.token_counts.nbytes + self.document_frequency.nbytes + 64 * len(self.ids)
+
+    def append(self, rows: list[dict], vectors: np.ndarray, token_counts: list[int]) -> None:
+        n, needed = len(self.ids), len(self.ids) + len(rows)
+        if needed > len(self._matrix):
+            capacity = max(needed, 2 * len(self._matrix))
+            self._matrix = np.resize(self._matrix, (capacity, self.dim))
+            self.token_counts = np.resize(self.token_counts, capacity)
+        self._matrix[n:needed] = vectors
+        self.token_counts[n:needed] = token_counts
+        self.document_frequency += (vectors > 0).sum(axis=0, dtype=np.int32)
+        self.ids.extend(r["id"] for r in rows)
+        self.roles.extend(r["role"] for r in rows)
+        self.through_at, self.through_id = rows[-1]["created_at"], rows[-1]["id"]
+        self.dirty = True
+
+    def save(self, directory: Path, conversation_id: str) -> None:
+        matrix_path, meta_path = _paths(directory, conversation_id)
+        meta = {
+            "dim": self.dim,
+            "ids": self.ids,
+            "roles": self.roles,
+            "token_counts": self.token_counts[: len(self.ids)].tolist(),
+            "through_at": self.through_at,
+            "through_id": self.through_id,
+        }
+        # Write both files under temporary names first so a crash never leaves a torn pair
+        np.save(f"{matrix_path}.tmp.npy", self.matrix.astype(np.float16))
+        with open(f"{meta_path}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(f"{matrix_path}.tmp.npy", matrix_path)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, directory: Path, conversation_id: str, dim: int) -> "ConversationIndex | None":
+        matrix_path, meta_path = _paths(directory, conversation_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            matrix = np.load(matrix_path).astype(np.float32)
+        except FileNotFoundError:
+            return None
+        if meta["dim"] != dim or len(matrix) != len(meta["ids"]):
+            return None
+        n = len(matrix)
+        index = cls(dim, capacity=max(n, 64))
+        index._matrix[:n] = matrix
+        index.token_counts[:n] = meta["token_counts"]
+        index.document_frequency = (matrix > 0).sum(axis=0, dtype=np.int32)
+        index.ids, index.roles = meta["ids"], meta["roles"]
+        index.through_at, index.through_id = meta["through_at"], meta["through_id"]
+        return index
+
+
+def _paths(directory: Path, conversation_id: str) -> tuple[Path, Path]:
+    # Normalizing through UUID also keeps arbitrary strings out of file paths
+    name = str(uuid.UUID(conversation_id))
+    return directory / f"{name}.npy", directory / f"{name}.json"
+
+
+class VectorIndex:
+    def __init__(self, dim: int, max_bytes: int, directory: str = ""):
+        self._dim = dim
+        self._max_bytes = max_bytes
+        self._directory = Path(directory) if directory else None
+        if self._directory:
+            self._directory.mkdir(parents=True, exist_ok=True)
+        self._indexes: OrderedDict[str, ConversationIndex] = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.embedded = 0
+
+    def _get(self, conversation_id: str) -> ConversationIndex:
+        index = self._indexes.get(conversation_id)
+        if index is not None:
+            self._indexes.move_to_end(conversation_id)
+            self._bytes -= index.nbytes
+            return index
+        if self._directory:
+            index = ConversationIndex.load(self._directory, conversation_id, self._dim)
+        return index or ConversationIndex(self._dim)
+
+    def _put(self, conversation_id: str, index: ConversationIndex) -> None:
+        self._indexes[conversation_id] = index
+        self._bytes += index.nbytes
+        while self._bytes > self._max_bytes and len(self._indexes) > 1:
+            evicted_id, evicted = self._indexes.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+            self._persist(evicted_id, evicted)
+
+    def _persist(self, conversation_id: str, index: ConversationIndex) -> None:
+        if self._directory and index.dirty:
+            try:
+                index.save(self._directory, conversation_id)
+            except OSError:
+                logger.exception("Failed to persist vector index for %s", conversation_id)
+
+    def sync(self, conversation_id: str) -> ConversationIndex:
+        """Embed any messages written since the index was last brought up to date."""
+        index = self._get(conversation_id)
+        try:
+            rows = fetch_tail(conversation_id, index.through_at, index.through_id)
+            if rows:
+                vectors = embed_texts([r["content"] for r in rows], self._dim)
+                counts = [r.get("token_count") or count_tokens(r["content"]) for r in rows]
+                index.append(rows, vectors, counts)
+                self.embedded += len(rows)
+        finally:
+            self._put(conversation_id, index)
+        return index
+
+    def drop(self, conversation_id: str) -> None:
+        index = self._indexes.pop(conversation_id, None)
+        if index is not None:
+            self._bytes -= index.nbytes
+        if self._directory:
+            for path in _paths(self._directory, conversation_id):
+                path.unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        for conversation_id, index in self._indexes.items():
+            self._persist(conversation_id, index)
+
+    def stats(self) -> dict:
+        return {
+            "conversations": len(self._indexes),
+            "bytes": self._bytes,
+            "max_bytes": self._max_bytes,
+            "embedded_messages": self.embedded,
+            "evictions": self.evictions,
+        }
+
+
+def select_messages(index: ConversationIndex, budget: int, recent_tokens: int, top_k: int, min_score: float) -> tuple[list[int], list[int]]:
+    """Pick (retrieved, recent) row positions that together fit the token budget.
+
+    The recent window is taken newest-first up to `recent_tokens`. The query is
+    the newest user message; older rows are ranked by cosine similarity and the
+    best `top_k` above `min_score` are added while they fit.
+    """
+    n = len(index)
+    costs = index.token_counts[:n].astype(np.int64) + _MESSAGE_OVERHEAD_TOKENS
+
+    recent_budget = min(recent_tokens, budget)
+    start, used = n, 0
+    while start > 0 and used + costs[start - 1] <= recent_budget:
+        start -= 1
+        used += costs[start]
+    # Always keep the newest message, even when it alone exceeds the recent window
+    if start == n and n:
+        start, used = n - 1, int(costs[n - 1])
+
+    query_row = next((i for i in range(n - 1, -1, -1) if index.roles[i] == "user"), None)
+    if start == 0 or query_row is None:
+        return [], list(range(start, n))
+
+    matrix = index.matrix
+    idf = idf_weights(index.document_frequency, n)
+    scores = cosine_scores(matrix[:start], matrix[query_row], idf)
+    k = min(top_k, start)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates])]
+
+    retrieved = []
+    remaining = budget - used
+    for i in candidates.tolist():
+        if scores[i] < min_score:
+            break
+        if costs[i] <= remaining:
+            retrieved.append(i)
+            remaining -= int(costs[i])
+    return sorted(retrieved), list(range(start, n))
+
+
+@db_timed
+def fetch_contents(ids: list[str]) -> dict[str, str]:
+    if not ids:
+        return {}
+    db = get_supabase()
+    result = db.table(MESSAGES).select("id, content").in_("id", ids).execute()
+    return {row["id"]: row["content"] for row in result.data}
+
+
+def retrieve_history(conversation_id: str, budget: int) -> tuple[list[dict], list[dict]]:
+    """Return (retrieved, recent) messages for the next turn, each in chronological order."""
+    settings = get_settings()
+    index = get_vector_index().sync(conversation_id)
+    retrieved, recent = select_messages(
+        index, budget, settings.RETRIEVAL_RECENT_TOKENS, settings.RETRIEVAL_TOP_K, settings.RETRIEVAL_MIN_SCORE,
+    )
+    contents = fetch_contents([index.ids[i] for i in retrieved + recent])
+
+    def materialize(positions: list[int]) -> list[dict]:
+        return [
+            {"role": index.roles[i], "content": contents[index.ids[i]]}
+            for i in positions
+            if index.ids[i] in contents
+        ]
+
+    return materialize(retrieved), materialize(recent)
+
+
+_vector_index: VectorIndex | None = None
+
+
+def get_vector_index() -> VectorIndex:
+    global _vector_index
+    if _vector_index is None:
+        settings = get_settings()
+        _vector_index = VectorIndex(settings.RETRIEVAL_DIM, settings.RETRIEVAL_MAX_BYTES, settings.RETRIEVAL_INDEX_DIR)
+    return _vector_index
@@ -5,8 +5,10 @@ import json
 import logging
 import time
 import uuid
+from collections.abc import AsyncGenerator
 
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Depends, Query, Request, Response
+from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
 
 from src.auth.dependencies import CurrentUser, get_current_user
@@ -14,12 +16,14 @@ from src.config.settings import get_settings
 from src.conversations.service import get_conversation
 from src.db.client import get_supabase
 from src.db.models import MESSAGES
+from src.db.pagination import CountMode
+from src.llm.admission import Ticket, get_admission_controller
 from src.llm.client import get_llm_client
-from src.llm.context import build_context
 from src.llm.prompts import build_system_prompt
+from src.llm.scheduler import set_scheduling_user
 from src.llm.token_counter import count_tokens
 from src.messages.schemas import MessageListResponse, SendMessageRequest
-from src.messages.service import _get_conversation_messages, _get_message_count, _generate_title, _save_message, send_message
+from src.messages.service import _get_message_count, _save_message, _trace_message_shape, build_turn_context, list_messages_page, send_message
 from src.messages.streaming import (
     format_content_block_delta,
     format_content_block_start,
@@ -28,119 +32,184 @@ from src.messages.streaming import (
     format_message_delta,
     format_message_start,
     format_message_stop,
+    format_timing,
 )
+from src.messages.titles import get_title_runner
+from src.utils.cost_tracker import log_cost
+from src.utils.fastjson import FastJSONResponse, json_body, json_body_openapi
+from src.utils.metrics import SSE_CONNECTIONS
+from src.utils.tracing import current_trace, record_span, span
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1/conversations/{conversation_id}", tags=["Messages"])
 
+_open_streams = SSE_CONNECTIONS.labels("stream")
+_open_event_streams = SSE_CONNECTIONS.labels("events")
+_send_body = json_body(SendMessageRequest)
 
-@router.get("/messages", summary="List messages", description="List messages in a conversation, paginated, ordered by creation time.")
+
+@router.get("/messages", response_model=MessageListResponse, summary="List messages", description="List messages in a conversation, ordered by creation time. Pass `cursor` (from `next_cursor`) for keyset pagination; `count` controls whether a total is computed.")
 async def list_messages(
     conversation_id: str,
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    count: CountMode | None = Query(None, description="Total count: exact, estimated or none (default: exact for page mode, none for cursor mode)"),
     user: CurrentUser = Depends(get_current_user),
 ):
-    get_conversation(conversation_id, user.id)
-
-    db = get_supabase()
-    offset = (page - 1) * per_page
-
-    count_result = db.table(MESSAGES).select("id", count="exact").eq("conversation_id", conversation_id).execute()
-    total = count_result.count or 0
+    conv, _ = await get_conversation(conversation_id, user.id)
 
-    result = (
-        db.table(MESSAGES)
-        .select("*")
-        .eq("conversation_id", conversation_id)
-        .order("created_at")
-        .range(offset, offset + per_page - 1)
-        .execute()
-    )
-
-    return MessageListResponse(data=result.data, page=page, per_page=per_page, total=total)
+    count = count or ("none" if cursor else "exact")
+    # The exact total is the denormalized counter; no need to count rows again
+    query_count = "none" if count == "exact" else count
+    rows, total, next_cursor = list_messages_page(conversation_id, page, per_page, cursor, query_count)
+    if count == "exact":
+        total = conv.get("message_count", 0)
+    # Rows are selected with exactly the MessageResponse columns, so they go out unvalidated
+    return FastJSONResponse({"status": "success", "data": rows, "page": page, "per_page": per_page, "total": total, "next_cursor": next_cursor})
 
 
-@router.post("/messages", summary="Send a message", description="Send a message and get the LLM response. Supports optional model override and thinking mode.", tags=["Messages"])
+@router.post("/messages", summary="Send a message", description="Send a message and get the LLM response. Supports optional model override and thinking mode.", tags=["Messages"], openapi_extra=json_body_openapi(SendMessageRequest))
 async def send(
     conversation_id: str,
-    body: SendMessageRequest,
+    response: Response,
     user: CurrentUser = Depends(get_current_user),
+    body: SendMessageRequest = Depends(_send_body),
 ):
-    conv, _ = get_conversation(conversation_id, user.id)
-    assistant_msg = await send_message(
-        conversation_id, body.content, conv,
-        model=body.model, thinking=body.thinking,
-    )
+    conv, _ = await get_conversation(conversation_id, user.id)
+    admission = get_admission_controller()
+    with span("admission"):
+        ticket = await admission.acquire(user.id)
+    response.headers["X-Queue-Wait-Ms"] = str(ticket.wait_ms)
+    set_scheduling_user(user.id)
+    try:
+        assistant_msg = await send_message(
+            conversation_id, body.content, conv,
+            model=body.model, thinking=body.thinking,
+            use_cache=body.cache,
+        )
+    finally:
+        admission.release(ticket)
     return {"status": "success", "data": assistant_msg}
 
 
-@router.post("/messages/stream", summary="Stream a message response", description="Send a message and receive the LLM response as Server-Sent Events (SSE) with token-by-token delivery.", tags=["Streaming"])
+async def _prepend(first: dict | None, stream: AsyncGenerator[dict, None]) -> AsyncGenerator[dict, None]:
+    if first is None:
+        return
+    yield first
+    async for chunk in stream:
+        yield chunk
+
+
+async def _open_stream(context: list[dict], model: str, cache: bool) -> tuple[AsyncGenerator[dict, None], str]:
+    """Start the Groq stream, or the fallback if Groq fails before its first chunk.
+
+    Creating a stream runs nothing, so the first chunk is pulled here: that is where
+    scheduler timeouts, rate limits and connection errors surface.
+    """
+    try:
+        stream = get_llm_client("groq", cached=cache).generate_stream(context, model)
+        return _prepend(await anext(stream, None), stream), model
+    except Exception:
+        logger.warning("Primary LLM failed, falling back", exc_info=True)
+    fallback_model = get_settings().FALLBACK_MODEL
+    stream = get_llm_client("google", cached=cache).generate_stream(context, fallback_model)
+    return _prepend(await anext(stream, None), stream), fallback_model
+
+
+async def _release_when_done(events: AsyncGenerator[str, None], ticket: Ticket) -> AsyncGenerator[str, None]:
+    """Hold the generation slot for the life of the stream."""
+    _open_streams.inc()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        _open_streams.dec()
+        get_admission_controller().release(ticket)
+
+
+@router.post("/messages/stream", summary="Stream a message response", description="Send a message and receive the LLM response as Server-Sent Events (SSE) with token-by-token delivery.", tags=["Streaming"], openapi_extra=json_body_openapi(SendMessageRequest))
 async def stream(
     conversation_id: str,
-    body: SendMessageRequest,
     request: Request,
     user: CurrentUser = Depends(get_current_user),
+    body: SendMessageRequest = Depends(_send_body),
 ):
-    conv, _ = get_conversation(conversation_id, user.id)
+    conv, _ = await get_conversation(conversation_id, user.id)
     settings = get_settings()
     model = body.model or conv.get("model") or settings.DEFAULT_MODEL
 
-    # Save user message
-    _save_message(
-        conversation_id, "user", body.content,
-        token_count=count_tokens(body.content),
-    )
-
-    # Auto-title on first message
-    if _get_message_count(conversation_id) == 1:
-        asyncio.create_task(_generate_title(conversation_id, body.content))
-
-    # Build context
-    system_prompt = build_system_prompt(conv.get("system_prompt"), thinking=body.thinking)
-    history = _get_conversation_messages(conversation_id)
-    context = build_context(history, system_prompt)
+    admission = get_admission_controller()
+    with span("admission"):
+        ticket = await admission.acquire(user.id)
+    try:
+        # Save user message
+        with span("save_user_message"):
+            content_tokens = count_tokens(body.content, model)
+            _trace_message_shape(content_tokens, body.model, body.thinking)
+            _save_message(conversation_id, "user", body.content, token_count=content_tokens)
+
+        # Auto-title on first message of an untitled conversation
+        if not conv.get("title") and _get_message_count(conversation_id) == 1:
+            get_title_runner().submit(conversation_id, body.content)
+
+        # Build context
+        system_prompt = build_system_prompt(conv.get("system_prompt"), thinking=body.thinking)
+        context = build_turn_context(conversation_id, conv, system_prompt, model)
+    except BaseException:
+        admission.release(ticket)
+        raise
 
     message_id = str(uuid.uuid4())
+    trace = current_trace()
 
     async def event_generator():
+        set_scheduling_user(user.id)
         full_content = ""
+        input_tokens = 0
+        cached_input_tokens = 0
         output_tokens = 0
+        cached = False
         finish_reason = "stop"
         start = time.time()
 
         yield format_message_start(message_id, model)
         yield format_content_block_start()
 
-        active_model = model
+        llm_start = time.perf_counter()
+        first_token_at = None
         try:
-            try:
-                client = get_llm_client("groq")
-                stream = client.generate_stream(context, model)
-            except Exception:
-                logger.warning("Primary LLM failed, falling back")
-                client = get_llm_client("google")
-                active_model = settings.FALLBACK_MODEL
-                stream = client.generate_stream(context, active_model)
-
-            async for chunk in stream:
-                if await request.is_disconnected():
-                    logger.info("Client disconnected during stream")
-                    break
-
-                if chunk["type"] == "delta":
-                    full_content += chunk["content"]
-                    yield format_content_block_delta(chunk["content"])
-                elif chunk["type"] == "finish":
-                    finish_reason = chunk.get("finish_reason", "stop")
-                    usage = chunk.get("usage", {})
-                    output_tokens = usage.get("output_tokens", 0)
+            with get_title_runner().interactive():
+                stream, active_model = await _open_stream(context, model, body.cache)
+
+                async for chunk in stream:
+                    if await request.is_disconnected():
+                        logger.info("Client disconnected during stream")
+                        break
+
+                    if chunk["type"] == "delta":
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            record_span("llm_ttft", llm_start, first_token_at)
+                        full_content += chunk["content"]
+                        yield format_content_block_delta(chunk["content"])
+                    elif chunk["type"] == "finish":
+                        finish_reason = chunk.get("finish_reason", "stop")
+                        usage = chunk.get("usage", {})
+                        input_tokens = usage.get("input_tokens", 0)
+                        cached_input_tokens = usage.get("cached_input_tokens", 0)
+                        output_tokens = usage.get("output_tokens", 0)
+                        cached = usage.get("cached", False)
 
         except Exception as e:
             logger.exception("Error during streaming")
             yield format_error("stream_error", str(e))
+            if trace:
+                yield format_timing(trace.request_id, trace.timings())
             return
+        if first_token_at is not None:
+            record_span("llm_generation", first_token_at, time.perf_counter())
 
         yield format_content_block_stop()
         yield format_message_delta(finish_reason, output_tokens)
@@ -149,18 +218,36 @@ async def stream(
         # Save assistant message after stream completes
         latency_ms = int((time.time() - start) * 1000)
         if full_content:
-            _save_message(
-                conversation_id, "assistant", full_content,
-                token_count=output_tokens or count_tokens(full_content),
-                model=active_model,
-                finish_reason=finish_reason,
-                latency_ms=latency_ms,
-            )
+            output_tokens = output_tokens or count_tokens(full_content, active_model)
+            with span("save_assistant_message"):
+                _save_message(
+                    conversation_id, "assistant", full_content,
+                    token_count=output_tokens,
+                    model=active_model,
+                    finish_reason=finish_reason,
+                    latency_ms=latency_ms,
+                    metadata={
+                        "input_tokens": input_tokens,
+                        "cached_input_tokens": cached_input_tokens,
+                        "cost_usd": 0.0 if cached else log_cost(input_tokens, output_tokens, active_model, cached_input_tokens),
+                        "cached": cached,
+                    },
+                )
+        # Stage timings, now complete; the Server-Timing header only covered setup
+        if trace:
+            yield format_timing(trace.request_id, trace.timings())
 
     return StreamingResponse(
-        event_generator(),
+        _release_when_done(event_generator(), ticket),
         media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Queue-Wait-Ms": str(ticket.wait_ms),
+        },
+        # Release is idempotent; this covers a client that disconnects before the stream starts
+        background=BackgroundTask(admission.release, ticket),
     )
 
 
@@ -171,28 +258,32 @@ async def events(
     user: CurrentUser = Depends(get_current_user),
 ):
     """SSE stream for real-time conversation events (new messages)."""
-    get_conversation(conversation_id, user.id)
+    await get_conversation(conversation_id, user.id)
 
     async def event_stream():
-        last_count = _get_message_count(conversation_id)
-        while True:
-            if await request.is_disconnected():
-                break
-            current_count = _get_message_count(conversation_id)
-            if current_count > last_count:
-                db = get_supabase()
-                new_msgs = (
-                    db.table(MESSAGES)
-                    .select("*")
-                    .eq("conversation_id", conversation_id)
-                    .order("created_at", desc=True)
-                    .limit(current_count - last_count)
-                    .execute()
-                )
-                for msg in reversed(new_msgs.data):
-                    yield f"event: new_message\ndata: {json.dumps(msg, default=str)}\n\n"
-                last_count = current_count
-            await asyncio.sleep(1)
+        _open_event_streams.inc()
+        try:
+            last_count = _get_message_count(conversation_id)
+            while True:
+                if await request.is_disconnected():
+                    break
+                current_count = _get_message_count(conversation_id)
+                if current_count > last_count:
+                    db = get_supabase()
+                    new_msgs = (
+                        db.table(MESSAGES)
+                        .select("*")
+                        .eq("conversation_id", conversation_id)
+                        .order("created_at", desc=True)
+                        .limit(current_count - last_count)
+                        .execute()
+                    )
+                    for msg in reversed(new_msgs.data):
+                        yield f"event: new_message\ndata: {json.dumps(msg, default=str)}\n\n"
+                    last_count = current_count
+                await asyncio.sleep(1)
+        finally:
+            _open_event_streams.dec()
 
     return StreamingResponse(
         event_stream(),
@@ -9,6 +9,7 @@ class SendMessageRequest(BaseModel):
     content: str
     model: str | None = None
     thinking: bool = False
+    cache: bool = True
 
 
 class MessageResponse(BaseModel):
@@ -31,4 +32,5 @@ class MessageListResponse(BaseModel):
     data: list[MessageResponse]
     page: int
     per_page: int
-    total: int
+    total: int | None = None
+    next_cursor: str | None = None
@@ -1,21 +1,46 @@
-"""Message business logic: send messages, auto-title, fallback."""
+"""Message business logic: send messages, context building, auto-title, fallback."""
 
-import asyncio
 import logging
 import time
 
 from src.config.settings import get_settings
 from src.db.client import get_supabase
 from src.db.models import CONVERSATIONS, MESSAGES
+from src.db.pagination import CountMode, apply_keyset, page_result, select_with_count
 from src.llm.client import get_llm_client
-from src.llm.context import build_context
-from src.llm.prompts import TITLE_GENERATION_PROMPT, build_system_prompt
+from src.llm.context import (
+    build_chunked_context,
+    build_context,
+    build_retrieval_context,
+    build_summary_context,
+    retrieval_budget,
+)
+from src.llm.prompts import build_system_prompt
+from src.llm.models import context_budget
 from src.llm.token_counter import count_tokens
+from src.messages.compaction import fetch_tail, get_compactor
+from src.messages.retrieval import retrieve_history
+from src.messages.schemas import MessageResponse
+from src.messages.titles import get_title_runner
 from src.utils.cost_tracker import log_cost
+from src.utils.metrics import db_timed
+from src.utils.tracing import set_attribute, span, traced
 
 logger = logging.getLogger(__name__)
 
+# Exactly the MessageResponse fields, so listed rows can be returned without re-validation
+LIST_COLUMNS = ",".join(MessageResponse.model_fields)
 
+
+def _trace_message_shape(content_tokens: int, requested_model: str | None, thinking: bool) -> None:
+    """Record the sent message's shape on the trace, for traffic capture (which never parses bodies)."""
+    set_attribute("message.content_tokens", content_tokens)
+    set_attribute("message.thinking", int(thinking))
+    if requested_model:
+        set_attribute("message.model", requested_model)
+
+
+@db_timed
 def _save_message(conversation_id: str, role: str, content: str, **extra) -> dict:
     db = get_supabase()
     row = {
@@ -28,11 +53,12 @@ def _save_message(conversation_id: str, role: str, content: str, **extra) -> dic
     return result.data[0]
 
 
+@db_timed
 def _get_conversation_messages(conversation_id: str) -> list[dict]:
     db = get_supabase()
     result = (
         db.table(MESSAGES)
-        .select("role, content")
+        .select("role, content, token_count")
         .eq("conversation_id", conversation_id)
         .order("created_at")
         .execute()
@@ -40,28 +66,70 @@ def _get_conversation_messages(conversation_id: str) -> list[dict]:
     return result.data
 
 
+@traced("build_context")
+def build_turn_context(conversation_id: str, conversation: dict, system_prompt: str, model: str) -> list[dict]:
+    """Build the LLM context for the next turn using the configured CONTEXT_STRATEGY.
+
+    The token budget is the model's context window minus its output cap,
+    optionally capped by CONTEXT_MAX_TOKENS.
+    """
+    settings = get_settings()
+    strategy = settings.CONTEXT_STRATEGY
+    budget = context_budget(model)
+    if settings.CONTEXT_MAX_TOKENS:
+        budget = min(budget, settings.CONTEXT_MAX_TOKENS)
+    if strategy == "chunked":
+        with span("history"):
+            history = _get_conversation_messages(conversation_id)
+        return build_chunked_context(history, system_prompt, budget, settings.CONTEXT_CHUNK_TOKENS, model)
+    if strategy == "retrieval":
+        with span("history"):
+            retrieved, recent = retrieve_history(conversation_id, retrieval_budget(system_prompt, budget, model))
+        return build_retrieval_context(retrieved, recent, system_prompt)
+    if strategy != "summary":
+        with span("history"):
+            history = _get_conversation_messages(conversation_id)
+        return build_context(history, system_prompt, budget, model)
+
+    # Only the messages after the summary's high-water mark are read
+    with span("history"):
+        tail = fetch_tail(conversation_id, conversation.get("summary_through_at"), conversation.get("summary_through_id"))
+    get_compactor().maybe_schedule(conversation, tail)
+    return build_summary_context(tail, system_prompt, conversation.get("summary"), budget, model)
+
+
+@db_timed
+def list_messages_page(
+    conversation_id: str,
+    page: int,
+    per_page: int,
+    cursor: str | None = None,
+    count: CountMode = "exact",
+) -> tuple[list[dict], int | None, str | None]:
+    """Return (rows, total, next_cursor) in creation order. With a cursor, keyset paging is used."""
+    db = get_supabase()
+    query = select_with_count(db.table(MESSAGES), count, LIST_COLUMNS).eq("conversation_id", conversation_id)
+    query = apply_keyset(query, "created_at", cursor, desc=False)
+
+    # Fetch one extra row to know whether another page exists
+    if cursor:
+        query = query.limit(per_page + 1)
+    else:
+        offset = (page - 1) * per_page
+        query = query.range(offset, offset + per_page)
+    result = query.execute()
+
+    rows, next_cursor = page_result(result.data, per_page, "created_at")
+    total = result.count if count != "none" else None
+    return rows, total, next_cursor
+
+
+@db_timed
 def _get_message_count(conversation_id: str) -> int:
+    """Read the trigger-maintained counter instead of counting message rows."""
     db = get_supabase()
-    result = db.table(MESSAGES).select("id", count="exact").eq("conversation_id", conversation_id).execute()
-    return result.count or 0
-
-
-async def _generate_title(conversation_id: str, user_message: str) -> None:
-    """Generate a conversation title from the first user message (fire-and-forget)."""
-    try:
-        settings = get_settings()
-        client = get_llm_client("groq")
-        messages = [
-            {"role": "system", "content": TITLE_GENERATION_PROMPT},
-            {"role": "user", "content": user_message[:500]},
-        ]
-        result = await client.generate(messages, settings.DEFAULT_MODEL)
-        title = result["content"].strip().strip('"')[:500]
-        if title:
-            db = get_supabase()
-            db.table(CONVERSATIONS).update({"title": title}).eq("id", conversation_id).execute()
-    except Exception:
-        logger.exception("Failed to generate title for conversation %s", conversation_id)
+    result = db.table(CONVERSATIONS).select("message_count").eq("id", conversation_id).execute()
+    return result.data[0]["message_count"] if result.data else 0
 
 
 async def send_message(
@@ -70,53 +138,62 @@ async def send_message(
     conversation: dict,
     model: str | None = None,
     thinking: bool = False,
+    use_cache: bool = True,
 ) -> dict:
     """Save user message, call LLM, save assistant response, return assistant message."""
     settings = get_settings()
+    requested_model = model
     model = model or conversation.get("model") or settings.DEFAULT_MODEL
 
     # Save user message
-    _save_message(
-        conversation_id, "user", content,
-        token_count=count_tokens(content),
-    )
+    with span("save_user_message"):
+        content_tokens = count_tokens(content, model)
+        _trace_message_shape(content_tokens, requested_model, thinking)
+        _save_message(conversation_id, "user", content, token_count=content_tokens)
 
-    # Auto-title on first message
-    msg_count = _get_message_count(conversation_id)
-    if msg_count == 1:
-        asyncio.create_task(_generate_title(conversation_id, content))
+    # Auto-title on first message of an untitled conversation
+    if not conversation.get("title") and _get_message_count(conversation_id) == 1:
+        get_title_runner().submit(conversation_id, content)
 
     # Build context
     system_prompt = build_system_prompt(conversation.get("system_prompt"), thinking=thinking)
-    history = _get_conversation_messages(conversation_id)
-    context = build_context(history, system_prompt)
+    context = build_turn_context(conversation_id, conversation, system_prompt, model)
 
     # Call LLM with fallback
     start = time.time()
-    try:
-        client = get_llm_client("groq")
-        result = await client.generate(context, model)
-    except Exception:
-        logger.warning("Primary LLM failed, falling back to Google AI")
-        client = get_llm_client("google")
-        model = settings.FALLBACK_MODEL
-        result = await client.generate(context, model)
+    with get_title_runner().interactive(), span("llm"):
+        try:
+            client = get_llm_client("groq", cached=use_cache)
+            result = await client.generate(context, model)
+        except Exception:
+            logger.warning("Primary LLM failed, falling back to Google AI")
+            client = get_llm_client("google", cached=use_cache)
+            model = settings.FALLBACK_MODEL
+            result = await client.generate(context, model)
 
     latency_ms = int((time.time() - start) * 1000)
 
     # Log cost
     input_tokens = result.get("input_tokens", 0)
     output_tokens = result.get("output_tokens", 0)
-    cost = log_cost(input_tokens, output_tokens, model)
+    cached_input_tokens = result.get("cached_input_tokens", 0)
+    cached = result.get("cached", False)
+    cost = 0.0 if cached else log_cost(input_tokens, output_tokens, model, cached_input_tokens)
 
     # Save assistant message
-    assistant_msg = _save_message(
-        conversation_id, "assistant", result["content"],
-        token_count=output_tokens,
-        model=model,
-        finish_reason=result.get("finish_reason", "stop"),
-        latency_ms=latency_ms,
-        metadata={"input_tokens": input_tokens, "cost_usd": cost},
-    )
+    with span("save_assistant_message"):
+        assistant_msg = _save_message(
+            conversation_id, "assistant", result["content"],
+            token_count=output_tokens,
+            model=model,
+            finish_reason=result.get("finish_reason", "stop"),
+            latency_ms=latency_ms,
+            metadata={
+                "input_tokens": input_tokens,
+                "cached_input_tokens": cached_input_tokens,
+                "cost_usd": cost,
+                "cached": cached,
+            },
+        )
 
     return assistant_msg
@@ -31,5 +31,10 @@ def format_message_stop() -> str:
     return _sse("message_stop", {"type": "message_stop"})
 
 
+def format_timing(request_id: str, timings: list[tuple[str, float]]) -> str:
+    """Trailing per-stage timing, the streaming counterpart of the Server-Timing header."""
+    return _sse("timing", {"type": "timing", "request_id": request_id, "stages": [{"name": n, "duration_ms": round(ms, 1)} for n, ms in timings]})
+
+
 def format_error(error_type: str, message: str) -> str:
     return _sse("error", {"type": "error", "error": {"type": error_type, "message": message}})
@@ -0,0 +1,245 @@
+"""Bounded background runner for auto-title generation.
+
+Titles are low-priority work: a fixed pool of workers drains a deduplicated
+queue, defers to in-flight interactive generations, batches several
+conversations into one LLM call, and falls back to a local heuristic title
+when the queue is saturated or the worker is shutting down.
+"""
+
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+from src.config.settings import get_settings
+from src.db.client import get_supabase
+from src.db.models import CONVERSATIONS
+from src.llm.client import get_llm_client
+from src.llm.prompts import TITLE_BATCH_PROMPT, TITLE_GENERATION_PROMPT
+from src.utils.metrics import db_timed
+
+logger = logging.getLogger(__name__)
+
+_MAX_TITLE_CHARS = 500
+_HEURISTIC_WORDS = 8
+_NUMBERED_LINE = re.compile(r"^\s*(\d+)[.):]\s*(.+)$")
+
+
+def heuristic_title(message: str) -> str:
+    """Cheap local title: the first few words of the opening message."""
+    words = message.split()[:_HEURISTIC_WORDS]
+    title = " ".join(words).strip(" .,;:!?\"'")
+    if not title:
+        return "New conversation"
+    if len(message.split()) > _HEURISTIC_WORDS:
+        title += "…"
+    return title[0].upper() + title[1:]
+
+
+def _clean_title(raw: str) -> str:
+    return raw.strip().strip('"')[:_MAX_TITLE_CHARS]
+
+
+@db_timed
+def _save_title(conversation_id: str, title: str) -> None:
+    """Set the title only while it is unset, so a late or repeated job never overwrites a real one."""
+    db = get_supabase()
+    db.table(CONVERSATIONS).update({"title": title}).eq("id", conversation_id).is_("title", "null").execute()
+
+
+class TitleJobRunner:
+    def __init__(self, workers: int, max_queue: int, batch_size: int, max_defer_seconds: float):
+        self._worker_count = workers
+        self._max_queue = max_queue
+        self._batch_size = batch_size
+        self._max_defer = max_defer_seconds
+        # conversation_id -> (first user message, enqueued_at); dict order is FIFO
+        self._pending: dict[str, tuple[str, float]] = {}
+        self._in_flight: dict[str, tuple[str, float]] = {}
+        self._workers: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+        self._interactive = 0
+        self._closing = False
+        # Metrics
+        self.completed = 0
+        self.failed = 0
+        self.heuristic = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self._latency_total = 0.0
+        self._latency_count = 0
+        self._latency_max = 0.0
+
+    def submit(self, conversation_id: str, user_message: str) -> None:
+        """Queue a title job; never blocks the caller."""
+        if conversation_id in self._pending or conversation_id in self._in_flight:
+            self.deduplicated += 1
+            return
+        if self._closing or len(self._pending) >= self._max_queue:
+            self._apply_heuristic(conversation_id, user_message)
+            return
+        self._pending[conversation_id] = (user_message, time.monotonic())
+        self._ensure_workers()
+        self._wakeup.set()
+
+    @contextmanager
+    def interactive(self):
+        """Mark an interactive generation in flight; title workers wait for it."""
+        self._interactive += 1
+        self._interactive_idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0:
+                self._interactive_idle.set()
+
+    def _ensure_workers(self) -> None:
+        self._workers = [t for t in self._workers if not t.done()]
+        while len(self._workers) < self._worker_count:
+            # A fresh context, so workers don't carry the submitting request's trace or scheduling user
+            self._workers.append(asyncio.create_task(self._worker(), context=contextvars.Context()))
+
+    async def _worker(self) -> None:
+        while not self._closing:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Yield to user-facing generations, but never starve titles forever
+            try:
+                await asyncio.wait_for(self._interactive_idle.wait(), timeout=self._max_defer)
+            except asyncio.TimeoutError:
+                pass
+
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                await self._run_batch(batch)
+            except Exception:
+                # The LLM call failed, so nothing in the batch has been titled yet
+                logger.exception("Title batch failed for %d conversation(s)", len(batch))
+                self.failed += len(batch)
+                for conversation_id, (message, _) in batch.items():
+                    self._apply_heuristic(conversation_id, message)
+            finally:
+                self._record_latency(batch)
+                for conversation_id in batch:
+                    self._in_flight.pop(conversation_id, None)
+
+    def _take_batch(self) -> dict[str, tuple[str, float]]:
+        batch: dict[str, tuple[str, float]] = {}
+        for conversation_id in list(self._pending)[: self._batch_size]:
+            batch[conversation_id] = self._pending.pop(conversation_id)
+        self._in_flight.update(batch)
+        return batch
+
+    async def _run_batch(self, batch: dict[str, tuple[str, float]]) -> None:
+        settings = get_settings()
+        client = get_llm_client("groq")
+        items = list(batch.items())
+
+        if len(items) == 1:
+            conversation_id, (message, _) = items[0]
+            messages = [
+                {"role": "system", "content": TITLE_GENERATION_PROMPT},
+                {"role": "user", "content": message[:500]},
+            ]
+            result = await client.generate(messages, settings.DEFAULT_MODEL)
+            titles = {0: _clean_title(result["content"])}
+        else:
+            numbered = "\n\n".join(f"{i + 1}. {message[:500]}" for i, (_, (message, _)) in enumerate(items))
+            messages = [
+                {"role": "system", "content": TITLE_BATCH_PROMPT},
+                {"role": "user", "content": numbered},
+            ]
+            result = await client.generate(messages, settings.DEFAULT_MODEL)
+            titles = {}
+            for line in result["content"].splitlines():
+                match = _NUMBERED_LINE.match(line)
+                if match:
+                    titles[int(match.group(1)) - 1] = _clean_title(match.group(2))
+            self.batches += 1
+
+        for i, (conversation_id, (message, _)) in enumerate(items):
+            title = titles.get(i)
+            if not title:
+                self._apply_heuristic(conversation_id, message)
+                continue
+            try:
+                _save_title(conversation_id, title)
+            except Exception:
+                # One failed save must not send already-titled items back through the heuristic
+                logger.exception("Failed to save title for conversation %s", conversation_id)
+                self.failed += 1
+                self._apply_heuristic(conversation_id, message)
+                continue
+            self.completed += 1
+
+    def _apply_heuristic(self, conversation_id: str, user_message: str) -> None:
+        try:
+            _save_title(conversation_id, heuristic_title(user_message))
+            self.heuristic += 1
+        except Exception:
+            logger.exception("Failed to save heuristic title for conversation %s", conversation_id)
+
+    def _record_latency(self, batch: dict[str, tuple[str, float]]) -> None:
+        now = time.monotonic()
+        for _, enqueued_at in batch.values():
+            latency = now - enqueued_at
+            self._latency_total += latency
+            self._latency_count += 1
+            self._latency_max = max(self._latency_max, latency)
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop accepting jobs, give in-flight batches time to finish, title the rest locally."""
+        self._closing = True
+        self._wakeup.set()
+        if self._workers:
+            await asyncio.wait(self._workers, timeout=timeout)
+        # Cancelled workers drop their batches from _in_flight, so capture them first
+        unfinished = {**self._pending, **self._in_flight}
+        still_running = [t for t in self._workers if not t.done()]
+        for task in still_running:
+            task.cancel()
+        await asyncio.gather(*still_running, return_exceptions=True)
+        # Items titled before the cancel keep their title: _save_title only fills a null one
+        for conversation_id, (message, _) in unfinished.items():
+            self._apply_heuristic(conversation_id, message)
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "workers": self._worker_count,
+            "completed": self.completed,
+            "heuristic": self.heuristic,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+            "avg_latency_ms": round(self._latency_total / self._latency_count * 1000, 1) if self._latency_count else 0.0,
+            "max_latency_ms": round(self._latency_max * 1000, 1),
+        }
+
+
+_runner: TitleJobRunner | None = None
+
+
+def get_title_runner() -> TitleJobRunner:
+    global _runner
+    if _runner is None:
+        settings = get_settings()
+        _runner = TitleJobRunner(
+            workers=settings.TITLE_WORKERS,
+            max_queue=settings.TITLE_QUEUE_MAX,
+            batch_size=settings.TITLE_BATCH_SIZE,
+            max_defer_seconds=settings.TITLE_MAX_DEFER_SECONDS,
+        )
+    return _runner
@@ -0,0 +1,171 @@
+"""Record anonymized request shapes for load replay (benchmarks/replay.py).
+
+When TRAFFIC_CAPTURE_PATH is set, every API request is appended to that file
+as one JSON line: route template, status, body sizes, the token count of a
+message's content, the conversation's length, whether the response streamed,
+time to first byte and total duration, and the offset since capture start
+(for inter-arrival times). No content, credentials, emails or raw IDs are
+written: users and conversations become keyed hashes, stable within one
+process's capture only.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import threading
+import time
+
+from src.config.settings import get_settings
+from src.utils.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+# Records held while the file is unwritable before new ones are dropped
+_MAX_PENDING = 100_000
+# Query parameters that shape a response (page size, count mode); others are dropped
+_SHAPE_PARAMS = ("page", "per_page", "count", "bucket")
+_STREAM_DELTA = b"event: content_block_delta"
+
+
+class TrafficRecorder:
+    def __init__(self, path: str, sample_rate: float = 1.0):
+        self._path = path
+        self._sample_rate = sample_rate
+        self._key = secrets.token_bytes(16)
+        self._started = time.monotonic()
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def anonymize(self, value: str) -> str:
+        return hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def sampled(self, user: str | None) -> bool:
+        if self._sample_rate >= 1:
+            return True
+        # Per user rather than per request, so sampled sessions stay complete
+        key = user or secrets.token_hex(8)
+        return int(key[:8], 16) / 0xFFFFFFFF < self._sample_rate
+
+    def offset(self) -> float:
+        return time.monotonic() - self._started
+
+    def record(self, entry: dict) -> None:
+        if len(self._pending) >= _MAX_PENDING:
+            self.dropped += 1
+            return
+        self._pending.append(json.dumps(entry, separators=(",", ":")))
+        self.recorded += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._pending = self._pending, []
+            if not lines:
+                return
+            try:
+                with open(self._path, "a") as f:
+                    f.write("\n".join(lines) + "\n")
+            except OSError:
+                logger.exception("Failed to write %d captured request(s)", len(lines))
+                self._pending[:0] = lines[: _MAX_PENDING - len(self._pending)]
+
+    async def flush_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.flush)
+
+
+_recorder: TrafficRecorder | None = None
+
+
+def get_traffic_recorder() -> TrafficRecorder | None:
+    """The recorder, or None when TRAFFIC_CAPTURE_PATH is unset."""
+    global _recorder
+    settings = get_settings()
+    if not settings.TRAFFIC_CAPTURE_PATH:
+        return None
+    if _recorder is None:
+        _recorder = TrafficRecorder(settings.TRAFFIC_CAPTURE_PATH, settings.TRAFFIC_CAPTURE_SAMPLE_RATE)
+    return _recorder
+
+
+class TrafficCaptureMiddleware:
+    """Pure ASGI middleware; install inside RequestIDMiddleware so the request's trace is visible."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        recorder = get_traffic_recorder()
+        if recorder is None or scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        at = recorder.offset()
+        start = time.perf_counter()
+        trace = current_trace()
+        request_bytes = 0
+        response = {"status": 500, "bytes": 0, "stream": False, "deltas": 0, "first_byte": None}
+
+        async def capture_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                response["stream"] = content_type.startswith(b"text/event-stream")
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk and response["first_byte"] is None:
+                    response["first_byte"] = time.perf_counter()
+                response["bytes"] += len(chunk)
+                if response["stream"]:
+                    response["deltas"] += chunk.count(_STREAM_DELTA)
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self._record(recorder, scope, trace, at, start, request_bytes, response)
+
+    def _record(self, recorder: TrafficRecorder, scope, trace, at: float, start: float, request_bytes: int, response: dict) -> None:
+        attributes = trace.attributes if trace is not None else {}
+        user = attributes.get("enduser.id")
+        user = recorder.anonymize(user) if user else None
+        if not recorder.sampled(user):
+            return
+        end = time.perf_counter()
+        conversation_id = scope.get("path_params", {}).get("conversation_id")
+        query = dict(p.split("=", 1) for p in scope.get("query_string", b"").decode("latin-1").split("&") if "=" in p)
+        entry = {
+            "t": round(at, 4),
+            "method": scope["method"],
+            "route": getattr(scope.get("route"), "path", None) or "unmatched",
+            "status": response["status"],
+            "user": user,
+            "conversation": recorder.anonymize(conversation_id) if conversation_id else None,
+            "history_messages": attributes.get("conversation.message_count"),
+            "request_bytes": request_bytes,
+            "response_bytes": response["bytes"],
+            "query": {k: query[k] for k in _SHAPE_PARAMS if k in query},
+            "stream": response["stream"],
+            "ttfb_ms": round((response["first_byte"] - start) * 1000, 1) if response["first_byte"] else None,
+            "duration_ms": round((end - start) * 1000, 1),
+        }
+        if response["stream"]:
+            entry["stream_deltas"] = response["deltas"]
+        if "message.content_tokens" in attributes:
+            # Set by the send/stream handlers, which tokenize the content anyway
+            entry["content_tokens"] = attributes["message.content_tokens"]
+            entry["model"] = attributes.get("message.model")
+            entry["thinking"] = bool(attributes.get("message.thinking"))
+        recorder.record(entry)
@@ -0,0 +1,164 @@
+"""Negotiated compression for large non-streaming responses.
+
+Picks zstd, Brotli or gzip from Accept-Encoding, in that order of preference
+among equally weighted codings. zstd and Brotli are used only when the
+`zstandard` / `brotli` packages are installed; gzip is always available.
+Only single-message bodies of at least COMPRESSION_MIN_BYTES are compressed.
+Anything streamed (SSE, NDJSON export) or already encoded passes through
+untouched, and text/event-stream responses are forwarded without waiting for
+their first event.
+"""
+
+import asyncio
+import zlib
+from collections.abc import Callable
+
+from src.config.settings import get_settings
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Bodies this large are compressed in a worker thread (the codecs release the GIL)
+_OFFLOAD_BYTES = 64 * 1024
+_COMPRESSIBLE_TYPES = (b"application/json", b"text/", b"application/x-ndjson")
+
+
+def _gzip(level: int) -> Callable[[bytes], bytes]:
+    def compress(data: bytes) -> bytes:
+        # wbits=31 writes a gzip header; compressobj avoids gzip.compress's Python-level framing
+        c = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return c.compress(data) + c.flush()
+
+    return compress
+
+
+def available_encoders() -> dict[str, Callable[[bytes], bytes]]:
+    """Encoders by coding name, in server preference order."""
+    settings = get_settings()
+    encoders: dict[str, Callable[[bytes], bytes]] = {}
+    if zstandard is not None:
+        encoders["zstd"] = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compress
+    if brotli is not None:
+        level = settings.COMPRESSION_BROTLI_LEVEL
+        encoders["br"] = lambda data: brotli.compress(data, quality=level)
+    encoders["gzip"] = _gzip(settings.COMPRESSION_GZIP_LEVEL)
+    return encoders
+
+
+def negotiate(accept_encoding: str, offered: list[str]) -> str | None:
+    """The offered coding with the highest q in the header; ties go to the earlier offer."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware; holds a response's start message until its body shows whether to compress."""
+
+    def __init__(self, app):
+        self.app = app
+        settings = get_settings()
+        self._min_bytes = settings.COMPRESSION_MIN_BYTES
+        self._encoders = available_encoders()
+        self._offered = list(self._encoders)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        coding = negotiate(accept, self._offered) if accept else None
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def compress_send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"")
+                if content_type.startswith(b"text/event-stream") or b"content-encoding" in headers:
+                    # Never hold back a stream's headers, and never encode twice
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(start)
+                start, passthrough = None, True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            held, start = start, None
+            passthrough = True
+            if message.get("more_body", False) or not self._compressible(held, body):
+                await send(held)
+                await send(message)
+                return
+            encode = self._encoders[coding]
+            compressed = await asyncio.to_thread(encode, body) if len(body) >= _OFFLOAD_BYTES else encode(body)
+            await send({**held, "headers": self._encoded_headers(held["headers"], coding, len(compressed))})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compress_send)
+
+    def _compressible(self, start: dict, body: bytes) -> bool:
+        if len(body) < self._min_bytes or start["status"] in (204, 304):
+            return False
+        content_type = dict(start.get("headers", [])).get(b"content-type", b"")
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+    @staticmethod
+    def _encoded_headers(headers: list, coding: str, length: int) -> list:
+        result = []
+        vary = None
+        for name, value in headers:
+            lower = name.lower()
+            if lower == b"content-length":
+                continue
+            if lower == b"etag" and not value.startswith(b"W/"):
+                # The encoded body is a different representation, so a strong tag no longer fits
+                value = b"W/" + value
+            if lower == b"vary":
+                vary = value
+                continue
+            result.append((name, value))
+        result.append((b"content-encoding", coding.encode()))
+        result.append((b"content-length", str(length).encode()))
+        result.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        return result
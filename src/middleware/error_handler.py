@@ -13,9 +13,10 @@ def _request_id(request: Request) -> str:
     return getattr(request.state, "request_id", "unknown")
 
 
-def _error_response(status: int, error_type: str, message: str, request_id: str) -> JSONResponse:
+def _error_response(status: int, error_type: str, message: str, request_id: str, headers: dict | None = None) -> JSONResponse:
     return JSONResponse(
         status_code=status,
+        headers=headers,
         content={
             "status": "error",
             "error": {
@@ -38,14 +39,16 @@ def register_error_handlers(app: FastAPI) -> None:
     @app.exception_handler(HTTPException)
     async def http_error(request: Request, exc: HTTPException):
         type_map = {
+            400: "bad_request",
             401: "authentication_error",
             403: "forbidden",
             404: "not_found",
             409: "conflict",
             429: "rate_limit",
+            503: "overloaded",
         }
         error_type = type_map.get(exc.status_code, "http_error")
-        return _error_response(exc.status_code, error_type, exc.detail, _request_id(request))
+        return _error_response(exc.status_code, error_type, exc.detail, _request_id(request), exc.headers)
 
     @app.exception_handler(Exception)
     async def unhandled_error(request: Request, exc: Exception):
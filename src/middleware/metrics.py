@@ -0,0 +1,37 @@
+"""Record request latency by route template."""
+
+import time
+
+from src.utils.metrics import HTTP_REQUEST_DURATION
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times each HTTP request until its response is fully sent.
+
+    The route template (e.g. /api/v1/conversations/{conversation_id}) is read from
+    the scope after routing, keeping the label set bounded; requests that match no
+    route are grouped under "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
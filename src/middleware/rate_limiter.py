@@ -8,10 +8,14 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
 from src.config.settings import get_settings
+from src.utils.metrics import RATE_LIMIT_REJECTIONS
 
 # Paths that use the stricter AI generation limit
 AI_PATHS = {"/api/v1/conversations/{id}/messages", "/api/v1/conversations/{id}/messages/stream"}
 
+_ai_rejections = RATE_LIMIT_REJECTIONS.labels("ai")
+_standard_rejections = RATE_LIMIT_REJECTIONS.labels("standard")
+
 
 class RateLimiterMiddleware(BaseHTTPMiddleware):
     def __init__(self, app):
@@ -42,7 +46,7 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
 
     async def dispatch(self, request: Request, call_next) -> Response:
         # Skip rate limiting for non-authed routes and health checks
-        if request.url.path in ("/health", "/docs", "/redoc", "/openapi.json"):
+        if request.url.path in ("/health", "/metrics", "/docs", "/redoc", "/openapi.json"):
             return await call_next(request)
 
         # Extract user_id from request state (set by auth dependency, or absent)
@@ -58,6 +62,7 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
         if self._is_ai_path(request.url.path) and request.method == "POST":
             allowed, retry_after = self._check_limit(self._ai_windows[user_id], settings.RATE_LIMIT_AI, now)
             if not allowed:
+                _ai_rejections.inc()
                 return Response(
                     content='{"status":"error","error":{"type":"rate_limit","message":"AI generation rate limit exceeded"}}',
                     status_code=429,
@@ -67,6 +72,7 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
         # Check standard rate limit
         allowed, retry_after = self._check_limit(self._standard_windows[user_id], settings.RATE_LIMIT_STANDARD, now)
         if not allowed:
+            _standard_rejections.inc()
             return Response(
                 content='{"status":"error","error":{"type":"rate_limit","message":"Rate limit exceeded"}}',
                 status_code=429,
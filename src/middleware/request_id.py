@@ -1,17 +1,45 @@
-"""Attach a unique request ID to every request/response."""
+"""Attach a unique request ID to every request/response, and time its stages."""
 
+import asyncio
 import uuid
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import MutableHeaders
 
+from src.utils.tracing import get_trace_exporter, start_trace
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next) -> Response:
-        request_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
-        request.state.request_id = request_id
 
-        response: Response = await call_next(request)
-        response.headers["X-Request-ID"] = request_id
-        return response
+class RequestIDMiddleware:
+    """Pure ASGI middleware, so the trace is started (and its task bound) in the task that runs the route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1") or str(uuid.uuid4())
+        scope.setdefault("state", {})["request_id"] = request_id
+        trace = start_trace(request_id, f"{scope['method']} {scope['path']}")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    trace.name = f"{scope['method']} {route}"
+                trace.attributes["http.status_code"] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-Request-ID"] = request_id
+                # Stages finished before the response started; streams report the rest in a trailing event
+                headers["Server-Timing"] = trace.server_timing()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            # The body has been sent by now, so streamed stages are included in the export
+            trace.finish()
+            exporter = get_trace_exporter()
+            if exporter is not None:
+                await asyncio.to_thread(exporter.export, trace)
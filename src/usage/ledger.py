@@ -0,0 +1,64 @@
+"""Per-user usage ledger: daily per-model rollups maintained by the messages trigger.
+
+The ledger covers the messages that currently exist: deleting a message or a
+conversation takes its usage back out, so totals agree with conversation_count.
+Rebuild the ledger from existing messages (e.g. after first deploying it):
+
+    python -m src.usage.ledger [user_id]
+"""
+
+import logging
+import sys
+
+from src.db.client import get_supabase
+from src.db.models import USAGE_DAILY
+from src.utils.cost_tracker import pricing_table
+from src.utils.metrics import db_timed
+
+logger = logging.getLogger(__name__)
+
+_TOTAL_FIELDS = ("message_count", "generation_count", "total_tokens", "input_tokens", "output_tokens", "cached_input_tokens")
+
+
+@db_timed
+def get_user_rollups(user_id: str) -> list[dict]:
+    db = get_supabase()
+    result = db.table(USAGE_DAILY).select("*").eq("user_id", user_id).execute()
+    return result.data
+
+
+def summarize(rollups: list[dict]) -> tuple[dict, list[dict]]:
+    """Collapse daily rollup rows into lifetime totals and per-model totals."""
+    totals = {field: 0 for field in _TOTAL_FIELDS}
+    totals["cost_usd"] = 0.0
+    by_model: dict[str, dict] = {}
+    for row in rollups:
+        model = by_model.setdefault(row["model"], {"model": row["model"], **{f: 0 for f in _TOTAL_FIELDS}, "cost_usd": 0.0})
+        for field in _TOTAL_FIELDS:
+            value = row.get(field) or 0
+            totals[field] += value
+            model[field] += value
+        cost = float(row.get("cost_usd") or 0)
+        totals["cost_usd"] += cost
+        model["cost_usd"] += cost
+    for model in by_model.values():
+        model["cost_usd"] = round(model["cost_usd"], 6)
+    return totals, sorted(by_model.values(), key=lambda m: m["cost_usd"], reverse=True)
+
+
+def backfill(user_id: str | None = None) -> int:
+    """Rebuild usage_daily from messages; returns rollup rows written.
+
+    Assistant messages without a recorded cost are priced from the model registry.
+    """
+    db = get_supabase()
+    result = db.rpc("backfill_usage_ledger", {"target_user": user_id, "pricing": pricing_table()}).execute()
+    written = result.data or 0
+    logger.info("Backfilled %d usage rollup row(s)", written)
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    target = sys.argv[1] if len(sys.argv) > 1 else None
+    print(f"Wrote {backfill(target)} usage rollup row(s)")
@@ -0,0 +1,121 @@
+"""Prometheus /metrics endpoint and collectors for components that keep their own stats."""
+
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from src.config.settings import get_settings
+from src.db.singleflight import get_singleflight_stats
+from src.llm.admission import get_admission_controller
+from src.llm.cache import get_response_cache
+from src.llm.client import get_provider_stats
+from src.messages.titles import get_title_runner
+from src.utils.loop_monitor import get_loop_monitor
+from src.utils.metrics import CONTENT_TYPE, REGISTRY, collect, render, stats_family
+
+router = APIRouter(tags=["Health"])
+
+
+def _cache_metrics() -> dict[str, dict]:
+    cache = get_response_cache()
+    if cache is None:
+        return {}
+    stats = cache.stats()
+    return {
+        "llm_response_cache_lookups_total": stats_family(
+            "counter", "LLM response cache lookups by result.", ("result",),
+            {("hit",): stats["hits"], ("miss",): stats["misses"]},
+        ),
+        "llm_response_cache_evictions_total": stats_family("counter", "LLM response cache evictions.", (), {(): stats["evictions"]}),
+        "llm_response_cache_bytes": stats_family("gauge", "Bytes held by the LLM response cache.", (), {(): stats["bytes"]}),
+    }
+
+
+def _singleflight_metrics() -> dict[str, dict]:
+    stats = get_singleflight_stats()
+    return {
+        "db_singleflight_calls_total": stats_family(
+            "counter", "Coalesced read calls by function and outcome (executed or shared).", ("function", "outcome"),
+            {
+                **{(name, "executed"): s["executions"] for name, s in stats.items()},
+                **{(name, "shared"): s["coalesced"] for name, s in stats.items()},
+            },
+        ),
+    }
+
+
+def _admission_metrics() -> dict[str, dict]:
+    stats = get_admission_controller().stats()
+    return {
+        "llm_generations_in_flight": stats_family("gauge", "LLM generations currently admitted.", (), {(): stats["in_flight"]}),
+        "llm_generations_queued": stats_family("gauge", "LLM generations waiting for admission.", (), {(): stats["queued"]}),
+        "llm_admission_rejections_total": stats_family(
+            "counter", "Generations shed by admission control, by reason.", ("reason",),
+            {
+                ("queue_full",): stats["rejected_queue_full"],
+                ("timeout",): stats["rejected_timeout"],
+                ("user_limit",): stats["rejected_user_limit"],
+            },
+        ),
+    }
+
+
+def _provider_metrics() -> dict[str, dict]:
+    providers = get_provider_stats()
+    keys = [(provider, key) for provider, stats in providers.items() for key in stats["keys"]]
+    return {
+        "llm_key_requests_total": stats_family(
+            "counter", "Provider calls per API key, by outcome.", ("provider", "key", "outcome"),
+            {
+                (provider, key["key"], outcome): key[field]
+                for provider, key in keys
+                for outcome, field in (("success", "successes"), ("rate_limited", "rate_limited"), ("auth_error", "auth_errors"), ("error", "errors"))
+            },
+        ),
+        "llm_key_tokens_remaining": stats_family(
+            "gauge", "Token budget left per API key, from rate-limit headers.", ("provider", "key"),
+            {(provider, key["key"]): key["tokens_remaining"] for provider, key in keys},
+            # Every worker sees the same account budget; the lowest is the most recently drawn down
+            merge="min",
+        ),
+        "llm_scheduler_timeouts_total": stats_family(
+            "counter", "Calls that waited too long for provider budget.", ("provider",),
+            {(provider,): stats["timeouts"] for provider, stats in providers.items()},
+        ),
+    }
+
+
+def _title_metrics() -> dict[str, dict]:
+    stats = get_title_runner().stats()
+    return {
+        "title_jobs_queued": stats_family("gauge", "Auto-title jobs waiting.", (), {(): stats["queue_depth"]}),
+        "title_jobs_total": stats_family(
+            "counter", "Titles saved, by source.", ("source",),
+            {("llm",): stats["completed"], ("heuristic",): stats["heuristic"]},
+        ),
+        "title_llm_failures_total": stats_family("counter", "Titles that fell back to the heuristic after a failed LLM batch.", (), {(): stats["failed"]}),
+    }
+
+
+def _loop_metrics() -> dict[str, dict]:
+    lag = get_loop_monitor().stats()["lag_ms"]
+    return {
+        "event_loop_lag_recent_seconds": stats_family(
+            "gauge", "Event loop lag percentiles over the most recent samples.", ("quantile",),
+            {(q,): lag[key] / 1000 for q, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")) if lag[key] is not None},
+            # Percentiles don't add up; report the worst worker
+            merge="max",
+        ),
+    }
+
+
+for _collector in (_cache_metrics, _singleflight_metrics, _admission_metrics, _provider_metrics, _title_metrics, _loop_metrics):
+    REGISTRY.add_collector(_collector)
+
+
+@router.get("/metrics", summary="Prometheus metrics", description="Metrics in the Prometheus text format, merged across workers when METRICS_MULTIPROC_DIR is set. Requires `Authorization: Bearer <METRICS_TOKEN>` when a token is configured.")
+async def metrics(request: Request):
+    token = get_settings().METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=render(collect()), media_type=CONTENT_TYPE)
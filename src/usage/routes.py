@@ -1,12 +1,21 @@
 """Usage stats and models listing endpoints."""
 
-from fastapi import APIRouter, Depends
+from datetime import datetime, timedelta, timezone
+from typing import Literal
 
-from src.auth.dependencies import CurrentUser, get_current_user
-from src.config.settings import get_settings
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+
+from src.auth.dependencies import CurrentUser, get_admin_user, get_current_user
 from src.db.client import get_supabase
-from src.db.models import CONVERSATIONS, MESSAGES
-from src.utils.cost_tracker import MODEL_PRICING, estimate_cost
+from src.db.models import CONVERSATIONS
+from src.llm.admission import get_admission_controller
+from src.llm.cache import get_response_cache
+from src.llm.client import get_provider_stats
+from src.llm.models import get_model_registry
+from src.messages.titles import get_title_runner
+from src.utils.loop_monitor import get_loop_monitor
+from src.usage.ledger import get_user_rollups, summarize
+from src.usage.timeseries import BUCKET_SECONDS, MAX_BUCKETS, compute_timeseries, fetch_columns
 
 router = APIRouter(prefix="/api/v1", tags=["Usage"])
 
@@ -15,114 +24,83 @@ router = APIRouter(prefix="/api/v1", tags=["Usage"])
 async def usage_stats(user: CurrentUser = Depends(get_current_user)):
     db = get_supabase()
 
-    # Conversation count
-    conv_result = db.table(CONVERSATIONS).select("id", count="exact").eq("user_id", user.id).execute()
-    conversation_count = conv_result.count or 0
-
-    # Message count and token sums via messages in user's conversations
-    # First get user's conversation IDs
-    conv_ids_result = db.table(CONVERSATIONS).select("id").eq("user_id", user.id).execute()
-    conv_ids = [c["id"] for c in conv_ids_result.data]
-
-    total_tokens = 0
-    total_input_tokens = 0
-    message_count = 0
-    total_cost = 0.0
-
-    if conv_ids:
-        for conv_id in conv_ids:
-            msgs = (
-                db.table(MESSAGES)
-                .select("token_count, metadata, model, role")
-                .eq("conversation_id", conv_id)
-                .execute()
-            )
-            for msg in msgs.data:
-                message_count += 1
-                tokens = msg.get("token_count") or 0
-                total_tokens += tokens
-                meta = msg.get("metadata") or {}
-                input_t = meta.get("input_tokens", 0)
-                total_input_tokens += input_t
-                if msg.get("role") == "assistant" and msg.get("model"):
-                    cost_from_meta = meta.get("cost_usd")
-                    if cost_from_meta is not None:
-                        total_cost += cost_from_meta
-                    else:
-                        total_cost += estimate_cost(input_t, tokens, msg["model"])
+    conv_result = db.table(CONVERSATIONS).select("id", count="exact", head=True).eq("user_id", user.id).execute()
+    totals, by_model = summarize(get_user_rollups(user.id))
 
     return {
         "status": "success",
         "data": {
-            "conversation_count": conversation_count,
-            "message_count": message_count,
-            "total_output_tokens": total_tokens,
-            "total_input_tokens": total_input_tokens,
-            "estimated_cost_usd": round(total_cost, 6),
+            "conversation_count": conv_result.count or 0,
+            "message_count": totals["message_count"],
+            "total_output_tokens": totals["total_tokens"],
+            "total_input_tokens": totals["input_tokens"],
+            "total_cached_input_tokens": totals["cached_input_tokens"],
+            "estimated_cost_usd": round(totals["cost_usd"], 6),
+            "by_model": by_model,
         },
     }
 
 
-@router.get("/models", summary="List supported LLM models")
-async def list_models():
-    settings = get_settings()
-
-    models = [
-        {
-            "id": "llama-3.1-8b-instant",
-            "provider": "groq",
-            "name": "Llama 3.1 8B Instant",
-            "max_context_tokens": 8192,
-            "cost_per_1k_input": MODEL_PRICING["llama-3.1-8b-instant"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["llama-3.1-8b-instant"]["output"],
-            "is_default": settings.DEFAULT_MODEL == "llama-3.1-8b-instant",
-        },
-        {
-            "id": "llama-3.1-70b-versatile",
-            "provider": "groq",
-            "name": "Llama 3.1 70B Versatile",
-            "max_context_tokens": 32768,
-            "cost_per_1k_input": MODEL_PRICING["llama-3.1-70b-versatile"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["llama-3.1-70b-versatile"]["output"],
-            "is_default": False,
-        },
-        {
-            "id": "llama-3.3-70b-versatile",
-            "provider": "groq",
-            "name": "Llama 3.3 70B Versatile",
-            "max_context_tokens": 32768,
-            "cost_per_1k_input": MODEL_PRICING["llama-3.3-70b-versatile"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["llama-3.3-70b-versatile"]["output"],
-            "is_default": False,
-        },
-        {
-            "id": "mixtral-8x7b-32768",
-            "provider": "groq",
-            "name": "Mixtral 8x7B",
-            "max_context_tokens": 32768,
-            "cost_per_1k_input": MODEL_PRICING["mixtral-8x7b-32768"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["mixtral-8x7b-32768"]["output"],
-            "is_default": False,
-        },
-        {
-            "id": "gemini-1.5-flash",
-            "provider": "google",
-            "name": "Gemini 1.5 Flash",
-            "max_context_tokens": 1048576,
-            "cost_per_1k_input": MODEL_PRICING["gemini-1.5-flash"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["gemini-1.5-flash"]["output"],
-            "is_default": False,
-            "is_fallback": settings.FALLBACK_MODEL == "gemini-1.5-flash",
-        },
-        {
-            "id": "gemini-1.5-pro",
-            "provider": "google",
-            "name": "Gemini 1.5 Pro",
-            "max_context_tokens": 2097152,
-            "cost_per_1k_input": MODEL_PRICING["gemini-1.5-pro"]["input"],
-            "cost_per_1k_output": MODEL_PRICING["gemini-1.5-pro"]["output"],
-            "is_default": False,
-        },
-    ]
+@router.get("/usage/timeseries", summary="Usage time series", description="Generations, tokens, cost and latency percentiles per model, bucketed hourly or daily over [start, end).")
+async def usage_timeseries(
+    start: datetime | None = Query(None, description="Range start (ISO 8601, default: 7 days before end)"),
+    end: datetime | None = Query(None, description="Range end, exclusive (ISO 8601, default: now)"),
+    bucket: Literal["hour", "day"] = Query("day"),
+    user: CurrentUser = Depends(get_current_user),
+):
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=7)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end - start).total_seconds() / BUCKET_SECONDS[bucket] > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range too large: at most {MAX_BUCKETS} {bucket} buckets")
+
+    columns = fetch_columns(user.id, start, end)
+    series = compute_timeseries(columns, start, end, bucket)
+    return {
+        "status": "success",
+        "data": {"start": start.isoformat(), "end": end.isoformat(), "bucket": bucket, "series": series},
+    }
 
-    return {"status": "success", "data": models}
+
+@router.get("/usage/cache", summary="LLM response cache statistics", description="Hit rate, evictions, and tokens and dollars saved by the LLM response cache. Admin only.")
+async def cache_stats(user: CurrentUser = Depends(get_admin_user)):
+    cache = get_response_cache()
+    if cache is None:
+        return {"status": "success", "data": {"enabled": False}}
+    return {"status": "success", "data": {"enabled": True, **cache.stats()}}
+
+
+@router.get("/usage/background", summary="Background job statistics", description="Queue depth, throughput and latency of the auto-title job runner. Admin only.")
+async def background_stats(user: CurrentUser = Depends(get_admin_user)):
+    return {"status": "success", "data": {"titles": get_title_runner().stats()}}
+
+
+@router.get("/usage/admission", summary="Generation admission statistics", description="In-flight and queued generations, rejections and queue wait percentiles for this worker. Admin only.")
+async def admission_stats(user: CurrentUser = Depends(get_admin_user)):
+    return {"status": "success", "data": get_admission_controller().stats()}
+
+
+@router.get("/usage/providers", summary="Provider key pool statistics", description="Per-key load, health and remaining rate-limit budgets, and scheduler queue and wait statistics. Admin only.")
+async def provider_stats(user: CurrentUser = Depends(get_admin_user)):
+    return {"status": "success", "data": get_provider_stats()}
+
+
+@router.get("/usage/loop", summary="Event loop lag statistics", description="Scheduling-delay percentiles over recent samples and the number of stalls long enough to be logged with a stack trace, for this worker. Admin only.")
+async def loop_stats(user: CurrentUser = Depends(get_admin_user)):
+    return {"status": "success", "data": get_loop_monitor().stats()}
+
+
+@router.get("/models", summary="List supported LLM models")
+async def list_models(request: Request):
+    registry = get_model_registry()
+    headers = {"ETag": registry.catalog_etag, "Cache-Control": "public, max-age=300"}
+    # Weak comparison (RFC 9110): the compression middleware sends the tag as W/ on encoded bodies
+    if request.headers.get("if-none-match", "").removeprefix("W/") == registry.catalog_etag:
+        return Response(status_code=304, headers=headers)
+    # Serialized once when the registry is loaded
+    return Response(content=registry.catalog_body, media_type="application/json", headers=headers)
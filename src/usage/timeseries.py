@@ -0,0 +1,107 @@
+"""Vectorized usage time-series: bucket, group by model and take latency percentiles with NumPy."""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.db.client import get_supabase
+from src.utils.metrics import db_timed
+
+BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+PERCENTILES = (50, 95, 99)
+# Upper bound on buckets per request, so one call can't ask for years of hourly data
+MAX_BUCKETS = 24 * 92
+
+
+@db_timed
+def fetch_columns(user_id: str, start: datetime, end: datetime) -> dict[str, np.ndarray]:
+    """Fetch the user's generations in [start, end) as parallel arrays in one round trip."""
+    db = get_supabase()
+    result = db.rpc(
+        "usage_columns",
+        {"target_user": user_id, "range_start": start.isoformat(), "range_end": end.isoformat()},
+    ).execute()
+    row = result.data[0] if result.data else {}
+    return to_arrays(row)
+
+
+def to_arrays(row: dict) -> dict[str, np.ndarray]:
+    return {
+        "model_names": np.asarray(row.get("model_names") or [], dtype=object),
+        "model_idx": np.asarray(row.get("model_idx") or [], dtype=np.int64),
+        "created_at": np.asarray(row.get("created_at") or [], dtype=np.float64),
+        "output_tokens": np.asarray(row.get("output_tokens") or [], dtype=np.int64),
+        "input_tokens": np.asarray(row.get("input_tokens") or [], dtype=np.int64),
+        # latency_ms may be NULL; float conversion maps those to NaN, which percentiles skip
+        "latency_ms": np.asarray(row.get("latency_ms") or [], dtype=np.float64),
+        "cost_usd": np.asarray(row.get("cost_usd") or [], dtype=np.float64),
+    }
+
+
+def _group_percentiles(groups: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Nearest-rank percentiles of `values` within each group; shape (n_groups, len(PERCENTILES))."""
+    out = np.full((n_groups, len(PERCENTILES)), np.nan)
+    valid = ~np.isnan(values)
+    groups, values = groups[valid], values[valid]
+    if not len(values):
+        return out
+
+    # Sort by group, then value, in one float argsort: values are scaled into [0, 1)
+    # and added to the group id, so each group becomes a contiguous, sorted run
+    sort_key = groups + values / (values.max() + 1.0)
+    sorted_values = values[np.argsort(sort_key)]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    present = counts > 0
+
+    for i, q in enumerate(PERCENTILES):
+        rank = np.ceil(q / 100 * counts[present]).astype(np.int64) - 1
+        out[present, i] = sorted_values[starts[present] + np.maximum(rank, 0)]
+    return out
+
+
+def compute_timeseries(columns: dict[str, np.ndarray], start: datetime, end: datetime, bucket: str) -> list[dict]:
+    """Aggregate generations into per-model, per-bucket points (empty buckets are omitted)."""
+    step = BUCKET_SECONDS[bucket]
+    # Buckets sit on UTC hour/day boundaries whatever the requested start
+    start_epoch = start.timestamp() // step * step
+    n_buckets = int(np.ceil((end.timestamp() - start_epoch) / step))
+
+    ts = columns["created_at"]
+    if not len(ts):
+        return []
+
+    bucket_idx = ((ts - start_epoch) // step).astype(np.int64)
+    in_range = (bucket_idx >= 0) & (bucket_idx < n_buckets)
+    bucket_idx = bucket_idx[in_range]
+    model_names = columns["model_names"]
+    n_models = len(model_names)
+
+    # One flat group id per (model, bucket) pair; every aggregate is a single bincount
+    groups = columns["model_idx"][in_range] * n_buckets + bucket_idx
+    n_groups = n_models * n_buckets
+    messages = np.bincount(groups, minlength=n_groups)
+    output_tokens = np.bincount(groups, weights=columns["output_tokens"][in_range], minlength=n_groups)
+    input_tokens = np.bincount(groups, weights=columns["input_tokens"][in_range], minlength=n_groups)
+    cost = np.bincount(groups, weights=columns["cost_usd"][in_range], minlength=n_groups)
+    latency = _group_percentiles(groups, columns["latency_ms"][in_range], n_groups)
+
+    series = []
+    nonzero = np.flatnonzero(messages)
+    for m in range(n_models):
+        lo, hi = np.searchsorted(nonzero, [m * n_buckets, (m + 1) * n_buckets])
+        points = []
+        for g in nonzero[lo:hi].tolist():
+            b = g - m * n_buckets
+            p50, p95, p99 = (None if np.isnan(v) else int(v) for v in latency[g])
+            points.append({
+                "t": datetime.fromtimestamp(start_epoch + b * step, tz=timezone.utc).isoformat(),
+                "messages": int(messages[g]),
+                "input_tokens": int(input_tokens[g]),
+                "output_tokens": int(output_tokens[g]),
+                "cost_usd": round(float(cost[g]), 6),
+                "latency_ms": {"p50": p50, "p95": p95, "p99": p99},
+            })
+        if points:
+            series.append({"model": str(model_names[m]), "points": points})
+    return series
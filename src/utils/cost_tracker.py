@@ -2,35 +2,57 @@
 
 import logging
 
+from src.llm.models import get_model, get_model_registry
+
 logger = logging.getLogger(__name__)
 
-# Price per 1K tokens (USD) — approximate as of early 2026
-MODEL_PRICING: dict[str, dict[str, float]] = {
-    "llama-3.1-8b-instant": {"input": 0.00005, "output": 0.00008},
-    "llama-3.1-70b-versatile": {"input": 0.00059, "output": 0.00079},
-    "llama-3.3-70b-versatile": {"input": 0.00059, "output": 0.00079},
-    "mixtral-8x7b-32768": {"input": 0.00024, "output": 0.00024},
-    "gemma2-9b-it": {"input": 0.00020, "output": 0.00020},
-    "gemini-1.5-flash": {"input": 0.000075, "output": 0.0003},
-    "gemini-1.5-pro": {"input": 0.00125, "output": 0.005},
-}
-
-# Fallback pricing for unknown models
+# Fallback pricing (USD per 1K tokens) for models missing from the registry
 DEFAULT_PRICING = {"input": 0.0005, "output": 0.001}
 
-
-def estimate_cost(input_tokens: int, output_tokens: int, model: str) -> float:
-    """Estimate cost in USD for a single LLM call."""
-    pricing = MODEL_PRICING.get(model, DEFAULT_PRICING)
-    cost = (input_tokens / 1000) * pricing["input"] + (output_tokens / 1000) * pricing["output"]
+# Prompt-cache hits are billed at this fraction of the input rate unless a model sets cached_input_price
+CACHED_INPUT_DISCOUNT = 0.5
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, model: str, cached_input_tokens: int = 0) -> float:
+    """Estimate cost in USD for a single LLM call.
+
+    `cached_input_tokens` is the part of `input_tokens` served from the
+    provider's prompt cache.
+    """
+    spec = get_model(model)
+    if spec is not None:
+        input_rate, output_rate = spec.input_price, spec.output_price
+        cached_rate = spec.cached_input_price
+    else:
+        input_rate, output_rate = DEFAULT_PRICING["input"], DEFAULT_PRICING["output"]
+        cached_rate = None
+    if cached_rate is None:
+        cached_rate = input_rate * CACHED_INPUT_DISCOUNT
+    cached = min(cached_input_tokens, input_tokens)
+    cost = (
+        ((input_tokens - cached) / 1000) * input_rate
+        + (cached / 1000) * cached_rate
+        + (output_tokens / 1000) * output_rate
+    )
     return round(cost, 8)
 
 
-def log_cost(input_tokens: int, output_tokens: int, model: str) -> float:
+def pricing_table() -> dict[str, list[float]]:
+    """[input, output, cached input] rates per 1K tokens by model, with "" for unregistered models."""
+    table = {"": [DEFAULT_PRICING["input"], DEFAULT_PRICING["output"], DEFAULT_PRICING["input"] * CACHED_INPUT_DISCOUNT]}
+    for spec in get_model_registry().all():
+        cached_rate = spec.cached_input_price
+        if cached_rate is None:
+            cached_rate = spec.input_price * CACHED_INPUT_DISCOUNT
+        table[spec.id] = [spec.input_price, spec.output_price, cached_rate]
+    return table
+
+
+def log_cost(input_tokens: int, output_tokens: int, model: str, cached_input_tokens: int = 0) -> float:
     """Estimate and log the cost of an LLM call."""
-    cost = estimate_cost(input_tokens, output_tokens, model)
+    cost = estimate_cost(input_tokens, output_tokens, model, cached_input_tokens)
     logger.info(
-        "LLM cost: model=%s input_tokens=%d output_tokens=%d cost=$%.6f",
-        model, input_tokens, output_tokens, cost,
+        "LLM cost: model=%s input_tokens=%d cached_input_tokens=%d output_tokens=%d cost=$%.6f",
+        model, input_tokens, cached_input_tokens, output_tokens, cost,
     )
     return cost
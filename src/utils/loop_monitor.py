@@ -0,0 +1,133 @@
+"""Event-loop lag monitor with a stall watchdog.
+
+A task on the event loop sleeps for a fixed interval and records how late it
+wakes up: that delay is time the loop spent running something that didn't
+yield (a synchronous Supabase call, bcrypt, tiktoken...). Every other request
+on the worker, SSE streams included, waited that long.
+
+A watchdog thread checks the task's heartbeat. When the loop has been stuck
+longer than LOOP_STALL_THRESHOLD_SECONDS, it captures the loop thread's stack
+while the stall is still in progress and logs it with the request ID of the
+task that was running, so the blocking call can be found from production logs.
+"""
+
+import asyncio
+import logging
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from src.config.settings import get_settings
+from src.utils.metrics import counter, histogram
+from src.utils.tracing import request_id_for_task
+
+logger = logging.getLogger(__name__)
+
+# Recent lag samples kept for percentile reporting
+_LAG_SAMPLES = 1024
+_STACK_LIMIT = 30
+
+LOOP_LAG = histogram(
+    "event_loop_lag_seconds", "Event loop scheduling delay.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = counter("event_loop_stalls_total", "Event loop stalls longer than LOOP_STALL_THRESHOLD_SECONDS.")
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float, stall_threshold: float):
+        self._interval = interval
+        self._threshold = stall_threshold
+        self._lags: deque[float] = deque(maxlen=_LAG_SAMPLES)
+        self._heartbeat = time.monotonic()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        """Start measuring the running loop; call from the loop's thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+
+    async def _measure(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            lag = max(0.0, now - start - self._interval)
+            self._heartbeat = now
+            self._lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stopping.wait(self._threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self._interval
+            # One report per stall: the heartbeat only moves once the loop runs again
+            if stalled < self._threshold or heartbeat == reported:
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            LOOP_STALLS.inc()
+            self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=_STACK_LIMIT)) if frame else "<unavailable>\n"
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        logger.warning(
+            "Event loop blocked for %.0f ms so far (request_id=%s, task=%s); loop thread stack:\n%s",
+            stalled * 1000, request_id_for_task(task) or "-", task.get_name() if task else "-", stack,
+        )
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+
+        def pct(q: float) -> float | None:
+            return round(lags[min(len(lags) - 1, math.ceil(q * len(lags)) - 1)] * 1000, 2) if lags else None
+
+        return {
+            "interval_ms": self._interval * 1000,
+            "stall_threshold_ms": self._threshold * 1000,
+            "stalls": self.stalls,
+            "lag_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(self.max_lag * 1000, 2)},
+        }
+
+
+_monitor: LoopLagMonitor | None = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        settings = get_settings()
+        _monitor = LoopLagMonitor(settings.LOOP_MONITOR_INTERVAL_SECONDS, settings.LOOP_STALL_THRESHOLD_SECONDS)
+    return _monitor
@@ -0,0 +1,347 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and fixed-bucket histograms are plain Python objects updated
+on the hot path (no locks: the app runs on one event loop per worker). Label
+values are resolved once per combination and cached, so an observation is a
+dict lookup plus an add.
+
+With several uvicorn workers, set METRICS_MULTIPROC_DIR to a directory shared
+by the workers (empty it on deploy). Each worker writes a snapshot there every
+METRICS_FLUSH_SECONDS, and /metrics, whichever worker serves it, merges them.
+Counters and histograms are summed, and those of exited workers keep counting
+towards the totals. Gauges only count live workers and are combined by their
+merge mode: "sum" for per-worker quantities (open connections), "max" or "min"
+where every worker reports its own view of one value (a lag percentile, a
+shared provider budget) and a sum would be meaningless.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections.abc import Callable
+from pathlib import Path
+
+from src.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 25, 50, 100, 200, 400, 800, 1600)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; cumulated only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+MERGE_MODES = {"sum": sum, "max": max, "min": min}
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), merge: str = "sum"):
+        if merge not in MERGE_MODES:
+            raise ValueError(f"Unknown merge mode {merge!r}")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.merge = merge
+        self._children: dict[tuple[str, ...], object] = {}
+        if not labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def snapshot(self) -> dict:
+        samples = []
+        for values, child in self._children.items():
+            if isinstance(child, _HistogramValue):
+                samples.append([list(values), child.counts[:], child.sum])
+            else:
+                samples.append([list(values), child.value])
+        return {"type": self.kind, "help": self.documentation, "labels": list(self.labelnames), "merge": self.merge, "samples": samples}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        # Called at collection time; each returns {name: snapshot} for values kept elsewhere (stats() dicts)
+        self._collectors: list[Callable[[], dict[str, dict]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], dict[str, dict]]) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict[str, dict]:
+        data = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        for collector in self._collectors:
+            try:
+                data.update(collector())
+            except Exception:
+                logger.exception("Metrics collector failed")
+        return data
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = (), merge: str = "sum") -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, merge))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def stats_family(kind: str, documentation: str, labels: tuple[str, ...], samples: dict[tuple[str, ...], float], merge: str = "sum") -> dict:
+    """Snapshot for a collector reporting values already kept by a component's stats()."""
+    if merge not in MERGE_MODES:
+        raise ValueError(f"Unknown merge mode {merge!r}")
+    return {"type": kind, "help": documentation, "labels": list(labels), "merge": merge, "samples": [[list(k), v] for k, v in samples.items()]}
+
+
+# --- Application metrics ---
+
+HTTP_REQUEST_DURATION = histogram("http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+DB_QUERY_DURATION = histogram("db_query_duration_seconds", "Database call latency by repository function.", ("function",), DB_BUCKETS)
+LLM_TIME_TO_FIRST_TOKEN = histogram("llm_time_to_first_token_seconds", "Time from request to first streamed token.", ("provider", "model"))
+LLM_GENERATION_DURATION = histogram("llm_generation_duration_seconds", "Total provider generation time.", ("provider", "model"))
+LLM_TOKENS_PER_SECOND = histogram("llm_output_tokens_per_second", "Output tokens per second of generation.", ("provider", "model"), TOKENS_PER_SECOND_BUCKETS)
+LLM_OUTPUT_TOKENS = counter("llm_output_tokens_total", "Output tokens generated.", ("provider", "model"))
+SSE_CONNECTIONS = gauge("sse_connections_open", "Server-Sent Events streams currently open.", ("endpoint",))
+RATE_LIMIT_REJECTIONS = counter("rate_limit_rejections_total", "Requests rejected by the per-user rate limiter.", ("tier",))
+
+
+def db_timed(fn: Callable) -> Callable:
+    """Record the latency of a synchronous repository function."""
+    child = DB_QUERY_DURATION.labels(f"{fn.__module__.removeprefix('src.')}.{fn.__qualname__}")
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            child.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def record_generation(provider: str, model: str, started: float, output_tokens: int, first_token_at: float | None = None) -> None:
+    """Record one finished provider call; times are time.perf_counter() values."""
+    now = time.perf_counter()
+    labels = (provider, model)
+    LLM_GENERATION_DURATION.labels(*labels).observe(now - started)
+    if first_token_at is not None:
+        LLM_TIME_TO_FIRST_TOKEN.labels(*labels).observe(first_token_at - started)
+    if output_tokens:
+        LLM_OUTPUT_TOKENS.labels(*labels).inc(output_tokens)
+        # Decode rate: measured from the first token when streaming, so queueing and prefill don't count
+        elapsed = now - (first_token_at if first_token_at is not None else started)
+        if elapsed > 0:
+            LLM_TOKENS_PER_SECOND.labels(*labels).observe(output_tokens / elapsed)
+
+
+# --- Multi-worker aggregation ---
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def write_snapshot(directory: str) -> None:
+    path = Path(directory) / f"worker-{os.getpid()}.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(REGISTRY.snapshot(), separators=(",", ":")))
+    os.replace(tmp, path)
+
+
+def collect() -> dict[str, dict]:
+    """This worker's metrics, merged with the other workers' snapshots when METRICS_MULTIPROC_DIR is set."""
+    own = REGISTRY.snapshot()
+    directory = get_settings().METRICS_MULTIPROC_DIR
+    if not directory:
+        return own
+
+    snapshots = [own]
+    for path in Path(directory).glob("worker-*.json"):
+        pid = int(path.stem.removeprefix("worker-"))
+        if pid == os.getpid():
+            continue
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if not _pid_alive(pid):
+            # Gauges describe the present; a dead worker holds no connections
+            data = {name: family for name, family in data.items() if family["type"] != "gauge"}
+        snapshots.append(data)
+    return merge(snapshots)
+
+
+def merge(snapshots: list[dict[str, dict]]) -> dict[str, dict]:
+    merged: dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, {**family, "samples": {}})
+            combine = MERGE_MODES[family.get("merge", "sum")]
+            for sample in family["samples"]:
+                key = tuple(sample[0])
+                if family["type"] == "histogram":
+                    counts, total = target["samples"].get(key, ([0] * len(sample[1]), 0.0))
+                    target["samples"][key] = ([a + b for a, b in zip(counts, sample[1])], total + sample[2])
+                elif key in target["samples"]:
+                    target["samples"][key] = combine((target["samples"][key], sample[1]))
+                else:
+                    target["samples"][key] = sample[1]
+    for family in merged.values():
+        family["samples"] = [[list(k), *(v if family["type"] == "histogram" else (v,))] for k, v in family["samples"].items()]
+    return merged
+
+
+def flush_snapshot(directory: str) -> None:
+    try:
+        write_snapshot(directory)
+    except OSError:
+        logger.exception("Failed to write metrics snapshot")
+
+
+async def flush_periodically(directory: str, interval: float) -> None:
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    while True:
+        await asyncio.to_thread(flush_snapshot, directory)
+        await asyncio.sleep(interval)
+
+
+# --- Exposition ---
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: list[str], values: list[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(families: dict[str, dict]) -> str:
+    lines = []
+    for name in sorted(families):
+        family = families[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        names = family["labels"]
+        for sample in family["samples"]:
+            values = sample[0]
+            if family["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip([*family["buckets"], float("inf")], sample[1]):
+                    cumulative += count
+                    le = 'le="' + _number(bound) + '"'
+                    lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, values)} {_number(sample[2])}")
+                lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(names, values)} {_number(sample[1])}")
+    return "\n".join(lines) + "\n"
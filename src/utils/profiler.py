@@ -0,0 +1,183 @@
+"""In-process statistical profiler for live workers.
+
+A sampler thread wakes every `interval` seconds and records the stack of every
+thread (sys._current_frames) and, optionally, the await chain of every asyncio
+task parked on the loop. Samples are aggregated as collapsed stacks and can be
+rendered in Brendan Gregg's collapsed format (flamegraph.pl, speedscope) or as
+a speedscope JSON file.
+
+With a request pattern, only samples taken while a task serving a matching
+request ID was running (or, for parked tasks, belonged to one) are kept.
+"""
+
+import asyncio
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+
+from src.utils.tracing import request_id_for_task
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+_MAX_DEPTH = 128
+
+
+@functools.lru_cache(maxsize=16384)
+def _frame_name(code: CodeType) -> str:
+    # Function identity, not line: samples from the same function merge into one frame.
+    # Cached per code object, so the path work runs once per function rather than per frame per tick
+    path = os.path.relpath(code.co_filename) if code.co_filename.startswith(os.getcwd()) else os.path.basename(code.co_filename)
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame: FrameType | None) -> list[str]:
+    stack = []
+    while frame is not None and len(stack) < _MAX_DEPTH:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _task_stack(task: asyncio.Task) -> list[str]:
+    """The await chain a parked task is suspended in, outermost first."""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None and len(stack) < _MAX_DEPTH:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "ag_code", None) or getattr(coro, "gi_code", None)
+        if code is None:
+            break
+        stack.append(_frame_name(code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class SamplingProfiler:
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float, include_tasks: bool = True, request_pattern: str | None = None):
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+        self.interval = interval
+        self._include_tasks = include_tasks
+        self._pattern = re.compile(request_pattern) if request_pattern else None
+        self.stacks: Counter[str] = Counter()
+        # Ticks that recorded at least one stack; with a request pattern, ticks with no match don't count
+        self.samples = 0
+        self.started_at = 0.0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed = time.monotonic() - self.started_at
+
+    def _matches(self, task: asyncio.Task | None) -> bool:
+        if self._pattern is None:
+            return True
+        request_id = request_id_for_task(task)
+        return request_id is not None and self._pattern.search(request_id) is not None
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            kept = False
+            running = asyncio.current_task(self._loop)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                if thread_id == self._loop_thread_id:
+                    if not self._matches(running):
+                        continue
+                    root = "event-loop"
+                elif self._pattern is not None:
+                    # Worker threads (asyncio.to_thread) can't be tied to a request
+                    continue
+                else:
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    root = f"thread:{names.get(thread_id, thread_id)}"
+                self.stacks[";".join([root, *_thread_stack(frame)])] += 1
+                kept = True
+            if self._include_tasks and self._sample_tasks(running):
+                kept = True
+            if kept:
+                self.samples += 1
+
+    def _sample_tasks(self, running: asyncio.Task | None) -> bool:
+        """Record the parked tasks' await chains; returns whether any was recorded."""
+        try:
+            tasks = list(asyncio.all_tasks(self._loop))
+        except RuntimeError:
+            # The task set changed while being copied from this thread; skip this sample
+            return False
+        kept = False
+        for task in tasks:
+            if task is running or task.done() or not self._matches(task):
+                continue
+            stack = _task_stack(task)
+            if stack:
+                self.stacks[";".join(["tasks (awaiting)", *stack])] += 1
+                kept = True
+        return kept
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def speedscope(self, name: str = "profile") -> dict:
+        """Speedscope file with one sampled profile per root (event loop, each thread, parked tasks)."""
+        frames: list[dict] = []
+        index: dict[str, int] = {}
+        profiles: dict[str, dict] = {}
+        for stack, count in self.stacks.items():
+            root, *names = stack.split(";")
+            ids = []
+            for frame_name in names:
+                if frame_name not in index:
+                    index[frame_name] = len(frames)
+                    frames.append({"name": frame_name})
+                ids.append(index[frame_name])
+            profile = profiles.setdefault(root, {
+                "type": "sampled", "name": root, "unit": "seconds",
+                "startValue": 0, "endValue": round(self.elapsed, 6), "samples": [], "weights": [],
+            })
+            profile["samples"].append(ids)
+            profile["weights"].append(round(count * self.interval, 6))
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "conversation-api",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda p: p["name"] != "event-loop"),
+        }
+
+
+_lock = asyncio.Lock()
+
+
+async def profile(seconds: float, interval: float, include_tasks: bool = True, request_pattern: str | None = None) -> SamplingProfiler:
+    """Sample this worker for `seconds`; one profile runs at a time, callers queue on a lock."""
+    async with _lock:
+        profiler = SamplingProfiler(asyncio.get_running_loop(), interval, include_tasks, request_pattern)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+        return profiler
+
+
+def is_profiling() -> bool:
+    return _lock.locked()
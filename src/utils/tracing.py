@@ -0,0 +1,250 @@
+"""Lightweight per-request spans.
+
+RequestIDMiddleware starts a Trace for every request, keyed by its
+X-Request-ID. Code marks stages with `span(name)` or `@traced(name)`; outside a
+request these are no-ops. The finished spans become the Server-Timing header,
+a trailing `timing` event on SSE streams and, when TRACE_EXPORT_PATH is set,
+one line of OTLP/JSON (an ExportTraceServiceRequest) per request in that file.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import Callable
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from src.config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "conversation-api"
+# Guards against long-lived tasks (spawned during a request) growing a trace without bound
+MAX_SPANS_PER_TRACE = 256
+
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+
+
+def _span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+def _trace_id(request_id: str) -> str:
+    try:
+        return uuid.UUID(request_id).hex
+    except ValueError:
+        return uuid.uuid5(uuid.NAMESPACE_URL, request_id).hex
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: str
+    start: float
+    end: float | None = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+@dataclass
+class Trace:
+    request_id: str
+    name: str = "request"
+    trace_id: str = ""
+    root_id: str = field(default_factory=_span_id)
+    start: float = field(default_factory=time.perf_counter)
+    start_unix_ns: int = field(default_factory=time.time_ns)
+    end: float | None = None
+    spans: list[Span] = field(default_factory=list)
+    attributes: dict[str, str | int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.trace_id = self.trace_id or _trace_id(self.request_id)
+
+    def add(self, name: str, start: float, end: float | None = None, parent_id: str | None = None) -> Span | None:
+        if self.end is not None or len(self.spans) >= MAX_SPANS_PER_TRACE:
+            return None
+        s = Span(name, _span_id(), parent_id or self.root_id, start, end)
+        self.spans.append(s)
+        return s
+
+    def finish(self) -> None:
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    def timings(self) -> list[tuple[str, float]]:
+        """(name, total ms) per stage in first-seen order; repeated stages are summed."""
+        totals: dict[str, float] = {}
+        for s in self.spans:
+            if s.end is not None:
+                totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        totals["total"] = ((self.end or time.perf_counter()) - self.start) * 1000
+        return list(totals.items())
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.timings())
+
+    def _unix_ns(self, t: float) -> str:
+        return str(self.start_unix_ns + int((t - self.start) * 1e9))
+
+    def to_otlp(self) -> dict:
+        end = self.end or time.perf_counter()
+        root = {
+            "traceId": self.trace_id,
+            "spanId": self.root_id,
+            "name": self.name,
+            "kind": _SPAN_KIND_SERVER,
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": self._unix_ns(end),
+            "attributes": [
+                {"key": "http.request_id", "value": {"stringValue": self.request_id}},
+                *(
+                    {"key": k, "value": {"intValue": str(v)} if isinstance(v, int) else {"stringValue": v}}
+                    for k, v in self.attributes.items()
+                ),
+            ],
+        }
+        spans = [root] + [
+            {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "parentSpanId": s.parent_id,
+                "name": s.name,
+                "kind": _SPAN_KIND_INTERNAL,
+                "startTimeUnixNano": self._unix_ns(s.start),
+                "endTimeUnixNano": self._unix_ns(s.end or end),
+            }
+            for s in self.spans
+        ]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+
+
+_trace: ContextVar[Trace | None] = ContextVar("request_trace", default=None)
+_parent: ContextVar[str | None] = ContextVar("trace_parent_span", default=None)
+# Task -> request ID; lets another thread (the loop watchdog) tell which request a task is serving
+_task_requests: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _bind_task(trace: Trace) -> None:
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return
+    if task is not None:
+        _task_requests[task] = trace.request_id
+
+
+def request_id_for_task(task: asyncio.Task | None) -> str | None:
+    return _task_requests.get(task) if task is not None else None
+
+
+def start_trace(request_id: str, name: str = "request") -> Trace:
+    trace = Trace(request_id, name)
+    _trace.set(trace)
+    _parent.set(None)
+    _bind_task(trace)
+    return trace
+
+
+def current_trace() -> Trace | None:
+    return _trace.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as a stage of the current request."""
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    # start_trace binds the request's own task; this picks up tasks it spawns (gather, create_task)
+    _bind_task(trace)
+    s = trace.add(name, time.perf_counter(), parent_id=_parent.get())
+    if s is None:
+        yield
+        return
+    token = _parent.set(s.span_id)
+    try:
+        yield
+    finally:
+        s.end = time.perf_counter()
+        _parent.reset(token)
+
+
+def set_attribute(key: str, value: str | int) -> None:
+    """Attach an attribute to the current request's trace; a no-op outside a request."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.attributes[key] = value
+
+
+def record_span(name: str, start: float, end: float) -> None:
+    """Add an already-timed stage (time.perf_counter() values), e.g. time to first token."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, start, end, parent_id=_parent.get())
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() for sync and async functions."""
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TraceFileExporter:
+    """Appends one OTLP/JSON line per finished trace."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_otlp(), separators=(",", ":"))
+        try:
+            with self._lock, open(self._path, "a") as f:
+                f.write(line + "\n")
+        except OSError:
+            logger.exception("Failed to export trace %s", trace.request_id)
+
+
+_exporter: TraceFileExporter | None = None
+
+
+def get_trace_exporter() -> TraceFileExporter | None:
+    """The file exporter, or None when TRACE_EXPORT_PATH is unset."""
+    global _exporter
+    path = get_settings().TRACE_EXPORT_PATH
+    if not path:
+        return None
+    if _exporter is None:
+        _exporter = TraceFileExporter(path)
+    return _exporter
@@ -5,6 +5,8 @@ import uuid
 import pytest
 from fastapi.testclient import TestClient
 
+from src.auth.jwt import verify_token
+from src.config.settings import get_settings
 from src.main import app
 
 
@@ -34,3 +36,11 @@ def auth_tokens(client, test_email, test_password):
 @pytest.fixture(scope="module")
 def auth_header(auth_tokens):
     return {"Authorization": f"Bearer {auth_tokens['access_token']}"}
+
+
+@pytest.fixture
+def admin_header(auth_tokens, auth_header, monkeypatch):
+    """auth_header for a user listed in ADMIN_USER_IDS for the duration of one test."""
+    user_id = verify_token(auth_tokens["access_token"])["sub"]
+    monkeypatch.setattr(get_settings(), "ADMIN_USER_IDS", user_id)
+    return auth_header
@@ -7,6 +7,7 @@ def test_health(client):
     resp = client.get("/health")
     assert resp.status_code == 200
     assert resp.json()["status"] == "ok"
+    assert resp.headers["server-timing"].startswith("total;dur=")
 
 
 def test_register(client):
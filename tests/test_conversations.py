@@ -1,5 +1,6 @@
 """Tests for conversation CRUD endpoints."""
 
+import json
 import uuid
 
 
@@ -89,3 +90,102 @@ def test_ownership_check(client, auth_header):
 
     resp = client.get(f"/api/v1/conversations/{conv_id}", headers={"Authorization": f"Bearer {token2}"})
     assert resp.status_code == 403
+
+
+def test_list_cursor_pagination(client, auth_header):
+    for i in range(3):
+        client.post("/api/v1/conversations", json={"title": f"Cursor {i}"}, headers=auth_header)
+
+    first = client.get("/api/v1/conversations?per_page=2", headers=auth_header).json()
+    assert first["next_cursor"] is not None
+
+    second = client.get(f"/api/v1/conversations?per_page=2&cursor={first['next_cursor']}", headers=auth_header)
+    assert second.status_code == 200
+    body = second.json()
+    assert body["total"] is None
+    first_ids = {c["id"] for c in first["data"]}
+    assert not first_ids & {c["id"] for c in body["data"]}
+
+
+def test_list_invalid_cursor(client, auth_header):
+    resp = client.get("/api/v1/conversations?cursor=not-a-cursor", headers=auth_header)
+    assert resp.status_code == 400
+
+
+def test_export_conversation(client, auth_header):
+    create = client.post("/api/v1/conversations", json={"title": "Export Me"}, headers=auth_header)
+    conv_id = create.json()["data"]["id"]
+
+    resp = client.get(f"/api/v1/conversations/{conv_id}/export", headers=auth_header)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines[0]["type"] == "conversation"
+    assert lines[0]["id"] == conv_id
+
+
+def test_export_all_gzip(client, auth_header):
+    resp = client.get("/api/v1/conversations/export?gzip=true", headers=auth_header)
+    assert resp.status_code == 200
+    # httpx transparently decodes Content-Encoding: gzip
+    types = {json.loads(line)["type"] for line in resp.text.splitlines()}
+    assert "conversation" in types
+
+
+def test_import_conversations(client, auth_header):
+    body = "\n".join(json.dumps(line) for line in [
+        {"type": "conversation", "title": "Imported"},
+        {"type": "message", "role": "user", "content": "Hello from elsewhere"},
+        {"type": "message", "role": "assistant", "content": "Hi!"},
+        {"type": "message", "role": "robot", "content": "bad role"},
+    ])
+    resp = client.post(
+        "/api/v1/conversations/import",
+        content=body,
+        headers={**auth_header, "Content-Type": "application/x-ndjson", "X-Request-ID": f"import-{uuid.uuid4()}"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["conversations"] == 1
+    assert data["messages"] == 2
+    assert data["error_count"] == 1
+
+    status = client.get(f"/api/v1/conversations/import/{data['job_id']}", headers=auth_header)
+    assert status.json()["data"]["done"] is True
+
+
+def test_import_rejects_bad_columns_per_line(client, auth_header):
+    body = "\n".join(json.dumps(line) for line in [
+        {"type": "conversation", "title": "Typed"},
+        {"type": "message", "role": "user", "content": "ok"},
+        {"type": "message", "role": "user", "content": "bad count", "token_count": "many"},
+        {"type": "message", "role": "user", "content": "bad time", "created_at": "yesterday"},
+        {"type": "message", "role": "assistant", "content": "bad cost", "metadata": {"cost_usd": "free"}},
+        {"type": "conversation", "title": "Bad flag", "is_archived": "yes"},
+        {"type": "message", "role": "user", "content": "orphan"},
+    ])
+    resp = client.post(
+        "/api/v1/conversations/import",
+        content=body,
+        headers={**auth_header, "Content-Type": "application/x-ndjson", "X-Request-ID": f"import-{uuid.uuid4()}"},
+    )
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["conversations"] == 1
+    assert data["messages"] == 1
+    assert [e["line"] for e in data["errors"]] == [3, 4, 5, 6, 7]
+
+
+def test_import_job_ids_are_per_user(client, auth_header):
+    job_id = f"import-{uuid.uuid4()}"
+    resp = client.post(
+        "/api/v1/conversations/import",
+        content=json.dumps({"type": "conversation", "title": "Mine"}),
+        headers={**auth_header, "Content-Type": "application/x-ndjson", "X-Request-ID": job_id},
+    )
+    assert resp.status_code == 200
+
+    other = client.post("/api/v1/auth/register", json={"email": f"other_{uuid.uuid4().hex[:8]}@example.com", "password": "SecureTestPass123"})
+    other_header = {"Authorization": f"Bearer {other.json()['data']['access_token']}"}
+    assert client.get(f"/api/v1/conversations/import/{job_id}", headers=other_header).status_code == 404
+    assert client.get(f"/api/v1/conversations/import/{job_id}", headers=auth_header).status_code == 200
@@ -0,0 +1,135 @@
+"""Tests for the LLM response cache."""
+
+import uuid
+
+import pytest
+
+from src.config.settings import get_settings
+from src.llm import cache as cache_module
+from src.llm import client as client_module
+from src.llm.cache import CachedLLMClient, ResponseCache, _entry_size
+from src.llm.client import get_llm_client
+
+
+class CountingClient:
+    """Provider stand-in that records the prompt of every call it actually serves."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, messages, model, on_headers=None):
+        self.prompts.append(messages[-1]["content"])
+        return {"content": "Cached answer", "finish_reason": "stop", "input_tokens": 10, "output_tokens": 2}
+
+    async def generate_stream(self, messages, model, on_headers=None):
+        self.prompts.append(messages[-1]["content"])
+        for token in ("Cached ", "stream ", "answer"):
+            yield {"type": "delta", "content": token}
+        yield {"type": "finish", "finish_reason": "stop", "usage": {"input_tokens": 10, "output_tokens": 3}}
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    """Enable a fresh cache in front of a CountingClient standing in for Groq."""
+    fake = CountingClient()
+    monkeypatch.setattr(get_settings(), "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(cache_module, "_cache", None)
+    monkeypatch.setitem(client_module._clients, "groq", fake)
+    return fake
+
+
+def test_lru_evicts_least_recently_used_by_bytes():
+    value = {"content": "x" * 100}
+    cache = ResponseCache(ttl_seconds=60, max_bytes=2 * _entry_size("a", value))
+    cache.set("a", value)
+    cache.set("b", value)
+    assert cache.get("a") is not None  # "b" is now least recently used
+
+    cache.set("c", value)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_entry_larger_than_cache_is_not_stored():
+    cache = ResponseCache(ttl_seconds=60, max_bytes=512)
+    cache.set("big", {"content": "x" * 1024})
+    assert cache.get("big") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_ttl_expiry():
+    fresh = ResponseCache(ttl_seconds=60, max_bytes=1024 * 1024)
+    fresh.set("k", {"content": "v"})
+    assert fresh.get("k") == {"content": "v"}
+
+    expired = ResponseCache(ttl_seconds=0, max_bytes=1024 * 1024)
+    expired.set("k", {"content": "v"})
+    assert expired.get("k") is None
+    assert expired.stats()["entries"] == 0
+
+
+def test_cache_opt_out_per_call(provider):
+    assert isinstance(get_llm_client("groq"), CachedLLMClient)
+    assert get_llm_client("groq", cached=False) is provider
+
+
+def _new_conversation(client, auth_header):
+    resp = client.post("/api/v1/conversations", json={"title": "Cache Test"}, headers=auth_header)
+    return resp.json()["data"]["id"]
+
+
+def test_send_served_from_cache_unless_opted_out(client, auth_header, provider):
+    prompt = f"Cache me {uuid.uuid4().hex}"
+    for cache in (True, True, False):
+        conv_id = _new_conversation(client, auth_header)
+        resp = client.post(
+            f"/api/v1/conversations/{conv_id}/messages",
+            json={"content": prompt, "cache": cache},
+            headers=auth_header,
+        )
+        assert resp.status_code == 200
+        assert resp.json()["data"]["content"] == "Cached answer"
+
+    # The second identical call was a hit; the opted-out third went to the provider
+    assert provider.prompts.count(prompt) == 2
+
+
+def _stream_deltas(client, auth_header, prompt, conv_id=None):
+    conv_id = conv_id or _new_conversation(client, auth_header)
+    with client.stream(
+        "POST",
+        f"/api/v1/conversations/{conv_id}/messages/stream",
+        json={"content": prompt},
+        headers=auth_header,
+    ) as resp:
+        assert resp.status_code == 200
+        lines = list(resp.iter_lines())
+    events = [line[7:] for line in lines if line.startswith("event: ")]
+    assert events[-2:] == ["message_stop", "timing"]
+    return [line for line in lines if '"text_delta"' in line]
+
+
+def test_cached_stream_replays_over_sse(client, auth_header, provider):
+    prompt = f"Stream me {uuid.uuid4().hex}"
+    first = _stream_deltas(client, auth_header, prompt)
+    replay = _stream_deltas(client, auth_header, prompt)
+
+    assert len(first) == 3
+    assert replay == first
+    assert provider.prompts.count(prompt) == 1
+
+
+def test_cached_stream_is_recorded_as_free(client, auth_header, provider):
+    prompt = f"Bill me once {uuid.uuid4().hex}"
+    _stream_deltas(client, auth_header, prompt)
+    conv_id = _new_conversation(client, auth_header)
+    _stream_deltas(client, auth_header, prompt, conv_id)
+
+    resp = client.get(f"/api/v1/conversations/{conv_id}/messages", headers=auth_header)
+    assistant = [m for m in resp.json()["data"] if m["role"] == "assistant"][-1]
+    assert assistant["metadata"]["cached"] is True
+    assert assistant["metadata"]["cost_usd"] == 0.0
@@ -65,3 +65,19 @@ def test_token_counting(client, auth_header):
     user_msg = msgs.json()["data"][0]
     assert user_msg["token_count"] is not None
     assert user_msg["token_count"] > 0
+
+
+def test_send_message_invalid_body(client, auth_header):
+    conv = client.post("/api/v1/conversations", json={"title": "Invalid Body"}, headers=auth_header)
+    conv_id = conv.json()["data"]["id"]
+
+    resp = client.post(f"/api/v1/conversations/{conv_id}/messages", json={"thinking": True}, headers=auth_header)
+    assert resp.status_code == 422
+    assert "body.content" in resp.json()["error"]["message"]
+
+    resp = client.post(
+        f"/api/v1/conversations/{conv_id}/messages",
+        content=b"{not json",
+        headers={**auth_header, "Content-Type": "application/json"},
+    )
+    assert resp.status_code == 422
@@ -0,0 +1,155 @@
+"""Tests for the provider key pool's failover and key health."""
+
+import time
+
+import httpx
+import pytest
+from groq import APIConnectionError, AuthenticationError, BadRequestError, RateLimitError
+
+from src.llm.pool import ProviderPool
+from src.llm.scheduler import RateLimitScheduler, TokenBudget
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+_REQUEST = httpx.Request("POST", "https://api.groq.invalid/openai/v1/chat/completions")
+
+
+def _status_error(cls, status: int, headers: dict | None = None):
+    response = httpx.Response(status, headers=headers or {}, request=_REQUEST)
+    return cls(f"HTTP {status}", response=response, body=None)
+
+
+class FakeKeyClient:
+    """Client for one key: fails with `error` before any output, or after the first chunk with `fail_after_first`.
+
+    Only the first `failures` calls fail when it is set.
+    """
+
+    def __init__(self, error: Exception | None = None, fail_after_first: bool = False, failures: int | None = None):
+        self._error = error
+        self.fail_after_first = fail_after_first
+        self.failures = failures
+        self.calls = 0
+
+    @property
+    def error(self) -> Exception | None:
+        if self.failures is not None and self.calls > self.failures:
+            return None
+        return self._error
+
+    async def generate(self, messages, model, on_headers=None):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return {"content": "ok", "finish_reason": "stop", "input_tokens": 1, "output_tokens": 1}
+
+    async def generate_stream(self, messages, model, on_headers=None):
+        self.calls += 1
+        if self.error is not None and not self.fail_after_first:
+            raise self.error
+        yield {"type": "delta", "content": "partial "}
+        if self.error is not None:
+            raise self.error
+        yield {"type": "delta", "content": "answer"}
+        yield {"type": "finish", "finish_reason": "stop", "usage": {"input_tokens": 1, "output_tokens": 2}}
+
+
+def _pool(*clients: FakeKeyClient) -> ProviderPool:
+    # With no limits learned yet every key ties, so the first healthy key is picked
+    scheduler = RateLimitScheduler([TokenBudget() for _ in clients], max_wait=1.0)
+    return ProviderPool("groq", list(clients), scheduler, auth_eject_seconds=300, error_eject_seconds=30)
+
+
+def _keys(pool: ProviderPool) -> list[dict]:
+    return pool.stats()["keys"]
+
+
+@pytest.mark.asyncio
+async def test_auth_error_ejects_key_and_retries_on_another():
+    bad, good = FakeKeyClient(_status_error(AuthenticationError, 401)), FakeKeyClient()
+    pool = _pool(bad, good)
+
+    assert (await pool.generate(MESSAGES, "m"))["content"] == "ok"
+    assert (await pool.generate(MESSAGES, "m"))["content"] == "ok"
+
+    # The ejected key is skipped on the next call
+    assert (bad.calls, good.calls) == (1, 2)
+    key = _keys(pool)[0]
+    assert (key["auth_errors"], key["ejections"]) == (1, 1)
+    assert key["paused_for_seconds"] > 290
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_penalizes_key_for_retry_after():
+    limited, good = FakeKeyClient(_status_error(RateLimitError, 429, {"retry-after": "7"})), FakeKeyClient()
+    pool = _pool(limited, good)
+
+    assert (await pool.generate(MESSAGES, "m"))["content"] == "ok"
+
+    key = _keys(pool)[0]
+    assert (key["rate_limited"], key["ejections"]) == (1, 0)
+    assert 5 < key["paused_for_seconds"] <= 7
+    assert good.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_single_key_retries_once_after_rate_limit_pause():
+    key = FakeKeyClient(_status_error(RateLimitError, 429, {"retry-after": "0.2"}), failures=1)
+    pool = _pool(key)
+
+    started = time.monotonic()
+    assert (await pool.generate(MESSAGES, "m"))["content"] == "ok"
+
+    # The retry waited out the key's Retry-After instead of failing over
+    assert time.monotonic() - started >= 0.2
+    assert key.calls == 2
+    stats = _keys(pool)[0]
+    assert (stats["rate_limited"], stats["successes"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_retried_only_once_per_key():
+    key = FakeKeyClient(_status_error(RateLimitError, 429, {"retry-after": "0.05"}))
+    pool = _pool(key)
+
+    with pytest.raises(RateLimitError):
+        await pool.generate(MESSAGES, "m")
+    assert key.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_request_error_is_not_retried():
+    bad, good = FakeKeyClient(_status_error(BadRequestError, 400)), FakeKeyClient()
+    pool = _pool(bad, good)
+
+    with pytest.raises(BadRequestError):
+        await pool.generate(MESSAGES, "m")
+    assert good.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_on_another_key_before_first_chunk():
+    down, good = FakeKeyClient(APIConnectionError(request=_REQUEST)), FakeKeyClient()
+    pool = _pool(down, good)
+
+    chunks = [chunk async for chunk in pool.generate_stream(MESSAGES, "m")]
+
+    assert "".join(c.get("content", "") for c in chunks) == "partial answer"
+    assert chunks[-1]["type"] == "finish"
+    assert _keys(pool)[0]["errors"] == 1
+    assert _keys(pool)[1]["successes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_is_not_retried_once_it_has_yielded():
+    flaky, good = FakeKeyClient(APIConnectionError(request=_REQUEST), fail_after_first=True), FakeKeyClient()
+    pool = _pool(flaky, good)
+
+    received = []
+    with pytest.raises(APIConnectionError):
+        async for chunk in pool.generate_stream(MESSAGES, "m"):
+            received.append(chunk)
+
+    # Retrying would replay the answer from the start after the caller already saw part of it
+    assert received == [{"type": "delta", "content": "partial "}]
+    assert good.calls == 0
+    assert _keys(pool)[0]["errors"] == 1
@@ -0,0 +1,84 @@
+"""Tests for in-process read coalescing."""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.db.singleflight import SingleFlight
+
+
+class GatedQuery:
+    """Sync read that blocks its first call until released; later calls return at once."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = 0
+        self.finished = 0
+
+    def __call__(self, arg):
+        self.calls += 1
+        call = self.calls
+        if call == 1:
+            self.gate.wait(5)
+        self.finished += 1
+        return {"arg": arg, "call": call}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_query():
+    group = SingleFlight()
+    query = GatedQuery()
+    callers = [asyncio.create_task(group.do(("read", 1), query, 1)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    query.gate.set()
+    results = await asyncio.gather(*callers)
+
+    assert query.calls == 1
+    assert all(r is results[0] for r in results)
+    assert group.stats()["read"] == {"calls": 5, "executions": 1, "coalesced": 4, "timeouts": 0}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_coalesced():
+    group = SingleFlight()
+    query = GatedQuery()
+    query.gate.set()
+    a, b = await asyncio.gather(group.do(("read", 1), query, 1), group.do(("read", 2), query, 2))
+
+    assert (a["arg"], b["arg"]) == (1, 2)
+    assert query.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_follower_stops_waiting_on_a_slow_leader():
+    group = SingleFlight()
+    query = GatedQuery()
+    leader = asyncio.create_task(group.do(("read", 1), query, 1, timeout=0.1))
+    await asyncio.sleep(0.02)
+
+    # The leader is stuck; the follower gives up after the timeout and queries on its own
+    follower = await group.do(("read", 1), query, 1, timeout=0.1)
+    assert follower["call"] == 2
+    assert group.stats()["read"]["timeouts"] == 1
+
+    query.gate.set()
+    assert (await leader)["call"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_query():
+    group = SingleFlight()
+    query = GatedQuery()
+    leader = asyncio.create_task(group.do(("read", 1), query, 1))
+    await asyncio.sleep(0.02)
+    follower = asyncio.create_task(group.do(("read", 1), query, 1))
+    await asyncio.sleep(0.02)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    query.gate.set()
+
+    assert (await follower)["call"] == 1
+    assert query.calls == query.finished == 1
@@ -13,6 +13,7 @@ def test_streaming_endpoint(client, auth_header):
     ) as resp:
         assert resp.status_code == 200
         assert resp.headers["content-type"] == "text/event-stream; charset=utf-8"
+        assert "get_conversation;dur=" in resp.headers["server-timing"]
 
         events = []
         for line in resp.iter_lines():
@@ -25,7 +26,9 @@ def test_streaming_endpoint(client, auth_header):
     assert "content_block_delta" in events
     assert "content_block_stop" in events
     assert "message_delta" in events
-    assert events[-1] == "message_stop"
+    assert events[-2] == "message_stop"
+    # Trailing per-stage timings
+    assert events[-1] == "timing"
 
 
 def test_streaming_saves_message(client, auth_header):
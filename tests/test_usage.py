@@ -0,0 +1,142 @@
+"""Tests for usage endpoints."""
+
+from datetime import datetime, timezone
+
+from src.usage.timeseries import compute_timeseries, to_arrays
+
+
+def test_usage_stats(client, auth_header):
+    conv = client.post("/api/v1/conversations", json={"title": "Usage Test"}, headers=auth_header)
+    conv_id = conv.json()["data"]["id"]
+    client.post(f"/api/v1/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=auth_header)
+
+    resp = client.get("/api/v1/usage/stats", headers=auth_header)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["conversation_count"] >= 1
+    assert data["message_count"] >= 2
+    assert data["total_input_tokens"] >= 0
+    assert 0 <= data["total_cached_input_tokens"] <= data["total_input_tokens"]
+    assert any(m["generation_count"] >= 1 for m in data["by_model"])
+
+
+
+def test_usage_stats_drop_deleted_conversations(client, auth_header):
+    conv = client.post("/api/v1/conversations", json={"title": "Usage Delete Test"}, headers=auth_header)
+    conv_id = conv.json()["data"]["id"]
+    client.post(f"/api/v1/conversations/{conv_id}/messages", json={"content": "Hi"}, headers=auth_header)
+    before = client.get("/api/v1/usage/stats", headers=auth_header).json()["data"]
+
+    client.delete(f"/api/v1/conversations/{conv_id}", headers=auth_header)
+
+    after = client.get("/api/v1/usage/stats", headers=auth_header).json()["data"]
+    assert after["conversation_count"] == before["conversation_count"] - 1
+    assert after["message_count"] == before["message_count"] - 2
+
+def test_usage_timeseries(client, auth_header):
+    resp = client.get("/api/v1/usage/timeseries?bucket=hour", headers=auth_header)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["bucket"] == "hour"
+    for series in data["series"]:
+        assert series["model"]
+        for point in series["points"]:
+            assert point["messages"] > 0
+            assert set(point["latency_ms"]) == {"p50", "p95", "p99"}
+
+
+
+def test_timeseries_buckets_align_to_utc_days():
+    start = datetime(2026, 3, 1, 15, 30, tzinfo=timezone.utc)
+    end = datetime(2026, 3, 3, 15, 30, tzinfo=timezone.utc)
+    created = [datetime(2026, 3, 1, 23, tzinfo=timezone.utc), datetime(2026, 3, 2, 1, tzinfo=timezone.utc)]
+    columns = to_arrays({
+        "model_names": ["m"], "model_idx": [0, 0], "created_at": [t.timestamp() for t in created],
+        "output_tokens": [1, 1], "input_tokens": [1, 1], "latency_ms": [10, 20], "cost_usd": [0, 0],
+    })
+
+    points = compute_timeseries(columns, start, end, "day")[0]["points"]
+    assert [p["t"] for p in points] == ["2026-03-01T00:00:00+00:00", "2026-03-02T00:00:00+00:00"]
+    assert [p["messages"] for p in points] == [1, 1]
+
+def test_usage_timeseries_range_too_large(client, auth_header):
+    resp = client.get(
+        "/api/v1/usage/timeseries?bucket=hour&start=2020-01-01T00:00:00Z&end=2026-01-01T00:00:00Z",
+        headers=auth_header,
+    )
+    assert resp.status_code == 400
+
+
+def test_list_models(client):
+    resp = client.get("/api/v1/models")
+    assert resp.status_code == 200
+    models = resp.json()["data"]
+    assert any(m["is_default"] for m in models)
+    assert all(m["max_output_tokens"] < m["max_context_tokens"] for m in models)
+
+    cached = client.get("/api/v1/models", headers={"If-None-Match": resp.headers["etag"]})
+    assert cached.status_code == 304
+
+
+def test_admission_stats(client, admin_header):
+    resp = client.get("/api/v1/usage/admission", headers=admin_header)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["in_flight"] <= data["max_in_flight"]
+    assert data["queued"] <= data["max_queue"]
+
+
+def test_provider_stats(client, admin_header):
+    resp = client.get("/api/v1/usage/providers", headers=admin_header)
+    assert resp.status_code == 200
+    groq = resp.json()["data"]["groq"]
+    assert groq["dispatched"] >= 0
+    assert len(groq["keys"]) >= 1
+    assert groq["keys"][0]["key"] == "groq-0"
+
+
+def test_metrics(client):
+    client.get("/health")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in resp.text
+    assert "# TYPE db_query_duration_seconds histogram" in resp.text
+
+
+def test_loop_stats(client, admin_header):
+    resp = client.get("/api/v1/usage/loop", headers=admin_header)
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["stalls"] >= 0
+    assert set(data["lag_ms"]) == {"p50", "p95", "p99", "max"}
+
+
+def test_operator_stats_require_admin(client, auth_header):
+    for path in ("cache", "background", "admission", "providers", "loop"):
+        assert client.get(f"/api/v1/usage/{path}", headers=auth_header).status_code == 403
+
+
+def test_profile_requires_admin(client, auth_header):
+    resp = client.post("/api/v1/admin/profile?seconds=1", headers=auth_header)
+    assert resp.status_code == 403
+
+
+def test_profile_counts_only_matching_samples(client, admin_header):
+    resp = client.post(
+        "/api/v1/admin/profile?seconds=0.2&interval_ms=5&request_pattern=^no-such-request$",
+        headers=admin_header,
+    )
+    assert resp.status_code == 200
+    assert resp.headers["x-profile-samples"] == "0"
+    assert resp.text == ""
+
+def test_models_compressed(client):
+    resp = client.get("/api/v1/models", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert resp.json()["data"]
+
+    plain = client.get("/api/v1/models", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers